@@ -34,6 +34,9 @@ import numpy as np  # for data array and matrix manipulation
 import matplotlib.pyplot as plt # for plotting data
 import plotly.express as px # for data visualization
 
+from cceda.loader import load_transactions # for typed, cached loading of the transactions file
+from cceda.validation import Validator # for checking the rows while they are read
+
 
 # ### Reading the csv dataset
 # 
@@ -42,8 +45,12 @@ import plotly.express as px # for data visualization
 # In[2]:
 
 
-# The data is read using pandas' read_csv function and using the index column as the index of the imported data
-df = pd.read_csv('Credit card transactions India.csv', index_col = 'index')
+# The data is read with an explicit schema using the index column as the index of the imported data.
+# The first run parses the csv and saves a columnar snapshot, later runs memory-map that snapshot instead
+# Every row is checked against the expected values while it is read, failing rows go to a quarantine file
+validator = Validator(quarantine_path='.cceda_cache/quarantine.csv')
+df = load_transactions('Credit card transactions India.csv', validator=validator)
+validator.report['rules']
 
 
 # ### Inspecting the data
@@ -63,7 +70,7 @@ df.head()
 df.info()
 
 
-# The dataset has 6 columns with 26,502 rows and no explicit null values. The data types of the columns are also right except the "__Date__" column which will be corrected later
+# The dataset has 6 columns with 26,502 rows and no explicit null values. City, Card Type, Exp Type and Gender are read as categoricals and the "__Date__" column is already parsed into a datetime
 
 # In[5]:
 
@@ -83,29 +90,29 @@ df.describe(include="all")
 # In[6]:
 
 
-# finding the different genders using the value_counts() function
-df['Gender'].value_counts()
+# finding the different genders from the value counts the validation computed while reading
+validator.value_counts('Gender')
 
 
 # In[7]:
 
 
-# finding the different card types using the value_counts() function
-df['Card Type'].value_counts()
+# finding the different card types from the value counts the validation computed while reading
+validator.value_counts('Card Type')
 
 
 # In[8]:
 
 
-# finding the different expense types using the value_counts() function
-df['Exp Type'].value_counts()
+# finding the different expense types from the value counts the validation computed while reading
+validator.value_counts('Exp Type')
 
 
 # In[9]:
 
 
-# finding the different cities and their frequency using the value_counts() function
-df['City'].value_counts().head(10)
+# finding the different cities and their frequency from the value counts the validation computed while reading
+validator.value_counts('City').head(10)
 
 
 # #### Findings
@@ -118,18 +125,18 @@ df['City'].value_counts().head(10)
 # | City | 986 distinct cities | The margin between the top 4 cities is a lot higher than the rest of the cities and some cities also record single transactions. |
 # | Amount | None | The description of the amount column already shows its feature. |
 
-# None of the columns contains null values, and the value counts also show no implicit error values. The entries however, could contain duplicate rows which might lead to a higher frequency count of the various distinct values
+# None of the columns contains null values, and the validation quarantined no row: every card type, expense type and gender is an expected value, every city reduces to a city name once its country is removed, every date parses and every amount is a positive whole number. The entries however, could contain duplicate rows which might lead to a higher frequency count of the various distinct values
 
 # ###### Checking to see duplicacy
 
 # In[10]:
 
 
-# checking if there are any duplicated rows in the dataset
-df.columns.duplicated().sum()
+# checking if there are any duplicated rows in the dataset, i.e. transactions equal in every column
+df.duplicated().sum()
 
 
-# There are no duplicated rows in the data
+# There are no duplicated rows in the data. New batches of transactions can be checked the same way, and against the batches received before, with the hashed dedup stage in `cceda.dedup`
 
 # The data exploration is now complete.
 
@@ -157,13 +164,18 @@ df.head()
 
 # Since the data is about spending in India it is irrelevant to have to country attached to the city in the __City__ column.
 
-# To correct this, City column is split at the ', ' and the city name is taken using its index and assigned to df['City']
+# To correct this, the country is removed from every city name and the result is assigned to df['City']. Since the
+# column only has 986 distinct names, each distinct name is cleaned once (extra whitespace, the country suffix and
+# case differences) and the cleaned names are mapped back to the rows. The cleaned names are kept in a memo file
+# so the next run does not clean them again.
 
 # In[13]:
 
 
-# splitting the city column and assigning the city to a new column
-df['City'] = df['City'].astype(str).str.split(", ", expand = True)[0]
+# normalizing the city column and assigning the cleaned names back to it
+from cceda.cities import normalize_cities
+
+df['City'] = normalize_cities(df['City'], memo_path='.cceda_cache/city_memo.json')
 
 
 # In[14]:
@@ -181,6 +193,19 @@ df.head()
 
 # ## Business Solution Data Analysis
 
+# Every question below totals the Amount over a few columns. Instead of grouping the full table again for each
+# question, an aggregation cube is built once: it holds the total, count, minimum and maximum Amount of every
+# combination of City, Date, Card Type, Exp Type and Gender, and each question is answered by rolling it up.
+
+# In[ ]:
+
+
+# building the aggregation cube in a single pass over the cleaned data
+from cceda.cube import AggregationCube
+
+cube = AggregationCube.build(df)
+
+
 # ### Question 1: Which 10 city was the difference in the total expenditure between males and females the most and the least?
 
 # #### Reason:
@@ -197,48 +222,24 @@ df.head()
 
 
 # Finding cities with the highest expenditure
-city_group = df.groupby('City', as_index=False)['Amount'].aggregate('sum')            .sort_values(by='Amount', ascending=False)
+city_group = cube.rollup(['City']).sort_values(by='Amount', ascending=False)
 city_group
 
 
 # In[16]:
 
 
-# creating a groupby table of City and Gender with the total amount as the sum
-gender_group = df.groupby(['City', 'Gender'], as_index = False).sum()
-
-# Seperating the Male and Female total amounts and renaming the column for better identification
-Male_Amount = gender_group[gender_group['Gender']=='M'].drop('Gender', axis=1)
-Male_Amount.rename(columns={'Amount':'Male_Amount'}, inplace=True)
+# creating one table of the total male and female amount per city. The City and Gender groupby is
+# unstacked on the gender, so males and females become two columns of the same row, and the
+# difference (male minus female) and the ratio (male over female) are calculated for every city at once
+from cceda.gender_gap import gender_gap, dominated_areas, gender_gap_extremes
 
-Female_Amount = gender_group[gender_group['Gender']=='F'].drop('Gender', axis=1)
-Female_Amount.rename(columns={'Amount':'Female_Amount'}, inplace=True)
-
-# merging the two datasets
-Total_amount_Gender = Male_Amount.merge(Female_Amount, on = 'City')
+Total_amount_Gender = gender_gap(cube.rollup(['City', 'Gender']))
 
 # printing the new dataset
 Total_amount_Gender.head()
 
 
-# In[17]:
-
-
-# calculating the difference in Expenditure Amount
-Amount_Difference = []  # list to store the difference values
-
-for i in Total_amount_Gender.City.unique():
-    
-    # calculating the difference in amount and storing it in a variable diff (type cast amounts to integers)
-    diff = int(Total_amount_Gender[Total_amount_Gender.City == i]['Male_Amount'])-         int(Total_amount_Gender[Total_amount_Gender.City == i]['Female_Amount'])
-    
-    # appending the differenct to a list
-    Amount_Difference.append(diff)
-
-# creating a new column whose values are the differences calculated
-Total_amount_Gender['Difference'] = Amount_Difference
-
-
 # Per the difference formular above, having a positive difference shows that males spend more than females and having a negative amount shows that femaless spend more than males.
 # 
 # The dataset is seperated into positive and negative value differences.
@@ -246,41 +247,66 @@ Total_amount_Gender['Difference'] = Amount_Difference
 # In[18]:
 
 
+# testing the gap of every city with 10,000 permutations of the genders and 10,000 bootstraps of the
+# transactions of each gender. Both look at Mean_Difference, the male minus the female Amount per transaction:
+# Adjusted_P is its permutation p-value and Mean_Difference_Low and Mean_Difference_High bound it, both
+# corrected for testing every city at once. Cities with fewer than 10 transactions of a gender get no interval
+from cceda.significance import difference_tests, with_significance
+
+City_Tests = difference_tests(df, by='City', resamples=10_000)
+Total_amount_Gender = with_significance(Total_amount_Gender, City_Tests)
+
 # seperating the dataset into positive and negative difference values 
-Female_Dominated_Areas = Total_amount_Gender[Total_amount_Gender['Difference']<0]
-Male_Dominated_Areas = Total_amount_Gender[Total_amount_Gender['Difference']>0]
+Female_Dominated_Areas, Male_Dominated_Areas = dominated_areas(Total_amount_Gender)
+
+# selecting the top 10 and bottom 5 cities on each side without sorting the whole tables
+Extremes = gender_gap_extremes(Total_amount_Gender, top_k=10, bottom_k=5,
+                               columns=('City', 'Difference', 'Mean_Difference', 'Mean_Difference_Low',
+                                        'Mean_Difference_High', 'Adjusted_P'))
+
+print(f"{len(City_Tests)} cities tested, {City_Tests['Significant'].sum()} with a significant difference per "
+      f"transaction, intervals at {City_Tests.attrs['interval_confidence']:.2%} each")
 
 
 # In[19]:
 
 
 # Printing the top 10 rows where females spend more than males
-Female_Dominated_Areas.sort_values(by='Difference')[['City', 'Difference']].head(10)
+Extremes['female_top']
 
 
 # In[20]:
 
 
 # Printing the bottom 5 rows where females spend more than females
-Female_Dominated_Areas.sort_values(by='Difference', ascending=False)[['City', 'Difference']].head(5)
+Extremes['female_bottom']
 
 
 # In[21]:
 
 
 # Printing the top 10 rows where males spend more than females
-Male_Dominated_Areas.sort_values(by='Difference', ascending=False)[['City', 'Difference']].head(10)
+Extremes['male_top']
 
 
 # In[22]:
 
 
 # Printing the bottom 5 rows where males spend more than females
-Male_Dominated_Areas.sort_values(by='Difference')[['City', 'Difference']].head(5)
+Extremes['male_bottom']
+
+
+# In[ ]:
+
+
+# Printing the cities whose difference per transaction is significant
+City_Tests[City_Tests['Significant']]
 
 
 # #### Conclusion:
 #     
+# The Difference column compares total spending, which mostly follows how many transactions each gender makes in a city. Per transaction, only the largest cities have a significant gap once every city is tested together, and in each of them females spend more than males; the gaps of the smaller cities are within what shuffling the genders produces, and most of them have too few transactions for an interval.
+# 
 # As a bank it will be best to advertise in Greater Mumbai, Delhi, Bengaluru, Ahmedabad, Kanpur, Jaipur, etc to females since they spend the most.
 # 
 # Also, it will be best to advertise in Kolkata, Chennai, Fatehpur Sikri, Margao, Nautanwa, etc to males since they spend the most.
@@ -299,7 +325,7 @@ Male_Dominated_Areas.sort_values(by='Difference')[['City', 'Difference']].head(5
 
 
 # finding the sum of amount for each combination of Expense Type and Card Type using the groupby function 
-Expense = df.groupby(["Exp Type", "Card Type"], as_index=False).sum()
+Expense = cube.rollup(["Exp Type", "Card Type"])
 
 # printing the dataset
 Expense
@@ -336,69 +362,9 @@ px.bar(Expense, x="Exp Type", y="Amount", color="Card Type", text_auto=True)
 # In[25]:
 
 
-# creating a class called DateColumnsExtractor
-class DateColumnsExtractor:
-    def __init__(self, date_format='%d-%m-%Y'):
-        self.date_format = date_format
-    
-    def extract_year(self, df, date_column):
-        """
-        Extracts the year from a date column in a Pandas DataFrame
-        
-        Returns:
-        pandas.DataFrame: The original DataFrame with a new column for the year
-        """
-        
-        # converting the Date column into a datetime datatype and extracting the year and assigning it to a new column
-        df['Year'] = pd.to_datetime(df[date_column]).dt.year
-        
-        # returning the new dataframe
-        return df
-    
-    def extract_month_name(self, df, date_column):
-        """
-        Extracts the month name from a date column in a Pandas DataFrame
-              
-        Returns:
-        pandas.DataFrame: The original DataFrame with a new column for the month name
-        """
-        
-        # converting the Date column into a datetime datatype and extracting the Month name and assigning 
-        # it to a new column
-        df['Month'] = pd.to_datetime(df[date_column]).dt.month_name()
-        
-        # returning the new dataframe
-        return df
-    
-    def extract_day_number(self, df, date_column):
-        """
-        Extracts the day number from a date column in a Pandas DataFrame
-                
-        Returns:
-        pandas.DataFrame: The original DataFrame with a new column for the day number
-        """
-        
-        # converting the Date column into a datetime datatype and extracting the Day number and assigning 
-        # it to a new column
-        df['Day Number'] = pd.to_datetime(df[date_column]).dt.day
-        
-        # returning the new dataframe 
-        return df
-    
-    def extract_day_name(self, df, date_column):
-        """
-        Extracts the day name from a date column in a Pandas DataFrame
-        
-        Returns:
-        pandas.DataFrame: The original DataFrame with a new column for the day name
-        """
-        
-        # converting the Date column into a datetime datatype and extracting the Day name and assigning 
-        # it to a new column
-        df['Day Name'] = pd.to_datetime(df[date_column]).dt.day_name()
-        
-        # returning the new dataframe
-        return df
+# the DateColumnsExtractor class lives in the cceda package. It parses the Date column once with the
+# explicit '%d-%b-%y' format and can extract every date part in a single call
+from cceda.dates import DateColumnsExtractor
 
 
 # In[26]:
@@ -407,8 +373,9 @@ class DateColumnsExtractor:
 # calling the datecolumnsextractor to a variable date_extractor 
 date_extractor = DateColumnsExtractor()
 
-# extracting the month name from the date column
-df = date_extractor.extract_month_name(df, 'Date')
+# extracting the Year, Month, Day Number, Day Name, Quarter, Week and Month End columns in one call.
+# Month and Day Name are ordered categoricals, so groupings follow the calendar order
+df = date_extractor.extract_all(df, 'Date')
 
 
 # In[27]:
@@ -421,13 +388,31 @@ df.head()
 # In[28]:
 
 
-# finding theh total amount spent per month per card type
-df_month_group=df.groupby(["Month", "Card Type"]).sum()
+# finding theh total amount spent per month per card type. The Amount is resampled month by month on the Date
+# column, so the months of 2013, 2014 and 2015 are kept apart and come in calendar order
+from cceda.timeseries import TimeSeriesEngine
+
+trend = TimeSeriesEngine(df)
+df_month_group = trend.resample("Card Type", "month")
 
 # printing the grouped data
 df_month_group.head(10)
 
 
+# In[ ]:
+
+
+# the 3 month moving average of every card type at once
+trend.rolling(3, "mean", by="Card Type").tail()
+
+
+# In[ ]:
+
+
+# the change of every card type against the same month a year earlier
+trend.year_over_year(by="Card Type", relative=True).dropna()
+
+
 # ##### Plotting the data
 
 # In[29]:
@@ -440,16 +425,16 @@ cat={}
 plt.figure(figsize=(15, 7))
 
 # create a line chart for each category
-for category, category_df in df_month_group.groupby('Card Type', as_index=False):
+for category in df_month_group.columns:
     
     # storing the key and its value in the dictioanry
-    cat[category]=category_df
+    cat[category]=df_month_group[category]
     
     # creating a line plot of the data
-    plt.plot(category_df.index.get_level_values('Month'), category_df['Amount'], label=category)
+    plt.plot(df_month_group.index, df_month_group[category], label=category)
 
 # add labels and title
-plt.xlabel('Card Type')
+plt.xlabel('Month')
 plt.ylabel('Amount Spent')
 plt.title('Total Amount Spent with Specific Card Type')
 
@@ -477,16 +462,15 @@ plt.show()
 # In[30]:
 
 
-# extracting the month name from the date column
-
-df = date_extractor.extract_day_name(df, 'Date')
+# the day name was already extracted together with the month name
+df[['Date', 'Day Name']].head()
 
 
 # In[31]:
 
 
 # grouping the data per day and gender
-spending_per_day = df.groupby(["Day Name", "Gender"], as_index=False)        .sum()
+spending_per_day = cube.rollup(["Day Name", "Gender"])
 # printing the grouped data
 spending_per_day
 
@@ -497,7 +481,7 @@ px.bar(spending_per_day, x="Day Name", y="Amount", color="Gender", text_auto=Tru
 
 
 # grouping the month and gender
-spendings_per_month = df.groupby(["Month", "Gender"], as_index=False)        .sum()
+spendings_per_month = cube.rollup(["Month", "Gender"])
 # printing the grouped data
 spendings_per_month
 
@@ -505,9 +489,30 @@ spendings_per_month
 px.bar(spendings_per_month, x="Month", y="Amount", color="Gender", text_auto=True)
 
 
+# In[ ]:
+
+
+# testing the male and female difference of every day, month and card type. With a handful of groups
+# 2,000 resamples already give p-values small enough to survive the correction
+Period_Tests = {by: difference_tests(df, by=by, resamples=2_000) for by in ["Day Name", "Month", "Card Type"]}
+Period_Tests["Day Name"]
+
+
+# In[ ]:
+
+
+Period_Tests["Month"]
+
+
+# In[ ]:
+
+
+Period_Tests["Card Type"]
+
+
 # #### Conclusion:
 # 
-# There isn't a lot of variation in the spending between males and females, however generally females spend more than males in both weekly and monthly categorizations.
+# The differences between males and females look small next to the totals, but they are not noise: per transaction, females spend more than males on every day of the week, in every month and with every card type. After the correction the difference is significant with every card type and on most days, and the corrected intervals of those groups lie below zero. By month it is significant in only a few months; the intervals of the others include zero.
 
 # ### Question 5: Which expense type do customers spend the most on at the end of each month?
 
@@ -523,20 +528,16 @@ px.bar(spendings_per_month, x="Month", y="Amount", color="Gender", text_auto=Tru
 # In[33]:
 
 
-# extracting the month name from the date column
-
-df = date_extractor.extract_day_number(df, 'Date')
+# the day number was already extracted together with the month name
+df[['Date', 'Day Number']].head()
 
 
 # In[34]:
 
 
-def DaysNum(df, days):
-    DayData = pd.DataFrame()
-    for i in days:
-        data = df[df['Day Number']==i]
-        DayData = pd.concat([DayData, data])
-    return DayData
+# select_days keeps the rows of several day numbers with a single mask, and last_days_of_month selects the
+# last days of every month using the real length of each month
+from cceda.dates import select_days, last_days_of_month
 
 
 # In[35]:
@@ -546,14 +547,17 @@ def DaysNum(df, days):
 Days = [29, 30, 31]
 
 # using the function to subset the dataset for the 29th, 30th and 31st
-End_of_Month = DaysNum(df, Days)
+End_of_Month = select_days(df, Days)
+
+# the last 3 days of each month, which also covers the 26th to 28th of February
+Last_3_Days = last_days_of_month(df, 3)
 
 
 # In[36]:
 
 
-# grouping the subset data using the egroupby function
-End_of_month_grouped = End_of_Month.groupby(['Day Number', 'Month', 'Exp Type'], as_index=False).sum()
+# grouping the end of month data by rolling up the cube, which gives the same totals as grouping End_of_Month
+End_of_month_grouped = cube.rollup(['Day Number', 'Month', 'Exp Type'], where={'Day Number': Days})
 
 
 # In[37]:
@@ -586,7 +590,12 @@ for i in Days:
 # In[38]:
 
 
-if "Salem" in df['City'].unique():
+# building an index of the cities once; membership tests are then hash lookups instead of a scan of the column
+from cceda.city_index import CityIndex
+
+city_index = CityIndex(df['City'])
+
+if "Salem" in city_index:
     print("Card is present in Salem")
 else:
     print('Card is not present')
@@ -604,7 +613,7 @@ else:
 cities = ("Amravati","Tezpur", "Dimapur", "Gangtok", "Noida", "Ballia")
 
 for city in cities:
-    if city in df['City'].unique():
+    if city in city_index:
         # printing the results using string formating
         print("Card is present in {}".format(city))
     else:
@@ -620,18 +629,38 @@ for city in cities:
 # In[40]:
 
 
-# list to store the cities
-cities = []
-
-# for loop to findd cities whose name begin with J or K and have a length greater than 10
-for city in df['City'].unique():
-    if ((city[0] == "J") or (city[0] == "K")) and (len(city) > 10):
-        cities.append(city)
+# finding the cities whose name begin with J or K and have a length greater than 10. The index keeps the names
+# sorted, so each prefix is a binary search, and the length filter only looks at the names with that prefix
+cities = city_index.search(prefixes=("J", "K"), min_length=11)
 
 # Printing the cities
 print(cities)
 
 
+# ### Predicting the monthly spendings
+# 
+# The monthly spendings of every card type are forecast for the next three months. The data starts on 4 October 2013 and ends on 26 May 2015, so these two partial months are left out: their totals are not comparable with the complete months. The models are first compared by backtesting: each model is refit at every month from the 12th onwards on the months before it, and scored on the month that followed.
+
+# In[ ]:
+
+
+# forecasting the monthly Amount of every card type. With by=["City", "Card Type", "Exp Type"] the same calls
+# forecast the thousands of City x Card Type x Exp Type series at once
+from cceda.forecast import SpendForecaster
+
+forecaster = SpendForecaster(df, by="Card Type")
+
+# scoring the seasonal naive, exponential smoothing and ridge models on the months they had not seen
+forecaster.backtest(horizon=1, initial=12)
+
+
+# In[ ]:
+
+
+# forecasting the next three months with the ridge model, the one with the lowest error
+forecaster.forecast("ridge", horizon=3)
+
+
 # # FINAL CONCLUSSION AND DISCUSSION
 
 # Based on the analysis performed, if the goal of the bank is to increase the amount of spent by customer, they should:
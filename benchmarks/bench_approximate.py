@@ -0,0 +1,99 @@
+"""
+Accuracy and latency of the sketch answers against exact pandas answers
+
+The sketches are fed the synthetic transactions chunk by chunk. Every
+approximate answer is compared with the exact pandas answer on the whole
+frame: the exact value must lie within the reported bounds.
+
+Usage:
+    python -m benchmarks.bench_approximate --rows 5000000 --capacity 256
+"""
+
+import argparse
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+from benchmarks.common import print_table
+from cceda.approximate import ApproximateAnalysis
+from cceda.loader import load_transactions
+from cceda.questions import prepare_frame
+from cceda.streaming import PERCENTILES
+from cceda.synthetic import write_synthetic_csv
+
+
+def timed(function):
+    start = time.perf_counter()
+    result = function()
+
+    return result, time.perf_counter() - start
+
+
+def compare_top(name, exact, approximate, exact_seconds, approximate_seconds):
+    # the exact totals of the values the sketch reports, and how many of the true top values it found
+    truth = exact.reindex(approximate.index).fillna(0).to_numpy()
+    within = bool(np.all((truth >= approximate['lower']) & (truth <= approximate['upper'])))
+    error = np.max(np.abs(approximate['estimate'].to_numpy() - truth) / np.maximum(truth, 1))
+    found = len(set(exact.index[:len(approximate)]) & set(approximate.index))
+
+    return {'answer': name, 'exact_ms': f'{exact_seconds * 1000:.2f}', 'sketch_ms': f'{approximate_seconds * 1000:.3f}',
+            'max_rel_error': f'{error:.2e}', 'within_bounds': within,
+            'top_found': f'{found}/{len(approximate)}'}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--rows', type=int, default=5_000_000, help='rows of the synthetic csv')
+    parser.add_argument('--capacity', type=int, default=256, help='values tracked per Space-Saving summary')
+    parser.add_argument('--chunksize', type=int, default=500_000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        path = write_synthetic_csv(Path(workdir) / 'synthetic.csv', args.rows)
+        df = prepare_frame(load_transactions(path, use_cache=False))
+
+    analysis = ApproximateAnalysis(capacity=args.capacity)
+    start = time.perf_counter()
+    for offset in range(0, len(df), args.chunksize):
+        analysis.update(df.iloc[offset:offset + args.chunksize])
+    ingest_seconds = time.perf_counter() - start
+
+    rows = []
+    for column in ['Gender', 'Card Type', 'Exp Type', 'City']:
+        exact, exact_seconds = timed(lambda: df[column].value_counts())
+        approximate, approximate_seconds = timed(lambda: analysis.value_counts(column, 10))
+        rows.append(compare_top(f'value_counts {column}', exact, approximate, exact_seconds, approximate_seconds))
+
+    exact, exact_seconds = timed(
+        lambda: df.groupby('City', observed=True)['Amount'].sum().sort_values(ascending=False))
+    approximate, approximate_seconds = timed(lambda: analysis.top_cities_by_spend(10))
+    rows.append(compare_top('top 10 cities by spend', exact, approximate, exact_seconds, approximate_seconds))
+
+    exact, exact_seconds = timed(lambda: df['City'].nunique())
+    approximate, approximate_seconds = timed(analysis.distinct_cities)
+    rows.append({'answer': 'distinct cities', 'exact_ms': f'{exact_seconds * 1000:.2f}',
+                 'sketch_ms': f'{approximate_seconds * 1000:.3f}',
+                 'max_rel_error': f"{abs(approximate['estimate'] - exact) / exact:.2e}",
+                 'within_bounds': approximate['lower'] <= exact <= approximate['upper'], 'top_found': '-'})
+
+    exact, exact_seconds = timed(lambda: df['Amount'].quantile(list(PERCENTILES)))
+    approximate, approximate_seconds = timed(analysis.amount_quantiles)
+    # the error of a quantile is measured as the distance in rank, which is what the sketch bounds
+    amounts = np.sort(df['Amount'].to_numpy())
+    ranks = np.searchsorted(amounts, approximate['estimate'].to_numpy()) / len(amounts)
+    rows.append({'answer': 'Amount quartiles', 'exact_ms': f'{exact_seconds * 1000:.2f}',
+                 'sketch_ms': f'{approximate_seconds * 1000:.3f}',
+                 'max_rel_error': f'{np.max(np.abs(ranks - np.array(PERCENTILES))):.2e} (rank)',
+                 'within_bounds': bool(np.all((exact.to_numpy() >= approximate['lower'].to_numpy()) &
+                                              (exact.to_numpy() <= approximate['upper'].to_numpy()))),
+                 'top_found': '-'})
+
+    print(f'rows: {len(df)}  sketch ingest: {ingest_seconds:.2f}s ({len(df) / ingest_seconds:,.0f} rows/s)  '
+          f'sketches: {analysis.nbytes / 1024:.0f} KB  frame: {df.memory_usage(deep=True).sum() / 2**20:.0f} MB')
+    print_table(rows, ['answer', 'exact_ms', 'sketch_ms', 'max_rel_error', 'within_bounds', 'top_found'])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,106 @@
+"""
+Seconds and peak memory of the question table backends, from the csv to the tables
+
+Synthetic csv files of growing size are answered by every installed
+backend, each in its own process for a clean peak RSS, and the tables of the
+backends are checked to match at every size through a digest. The pandas
+backend parses the whole csv (no snapshot), like a cold start, and is the
+baseline of the speedups; above ``--pandas-max-rows`` it would not fit in
+memory and is skipped. The backends are also checked to compute the same
+tables on the sample csv.
+
+Usage:
+    python -m benchmarks.bench_backends --rows 1000000 10000000 100000000
+"""
+
+import argparse
+import importlib.util
+import json
+import tempfile
+import time
+from pathlib import Path
+
+import pandas as pd
+
+from benchmarks.common import peak_rss_mb, print_table, run_child
+from cceda.backends import BACKENDS, assert_backends_agree
+from cceda.synthetic import write_synthetic_csv
+
+
+def table_digest(table):
+    # a hash of a table that ignores its row order and the dtypes of its group columns
+    groups = [column for column in table.columns if column != 'Amount']
+    table = table.astype({column: str for column in groups}).sort_values(groups).reset_index(drop=True)
+
+    return int(pd.util.hash_pandas_object(table, index=False).sum())
+
+
+def installed():
+    # the backends whose engine is installed, found without importing it
+    return [name for name, backend in BACKENDS.items()
+            if backend.requires is None or importlib.util.find_spec(backend.requires) is not None]
+
+
+def _child(name, path):
+    # answers every question table of a csv with one backend and reports the seconds, peak RSS and digests
+    options = {'use_cache': False} if name == 'pandas' else {}
+    start = time.perf_counter()
+    tables = BACKENDS[name](path, **options).question_tables()
+    seconds = time.perf_counter() - start
+
+    print(json.dumps({'seconds': seconds, 'peak_rss_mb': peak_rss_mb(),
+                      'digests': {table_name: table_digest(table) for table_name, table in tables.items()}}))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--rows', type=int, nargs='+', default=[1_000_000, 10_000_000, 100_000_000],
+                        help='rows of the synthetic csv files')
+    parser.add_argument('--pandas-max-rows', type=int, default=10_000_000,
+                        help='the largest csv the pandas backend loads')
+    parser.add_argument('--child', nargs=2, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        _child(*args.child)
+        return
+
+    names = installed()
+    results = []
+    with tempfile.TemporaryDirectory() as workdir:
+        for rows in args.rows:
+            path = write_synthetic_csv(Path(workdir) / 'synthetic.csv', rows)
+            size_mb = path.stat().st_size / 2**20
+            digests, baseline = {}, None
+
+            for name in names:
+                if name == 'pandas' and rows > args.pandas_max_rows:
+                    results.append({'rows': f'{rows:,}', 'csv_mb': f'{size_mb:,.0f}', 'backend': name,
+                                    'seconds': 'skipped', 'rows_per_s': '-', 'peak_rss_mb': '-', 'speedup': '-'})
+                    continue
+
+                result = run_child('benchmarks.bench_backends', '--child', name, path)
+                digests[name] = result['digests']
+                if name == 'pandas':
+                    baseline = result['seconds']
+                results.append({'rows': f'{rows:,}', 'csv_mb': f'{size_mb:,.0f}', 'backend': name,
+                                'seconds': f"{result['seconds']:.1f}",
+                                'rows_per_s': f"{rows / result['seconds']:,.0f}",
+                                'peak_rss_mb': f"{result['peak_rss_mb']:,.0f}",
+                                'speedup': f"{baseline / result['seconds']:.1f}x" if baseline else '-'})
+
+            # every backend that ran must have computed the same tables
+            reference = next(iter(digests.values()))
+            for name, backend_digests in digests.items():
+                assert backend_digests == reference, f'{name} computes different tables at {rows:,} rows'
+            path.unlink()
+
+    # checked last: a child process starts with the peak RSS of its parent, so the parent stays small until then
+    assert_backends_agree([BACKENDS[name](use_cache=False) if name == 'pandas' else BACKENDS[name]()
+                           for name in names])
+    print(f"backends: {', '.join(names)}, the same tables on the sample csv")
+    print_table(results, ['rows', 'csv_mb', 'backend', 'seconds', 'rows_per_s', 'peak_rss_mb', 'speedup'])
+
+
+if __name__ == '__main__':
+    main()
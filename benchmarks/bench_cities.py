@@ -0,0 +1,71 @@
+"""
+City normalization on distinct values against the row-wise string split
+
+Usage:
+    python -m benchmarks.bench_cities --rows 50000000
+"""
+
+import argparse
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.common import print_table
+from cceda.cities import normalize_cities
+from cceda.schema import INDEX_COLUMN, SAMPLE_CSV
+
+
+def messy_variants(names, rng):
+    # the kinds of variants upstream sends: case, extra whitespace, other country suffixes
+    variants = []
+    for name in names:
+        city = name.split(', ')[0]
+        variants += [name, f'  {city.upper()} ,India', f'{city.lower()} (India)', f'{city},  IN', f'{city} - India']
+
+    return np.array(variants, dtype=object)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--rows', type=int, default=10_000_000)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    sample = pd.read_csv(SAMPLE_CSV, index_col=INDEX_COLUMN)['City']
+    clean_rows = pd.Series(sample.to_numpy()[rng.integers(0, len(sample), args.rows)])
+
+    variants = messy_variants(sample.unique(), rng)
+    messy_rows = pd.Series(variants[rng.integers(0, len(variants), args.rows)])
+
+    rows = []
+
+    def measure(name, run):
+        start = time.perf_counter()
+        result = run()
+        rows.append({'method': name, 'rows': args.rows, 'seconds': f'{time.perf_counter() - start:.3f}'})
+        return result
+
+    split = measure('astype(str).str.split(expand=True)[0]',
+                    lambda: clean_rows.astype(str).str.split(', ', expand=True)[0])
+    measure('pd.factorize (reference)', lambda: pd.factorize(clean_rows))
+    normalized = measure('normalize_cities', lambda: normalize_cities(clean_rows))
+    categorical = clean_rows.astype('category')
+    measure('normalize_cities on a categorical', lambda: normalize_cities(categorical))
+
+    with tempfile.TemporaryDirectory() as workdir:
+        memo = Path(workdir) / 'city_memo.json'
+        measure('normalize_cities, messy variants, cold memo', lambda: normalize_cities(messy_rows, memo))
+        messy = measure('normalize_cities, messy variants, warm memo', lambda: normalize_cities(messy_rows, memo))
+
+    # the clean column only differs from the split where the split kept stray whitespace
+    assert (normalized.astype(str) == split.str.strip()).all()
+    assert messy.cat.categories.equals(normalized.cat.categories)
+
+    print_table(rows, ['method', 'rows', 'seconds'])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+"""
+City index queries against scanning ``df['City'].unique()`` on every lookup
+
+Usage:
+    python -m benchmarks.bench_city_index --rows 5000000 --lookups 5000
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from benchmarks.common import print_table
+from cceda.city_index import CityIndex
+from cceda.loader import load_transactions
+from cceda.questions import prepare_frame
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--rows', type=int, default=2_000_000)
+    parser.add_argument('--lookups', type=int, default=5_000, help='city names per batched lookup')
+    args = parser.parse_args()
+
+    sample = prepare_frame(load_transactions(use_cache=False))
+    rng = np.random.default_rng(0)
+    df = sample.iloc[rng.integers(0, len(sample), args.rows)].reset_index(drop=True)
+
+    # half of the looked-up names exist, half do not
+    known = df['City'].unique()
+    names = [*rng.choice(known, args.lookups // 2), *(f'Nowhere {i}' for i in range(args.lookups // 2))]
+
+    rows, timings = [], {}
+
+    def measure(name, run, repeat=1):
+        start = time.perf_counter()
+        for _ in range(repeat):
+            result = run()
+        timings[name] = (time.perf_counter() - start) / repeat
+        rows.append({'query': name, 'seconds': f'{timings[name]:.6f}'})
+        return result
+
+    index = measure('build CityIndex', lambda: CityIndex(df['City']))
+    scanned = measure('membership via unique() (10 names)',
+                      lambda: [name in df['City'].unique() for name in names[:10]])
+    measure('membership via index (10 names)', lambda: [name in index for name in names[:10]], repeat=1000)
+    batched = measure(f'contains_many ({len(names)} names)', lambda: index.contains_many(names), repeat=100)
+    assert batched[:10].tolist() == scanned
+
+    measure('J/K prefix + length via unique() loop',
+            lambda: [c for c in df['City'].unique() if c[0] in 'JK' and len(c) > 10])
+    measure('J/K prefix + length via index', lambda: index.search(('J', 'K'), min_length=11), repeat=1000)
+
+    city = known[0]
+    measure('rows of one city via mask', lambda: df[df['City'] == city])
+    measure('rows of one city via index', lambda: index.transactions(df, city), repeat=100)
+
+    print(f'rows: {len(df)}  cities: {len(index)}')
+    print_table(rows, ['query', 'seconds'])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+"""
+Cold-start time of a single-question CLI run against the full notebook script
+
+The CLI run is measured with ``python -X importtime`` to show where import time
+goes and to check that no plotting library is imported for a question without
+charts. The full script is run headless (charts are built but not shown).
+
+Usage:
+    python -m benchmarks.bench_cold_start --question q1
+"""
+
+import argparse
+import subprocess
+import sys
+import time
+
+from benchmarks.common import ROOT, print_table
+
+SCRIPT = ROOT / 'Credit Card analysis.py'
+
+# runs the notebook script with the charts built but never displayed
+HEADLESS_SCRIPT = f'''
+import matplotlib, runpy, sys
+matplotlib.use('Agg')
+import plotly.basedatatypes
+plotly.basedatatypes.BaseFigure.show = lambda *args, **kwargs: None
+sys.path.insert(0, {str(ROOT)!r})
+runpy.run_path({str(SCRIPT)!r}, run_name='__main__')
+'''
+
+PLOTTING_MODULES = ('matplotlib', 'plotly')
+
+
+def timed_run(command):
+    # wall time of a command run from the repository root
+    start = time.perf_counter()
+    completed = subprocess.run(command, cwd=ROOT, capture_output=True, text=True, check=True)
+
+    return time.perf_counter() - start, completed.stderr
+
+
+def parse_importtime(stderr):
+    # lines look like: 'import time:  self [us] | cumulative | imported package'
+    modules = {}
+    for line in stderr.splitlines():
+        if line.startswith('import time:') and not line.rstrip().endswith('imported package'):
+            _, self_us, cumulative_us, name = (part.strip() for part in line.replace(':', '|', 1).split('|'))
+            modules[name] = int(cumulative_us)
+
+    return modules
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--question', default='q1')
+    parser.add_argument('--top', type=int, default=8, help='slowest top-level imports to list')
+    args = parser.parse_args()
+
+    cli = [sys.executable, '-X', 'importtime', '-m', 'cceda', 'run', args.question, '--rows', '0']
+
+    # a first run writes the columnar snapshot, so the measured runs are warm
+    timed_run(cli)
+    cli_seconds, stderr = timed_run(cli)
+    script_seconds, _ = timed_run([sys.executable, '-c', HEADLESS_SCRIPT])
+
+    modules = parse_importtime(stderr)
+    plotting = sorted(name for name in modules if name.split('.')[0] in PLOTTING_MODULES)
+    assert not plotting, f'plotting modules imported without charts: {plotting}'
+
+    top_level = {name: us for name, us in modules.items() if '.' not in name}
+    slowest = sorted(top_level.items(), key=lambda item: item[1], reverse=True)[:args.top]
+
+    print_table([{'run': f'ccEDA run {args.question}', 'seconds': f'{cli_seconds:.2f}'},
+                 {'run': 'full script (headless)', 'seconds': f'{script_seconds:.2f}'}], ['run', 'seconds'])
+    print()
+    print_table([{'module': name, 'cumulative_ms': f'{us / 1000:.1f}'} for name, us in slowest],
+                ['module', 'cumulative_ms'])
+    print('no plotting library imported')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+"""
+Build time, memory footprint and per-question latency of the aggregation cube
+
+Usage:
+    python -m benchmarks.bench_cube --rows 5000000
+"""
+
+import argparse
+import tempfile
+import time
+from pathlib import Path
+
+from benchmarks.common import print_table
+from cceda.cube import AggregationCube
+from cceda.loader import load_transactions
+from cceda.questions import QUESTION_GROUPS, assert_tables_equal, prepare_frame, question_table
+from cceda.synthetic import write_synthetic_csv
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--rows', type=int, default=2_000_000, help='rows of the synthetic csv')
+    args = parser.parse_args()
+
+    # the cube must answer every question exactly like pandas does on the sample
+    sample = prepare_frame(load_transactions(use_cache=False))
+    sample_cube = AggregationCube.build(sample)
+    for name in QUESTION_GROUPS:
+        assert_tables_equal(question_table(sample, name), sample_cube.question_table(name))
+    print('sample: every question table matches pandas')
+
+    with tempfile.TemporaryDirectory() as workdir:
+        path = write_synthetic_csv(Path(workdir) / 'synthetic.csv', args.rows)
+        df = prepare_frame(load_transactions(path, use_cache=False))
+
+    start = time.perf_counter()
+    cube = AggregationCube.build(df)
+    build_seconds = time.perf_counter() - start
+
+    frame_mb = df.memory_usage(deep=True).sum() / 2**20
+    print(f'rows: {len(df)}  cells: {cube.cells}  build: {build_seconds:.3f}s  '
+          f'cube: {cube.nbytes / 2**20:.1f} MB  frame: {frame_mb:.1f} MB')
+
+    rows = []
+    for name in QUESTION_GROUPS:
+        start = time.perf_counter()
+        question_table(df, name)
+        pandas_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        cube.question_table(name)
+        cube_seconds = time.perf_counter() - start
+
+        rows.append({'table': name, 'pandas_ms': f'{pandas_seconds * 1000:.2f}',
+                     'cube_ms': f'{cube_seconds * 1000:.2f}',
+                     'speedup': f'{pandas_seconds / cube_seconds:.1f}x'})
+
+    print_table(rows, ['table', 'pandas_ms', 'cube_ms', 'speedup'])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+"""
+Bytes read and latency of the partitioned dataset against a full csv scan
+
+A synthetic csv is converted into a dataset partitioned by year, month and card
+type. Typical narrow questions are then answered twice: by parsing the whole
+csv and filtering it with pandas, and by a dataset scan with column projection
+and predicate pushdown. Both answers are checked to be the same.
+
+Usage:
+    python -m benchmarks.bench_dataset --rows 5000000
+"""
+
+import argparse
+import tempfile
+import time
+from pathlib import Path
+
+import pandas as pd
+
+from benchmarks.common import print_table
+from cceda.dataset import PartitionedDataset, write_dataset
+from cceda.loader import read_transactions_csv
+from cceda.synthetic import write_synthetic_csv
+
+# name, projected columns, dataset filter, the same filter on a pandas frame
+QUERIES = [
+    ('December travel, Gold cards', ['Amount'],
+     {'Year': [2014], 'Month': ['December'], 'Card Type': ['Gold'], 'Exp Type': ['Travel']},
+     lambda df: (df['Date'].dt.year == 2014) & (df['Date'].dt.month == 12) & (df['Card Type'] == 'Gold')
+     & (df['Exp Type'] == 'Travel')),
+    ('2014 by city', ['City', 'Amount'], {'Year': [2014]}, lambda df: df['Date'].dt.year == 2014),
+    ('a handful of cities', ['City', 'Amount'],
+     {'City': ['Delhi, India', 'Kolkata, India', 'Jaipur, India', 'Pune, India', 'Surat, India']},
+     lambda df: df['City'].isin(['Delhi, India', 'Kolkata, India', 'Jaipur, India', 'Pune, India', 'Surat, India'])),
+    ('one week, large amounts', ['Exp Type', 'Amount'],
+     {'Date': ('2014-12-01', '2014-12-07'), 'Amount': (300_000, 10**9)},
+     lambda df: df['Date'].between('2014-12-01', '2014-12-07') & (df['Amount'] >= 300_000)),
+]
+
+
+def answer(frame, columns):
+    # the total Amount, per the first projected column when there are two
+    if len(columns) == 1:
+        return pd.Series({'total': int(frame['Amount'].sum())})
+
+    return frame.groupby(columns[0], observed=True)['Amount'].sum().sort_index()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--rows', type=int, default=5_000_000, help='rows of the synthetic csv')
+    parser.add_argument('--row-group-size', type=int, default=65_536)
+    args = parser.parse_args()
+
+    rows = []
+    with tempfile.TemporaryDirectory() as workdir:
+        path = write_synthetic_csv(Path(workdir) / 'synthetic.csv', args.rows)
+        csv_bytes = path.stat().st_size
+
+        start = time.perf_counter()
+        write_dataset(read_transactions_csv(path), Path(workdir) / 'dataset', by_card_type=True,
+                      row_group_size=args.row_group_size)
+        write_seconds = time.perf_counter() - start
+        dataset = PartitionedDataset(Path(workdir) / 'dataset')
+        layout = dataset.stats()
+
+        for name, columns, where, mask in QUERIES:
+            start = time.perf_counter()
+            df = read_transactions_csv(path)
+            expected = answer(df[mask(df)], columns)
+            csv_seconds = time.perf_counter() - start
+            del df
+
+            start = time.perf_counter()
+            actual = answer(dataset.scan(columns, where), columns)
+            dataset_seconds = time.perf_counter() - start
+            pd.testing.assert_series_equal(expected, actual, check_names=False, check_index_type=False,
+                                           check_categorical=False)
+
+            scanned = dataset.last_scan
+            rows.append({'query': name, 'csv_s': f'{csv_seconds:.2f}', 'dataset_ms': f'{dataset_seconds * 1000:.1f}',
+                         'speedup': f'{csv_seconds / dataset_seconds:,.0f}x',
+                         'csv_mb': f'{csv_bytes / 2**20:.1f}', 'dataset_mb': f"{scanned['bytes_read'] / 2**20:.2f}",
+                         'partitions': f"{scanned['partitions']}/{layout['partitions']}",
+                         'row_groups': f"{scanned['row_groups']}/{layout['row_groups']}"})
+
+    print(f"rows: {args.rows:,}  csv: {csv_bytes / 2**20:.1f} MB  dataset: {layout['bytes'] / 2**20:.1f} MB in "
+          f"{layout['partitions']} partitions, {layout['row_groups']} row groups, written in {write_seconds:.1f}s")
+    print_table(rows, ['query', 'csv_s', 'dataset_ms', 'speedup', 'csv_mb', 'dataset_mb', 'partitions', 'row_groups'])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,59 @@
+"""
+One-call date part extraction against the three separate legacy extract_* calls
+
+Usage:
+    python -m benchmarks.bench_dates --rows 2000000
+"""
+
+import argparse
+import time
+import warnings
+
+import pandas as pd
+
+from benchmarks.common import print_table
+from cceda.dates import DateColumnsExtractor
+from cceda.schema import INDEX_COLUMN, SAMPLE_CSV
+
+
+def legacy_extract(df, date_column):
+    # the original extractor: one format-inferring pd.to_datetime per date part
+    warnings.simplefilter('ignore', UserWarning)
+    df['Month'] = pd.to_datetime(df[date_column]).dt.month_name()
+    df['Day Name'] = pd.to_datetime(df[date_column]).dt.day_name()
+    df['Day Number'] = pd.to_datetime(df[date_column]).dt.day
+
+    return df
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--rows', type=int, default=1_000_000, help='rows to extract from')
+    args = parser.parse_args()
+
+    sample = pd.read_csv(SAMPLE_CSV, index_col=INDEX_COLUMN)
+    repeats = -(-args.rows // len(sample))
+    frame = pd.concat([sample] * repeats, ignore_index=True).iloc[:args.rows]
+
+    timings = {}
+    for name, run in [('legacy month/day name/day number', lambda df: legacy_extract(df, 'Date')),
+                      ('extract_all', lambda df: DateColumnsExtractor().extract_all(df, 'Date'))]:
+        df = frame.copy()
+        start = time.perf_counter()
+        run(df)
+        timings[name] = time.perf_counter() - start
+
+    # both paths must agree on the parts they have in common
+    legacy = legacy_extract(frame.copy(), 'Date')
+    new = DateColumnsExtractor().extract_all(frame.copy(), 'Date')
+    for column in ['Month', 'Day Name', 'Day Number']:
+        assert (legacy[column].astype(str) == new[column].astype(str)).all(), column
+
+    baseline = timings['legacy month/day name/day number']
+    print_table([{'method': name, 'rows': len(frame), 'seconds': f'{seconds:.3f}',
+                  'speedup': f'{baseline / seconds:.1f}x'} for name, seconds in timings.items()],
+                ['method', 'rows', 'seconds', 'speedup'])
+
+
+if __name__ == '__main__':
+    main()
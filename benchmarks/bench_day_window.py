@@ -0,0 +1,57 @@
+"""
+Day-window selection with one mask against the original DaysNum concat loop
+
+Usage:
+    python -m benchmarks.bench_day_window --rows 5000000
+"""
+
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.common import print_table
+from cceda.dates import last_days_of_month, select_days
+from cceda.loader import load_transactions
+from cceda.questions import prepare_frame
+
+
+def DaysNum(df, days):
+    # the original Question 5 helper: one full scan and one growing concat per day
+    DayData = pd.DataFrame()
+    for i in days:
+        data = df[df['Day Number'] == i]
+        DayData = pd.concat([DayData, data])
+    return DayData
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--rows', type=int, default=5_000_000)
+    parser.add_argument('--days', type=int, default=30, help='size of the day window')
+    args = parser.parse_args()
+
+    sample = prepare_frame(load_transactions(use_cache=False))
+    picks = np.random.default_rng(0).integers(0, len(sample), args.rows)
+    df = sample.iloc[picks].reset_index(drop=True)
+    days = list(range(1, args.days + 1))
+
+    rows = []
+    results = {}
+    for name, select in [('DaysNum', lambda: DaysNum(df, days)),
+                         ('select_days', lambda: select_days(df, days)),
+                         ('last_days_of_month', lambda: last_days_of_month(df, args.days))]:
+        start = time.perf_counter()
+        results[name] = select()
+        rows.append({'method': name, 'rows_in': len(df), 'rows_out': len(results[name]),
+                     'seconds': f'{time.perf_counter() - start:.3f}'})
+
+    # both day-number selections keep the same rows, only the order differs
+    assert results['DaysNum'].index.sort_values().equals(results['select_days'].index)
+
+    print_table(rows, ['method', 'rows_in', 'rows_out', 'seconds'])
+
+
+if __name__ == '__main__':
+    main()
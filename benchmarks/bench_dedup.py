@@ -0,0 +1,149 @@
+"""
+Hashed duplicate detection against pandas ``df.duplicated()``, and its memory on long streams
+
+Batches are drawn from the sample with random amounts, so rows are unique
+unless copied; each batch repeats 1% of its own rows and resends 5% of the
+previous batch, like an upstream that resends overlapping batches. The flags
+are checked against pandas, within a batch and against the history. Then a
+long stream of batches is deduplicated in its own process with an exact and a
+Bloom filter history, at two lengths, to show how memory grows.
+
+Usage:
+    python -m benchmarks.bench_dedup --rows 10000000 --stream-rows 100000000
+"""
+
+import argparse
+import json
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.common import peak_rss_mb, print_table, run_child
+from cceda.dedup import DEDUP_COLUMNS, UNIQUE, Deduplicator
+from cceda.loader import load_transactions
+
+
+def make_batch(sample, rows, rng, previous=None, repeated=0.01, resent=0.05):
+    # random sample rows with random amounts, some of them copied within the batch or from the previous
+    # batch; returns the batch and its draws (sample row and Amount of every row), to resend from
+    draws, amounts = rng.integers(0, len(sample), rows), rng.integers(1, 10**9, rows)
+
+    copies = rng.choice(rows, int(rows * repeated), replace=False)
+    sources = rng.integers(0, rows, len(copies))
+    draws[copies], amounts[copies] = draws[sources], amounts[sources]
+    if previous is not None:
+        copies = rng.choice(rows, int(rows * resent), replace=False)
+        sources = rng.integers(0, len(previous[0]), len(copies))
+        draws[copies], amounts[copies] = previous[0][sources], previous[1][sources]
+
+    batch = sample.iloc[draws].reset_index(drop=True)
+    batch['Amount'] = amounts
+
+    return batch, (draws, amounts)
+
+
+def measured(function):
+    # the result, the seconds and the peak of the memory allocated while running a function
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = function()
+    seconds = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    return result, seconds, peak / 2**20
+
+
+def compare(sample, rows, rng):
+    # within one batch, then a new batch against the history of the first
+    first, draws = make_batch(sample, rows, rng)
+    second, _ = make_batch(sample, rows // 10, rng, previous=draws)
+    results = []
+
+    expected, pandas_seconds, pandas_mb = measured(lambda: first.duplicated(subset=DEDUP_COLUMNS).to_numpy())
+    flags, seconds, mb = measured(lambda: Deduplicator().flags(first))
+    assert np.array_equal(flags != UNIQUE, expected)
+    results.append({'check': 'within a batch', 'rows': rows, 'pandas_s': f'{pandas_seconds:.2f}',
+                    'pandas_mb': f'{pandas_mb:.0f}', 'mode': 'exact', 'dedup_s': f'{seconds:.2f}',
+                    'dedup_mb': f'{mb:.0f}', 'speedup': f'{pandas_seconds / seconds:.1f}x',
+                    'history_mb': '-', 'duplicates': int(expected.sum())})
+
+    # pandas needs the history rows themselves to find the resent ones
+    expected, pandas_seconds, pandas_mb = measured(
+        lambda: pd.concat([first, second]).duplicated(subset=DEDUP_COLUMNS).to_numpy()[len(first):])
+    for mode, options in (('exact', {}), ('bloom 0.1%', {'bloom_capacity': rows, 'error_rate': 0.001})):
+        deduplicator = Deduplicator(**options)
+        deduplicator.apply(first)
+        flags, seconds, mb = measured(lambda: deduplicator.flags(second))
+        wrong = int(np.count_nonzero((flags != UNIQUE) != expected))
+        # an exact history matches pandas; a Bloom filter may only report extra duplicates
+        assert wrong == 0 if mode == 'exact' else not np.any(expected & (flags == UNIQUE))
+        history = deduplicator.history
+        results.append({'check': 'against the history', 'rows': len(second), 'pandas_s': f'{pandas_seconds:.2f}',
+                        'pandas_mb': f'{pandas_mb:.0f}', 'mode': mode, 'dedup_s': f'{seconds:.2f}',
+                        'dedup_mb': f'{mb:.0f}', 'speedup': f'{pandas_seconds / seconds:.1f}x',
+                        'history_mb': f'{history.nbytes / 2**20:.0f}',
+                        'duplicates': f'{int(expected.sum())}' + (f' (+{wrong} false)' if wrong else '')})
+
+    return results
+
+
+def _child(mode, rows, batch_rows):
+    # deduplicates a stream of batches with a fresh history and reports the throughput and peak memory
+    rows, batch_rows = int(rows), int(batch_rows)
+    sample = load_transactions(use_cache=False).reset_index(drop=True)
+    rng = np.random.default_rng(1)
+    options = {'bloom_capacity': rows} if mode == 'bloom' else {}
+    deduplicator = Deduplicator(**options)
+
+    draws, seconds, counts = None, 0.0, np.zeros(3, dtype=np.int64)
+    for _ in range(rows // batch_rows):
+        batch, draws = make_batch(sample, batch_rows, rng, previous=draws)
+        start = time.perf_counter()
+        _, report = deduplicator.apply(batch)
+        seconds += time.perf_counter() - start
+        counts += [report['unique'], report['duplicates_in_batch'], report['duplicates_of_history']]
+
+    print(json.dumps({'rows': int(counts.sum()), 'seconds': seconds, 'peak_rss_mb': peak_rss_mb(),
+                      'history_mb': deduplicator.history.nbytes / 2**20, 'unique': int(counts[0]),
+                      'in_batch': int(counts[1]), 'in_history': int(counts[2])}))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--rows', type=int, default=10_000_000, help='rows of the batch compared with pandas')
+    parser.add_argument('--stream-rows', type=int, default=100_000_000, help='rows of the longest stream')
+    parser.add_argument('--batch-rows', type=int, default=1_000_000, help='rows of each batch of the stream')
+    parser.add_argument('--child', nargs=3, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        _child(*args.child)
+        return
+
+    # the streams run first: a child process starts with the peak RSS of its parent, so the parent stays small
+    results = []
+    for mode in ('exact', 'bloom'):
+        for rows in (args.stream_rows // 10, args.stream_rows):
+            result = run_child('benchmarks.bench_dedup', '--child', mode, rows, args.batch_rows)
+            results.append({'history': mode, 'rows': f"{result['rows']:,}", 'seconds': f"{result['seconds']:.1f}",
+                            'rows_per_s': f"{result['rows'] / result['seconds']:,.0f}",
+                            'history_mb': f"{result['history_mb']:.0f}",
+                            'peak_rss_mb': f"{result['peak_rss_mb']:.0f}",
+                            'in_batch': f"{result['in_batch']:,}", 'in_history': f"{result['in_history']:,}"})
+
+    print(f'streams of {args.batch_rows:,}-row batches, each deduplicated against all the batches before it')
+    print_table(results, ['history', 'rows', 'seconds', 'rows_per_s', 'history_mb', 'peak_rss_mb', 'in_batch',
+                          'in_history'])
+    print()
+
+    sample = load_transactions(use_cache=False).reset_index(drop=True)
+    print_table(compare(sample, args.rows, np.random.default_rng(0)),
+                ['check', 'rows', 'pandas_s', 'pandas_mb', 'mode', 'dedup_s', 'dedup_mb', 'speedup', 'history_mb',
+                 'duplicates'])
+
+
+if __name__ == '__main__':
+    main()
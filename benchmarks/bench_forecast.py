@@ -0,0 +1,89 @@
+"""
+Series per second of the batched forecasting models, against fitting one series at a time
+
+The monthly City x Card Type x Exp Type series of a synthetic csv are
+forecast by every model at once, then a sample of them one series at a time
+(the cost of one model object per series). The series are then tiled with
+noise to show how the batched models scale to tens of thousands of series, and
+every model is backtested with rolling origins.
+
+Usage:
+    python -m benchmarks.bench_forecast --rows 10000000 --tiles 10
+"""
+
+import argparse
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+from benchmarks.common import print_table
+from cceda.forecast import MODELS, SpendForecaster, backtest
+from cceda.loader import load_transactions
+from cceda.synthetic import write_synthetic_csv
+
+
+def best_seconds(function, repeat=3):
+    # the fastest of a few runs
+    seconds = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        seconds.append(time.perf_counter() - start)
+
+    return min(seconds)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--rows', type=int, default=10_000_000, help='rows of the synthetic csv')
+    parser.add_argument('--tiles', type=int, default=10, help='copies of the series in the scaling run')
+    parser.add_argument('--horizon', type=int, default=3)
+    parser.add_argument('--loop-series', type=int, default=200, help='series fitted one at a time')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        path = write_synthetic_csv(Path(workdir) / 'synthetic.csv', args.rows)
+        df = load_transactions(path, cache_dir=Path(workdir) / 'cache')
+        start = time.perf_counter()
+        forecaster = SpendForecaster(df)
+        build_seconds = time.perf_counter() - start
+        del df
+
+    history = forecaster.series.to_numpy(dtype=np.float64)
+    months, n_series = history.shape
+    rng = np.random.default_rng(0)
+    tiled = np.tile(history, args.tiles) * rng.uniform(0.5, 1.5, (1, n_series * args.tiles))
+    loop = history[:, rng.choice(n_series, min(args.loop_series, n_series), replace=False)]
+
+    rows = []
+    for model in MODELS:
+        forecast = MODELS[model]
+        batched = best_seconds(lambda: forecast(history, args.horizon))
+        one_by_one = best_seconds(
+            lambda: [forecast(loop[:, [column]], args.horizon) for column in range(loop.shape[1])], repeat=1)
+        one_by_one /= loop.shape[1]
+        # the one-at-a-time forecasts must be the batched ones
+        sample = loop[:, :20]
+        assert np.allclose(forecast(sample, args.horizon),
+                           np.column_stack([forecast(sample[:, [column]], args.horizon)[:, 0]
+                                            for column in range(sample.shape[1])]))
+        scaled = best_seconds(lambda: forecast(tiled, args.horizon))
+        backtest_seconds = best_seconds(lambda: backtest(history, model, horizon=1, initial=12), repeat=1)
+        scores = backtest(history, model, horizon=1, initial=12)
+
+        rows.append({'model': model, 'series': n_series, 'batched_ms': f'{batched * 1000:.2f}',
+                     'series_per_s': f'{n_series / batched:,.0f}', 'one_by_one_per_s': f'{1 / one_by_one:,.0f}',
+                     'speedup': f'{one_by_one * n_series / batched:,.0f}x',
+                     f'x{args.tiles}_series_per_s': f'{tiled.shape[1] / scaled:,.0f}',
+                     'backtest_s': f'{backtest_seconds:.2f}', 'origins': scores['origins'],
+                     'wape': f"{scores['wape']:.3f}"})
+
+    print(f'rows: {args.rows:,}  months: {months}  series: {n_series:,} (resampled in {build_seconds:.2f}s)  '
+          f'horizon: {args.horizon}')
+    print_table(rows, list(rows[0]))
+
+
+if __name__ == '__main__':
+    main()
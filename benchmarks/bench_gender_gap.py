@@ -0,0 +1,84 @@
+"""
+Gender gap engine against the original per-city loop of Question 1
+
+The sample csv is used to check that the new tables equal the original output,
+then both implementations are timed on synthetic data with many cities.
+
+Usage:
+    python -m benchmarks.bench_gender_gap --cities 100000 --rows 2000000
+"""
+
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.common import print_table
+from cceda.gender_gap import gender_gap, gender_gap_extremes
+from cceda.schema import INDEX_COLUMN, SAMPLE_CSV
+from tests.legacy import legacy_gender_gap
+
+
+def validate_on_sample():
+    """
+    Checks that the gender gap engine reproduces the original Question 1 tables
+    """
+
+    df = pd.read_csv(SAMPLE_CSV, index_col=INDEX_COLUMN)
+    df['City'] = df['City'].astype(str).str.split(', ', expand=True)[0]
+
+    legacy_total, legacy_extremes = legacy_gender_gap(df)
+    gap = gender_gap(df)
+
+    pd.testing.assert_frame_equal(gap[legacy_total.columns], legacy_total.reset_index(drop=True))
+    for name, table in gender_gap_extremes(gap).items():
+        assert table['City'].tolist() == legacy_extremes[name]['City'].tolist(), name
+        assert table['Difference'].tolist() == legacy_extremes[name]['Difference'].tolist(), name
+
+    # with fill_missing the single-gender cities that the merge dropped are kept
+    filled = gender_gap(df, fill_missing=True)
+    assert len(filled) >= len(gap)
+
+    return len(gap), len(filled)
+
+
+def synthetic_frame(n_cities, n_rows, seed=0):
+    # skewed city popularity, like the sample where a few cities dominate
+    rng = np.random.default_rng(seed)
+    weights = 1 / np.arange(1, n_cities + 1) ** 0.8
+    cities = rng.choice(n_cities, size=n_rows, p=weights / weights.sum())
+
+    return pd.DataFrame({'City': pd.Index([f'City {i}' for i in range(n_cities)])[cities],
+                         'Gender': rng.choice(['F', 'M'], size=n_rows),
+                         'Amount': rng.integers(1_000, 1_000_000, size=n_rows)})
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--cities', type=int, default=100_000)
+    parser.add_argument('--rows', type=int, default=2_000_000)
+    parser.add_argument('--legacy-cities', type=int, default=2_000,
+                        help='cities for the legacy loop, which is quadratic')
+    args = parser.parse_args()
+
+    kept, filled = validate_on_sample()
+    print(f'sample: identical to the original output ({kept} cities, {filled} with fill_missing)')
+
+    rows = []
+    for name, n_cities, run in [('legacy loop', args.legacy_cities, legacy_gender_gap),
+                                ('gender_gap', args.legacy_cities, gender_gap),
+                                ('gender_gap', args.cities, gender_gap),
+                                ('gender_gap + extremes', args.cities,
+                                 lambda df: gender_gap_extremes(gender_gap(df, fill_missing=True)))]:
+        df = synthetic_frame(n_cities, args.rows)
+        start = time.perf_counter()
+        run(df)
+        rows.append({'method': name, 'cities': n_cities, 'rows': args.rows,
+                     'seconds': f'{time.perf_counter() - start:.3f}'})
+
+    print_table(rows, ['method', 'cities', 'rows', 'seconds'])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+"""
+Incremental updates from daily batches against a full recompute
+
+The sample is split into one delta csv per transaction date. The deltas are
+applied one after another, the time per delta is reported, a batch is applied a
+second time to check it is detected, and the final state is compared with a
+full recompute.
+
+Usage:
+    python -m benchmarks.bench_incremental
+"""
+
+import argparse
+import tempfile
+import time
+from pathlib import Path
+
+import pandas as pd
+
+from cceda.incremental import IncrementalAggregates
+from cceda.questions import prepare_frame
+from cceda.schema import INDEX_COLUMN, SAMPLE_CSV
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--input', default=SAMPLE_CSV, help='the transactions csv to split into daily batches')
+    args = parser.parse_args()
+
+    raw = pd.read_csv(args.input, index_col=INDEX_COLUMN)
+    dates = pd.to_datetime(raw['Date'], format='%d-%b-%y')
+
+    with tempfile.TemporaryDirectory() as workdir:
+        workdir = Path(workdir)
+        batches = []
+        for day, rows in raw.groupby(dates):
+            path = workdir / f'{day:%Y-%m-%d}.csv'
+            rows.to_csv(path)
+            batches.append((path, len(rows)))
+
+        state = IncrementalAggregates(workdir / 'state.json')
+        seconds = []
+        for path, _ in batches:
+            start = time.perf_counter()
+            state.apply(path)
+            seconds.append(time.perf_counter() - start)
+
+        print(f'{len(batches)} daily batches, {sum(rows for _, rows in batches)} rows')
+        print(f'per batch: mean {1000 * sum(seconds) / len(seconds):.1f} ms, '
+              f'max {1000 * max(seconds):.1f} ms (including the state file write)')
+
+        # applying a batch again must not change anything
+        assert not state.apply(batches[0][0])
+        print('re-applied batch detected and skipped')
+
+        start = time.perf_counter()
+        reloaded = IncrementalAggregates(workdir / 'state.json')
+        reloaded.verify(prepare_frame(raw.copy()))
+        print(f'incremental totals match a full recompute ({time.perf_counter() - start:.2f}s to check)')
+
+
+if __name__ == '__main__':
+    main()
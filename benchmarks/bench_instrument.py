@@ -0,0 +1,75 @@
+"""
+Overhead of the stage instrumentation: off, on, and on with memory tracing
+
+Usage:
+    python -m benchmarks.bench_instrument --rows 1000000
+"""
+
+import argparse
+import tempfile
+import time
+from pathlib import Path
+
+from benchmarks.common import print_table
+from cceda.analysis import QUESTIONS, run
+from cceda.instrument import Instrumentation, stage
+from cceda.synthetic import write_synthetic_csv
+
+
+def per_mark_seconds(marks=1_000_000):
+    # the cost of one stage mark while instrumentation is off
+    start = time.perf_counter()
+    for _ in range(marks):
+        with stage('noop'):
+            pass
+    marked = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for _ in range(marks):
+        pass
+    bare = time.perf_counter() - start
+
+    return (marked - bare) / marks
+
+
+def timed_run(path, cache_dir, mode):
+    # one full run of every question, with instrumentation 'off', 'on' or 'memory'
+    start = time.perf_counter()
+    if mode == 'off':
+        run(list(QUESTIONS), path, cache_dir=cache_dir)
+    else:
+        with Instrumentation(trace_memory=mode == 'memory'):
+            run(list(QUESTIONS), path, cache_dir=cache_dir)
+
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--rows', type=int, default=1_000_000, help='rows of the synthetic csv')
+    parser.add_argument('--repeat', type=int, default=7)
+    args = parser.parse_args()
+
+    print(f'one stage mark with instrumentation off: {per_mark_seconds() * 1e9:.0f} ns')
+
+    with tempfile.TemporaryDirectory() as workdir:
+        path = write_synthetic_csv(Path(workdir) / 'synthetic.csv', args.rows)
+        cache_dir = Path(workdir) / 'cache'
+        # a first run writes the snapshot, so every measured run loads it the same way
+        run(['q1'], path, cache_dir=cache_dir)
+
+        # the modes take turns, so a slow moment of the machine does not hit one mode only
+        best = {'off': float('inf'), 'on': float('inf'), 'memory': float('inf')}
+        for _ in range(args.repeat):
+            for mode in best:
+                best[mode] = min(best[mode], timed_run(path, cache_dir, mode))
+        off, on, memory = best['off'], best['on'], best['memory']
+
+    print_table([{'mode': 'off', 'seconds': f'{off:.3f}', 'overhead': '-'},
+                 {'mode': 'on', 'seconds': f'{on:.3f}', 'overhead': f'{on / off - 1:+.1%}'},
+                 {'mode': 'on + trace_memory', 'seconds': f'{memory:.3f}', 'overhead': f'{memory / off - 1:+.1%}'}],
+                ['mode', 'seconds', 'overhead'])
+
+
+if __name__ == '__main__':
+    main()
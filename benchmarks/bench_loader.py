@@ -0,0 +1,75 @@
+"""
+Cold and warm load time and peak RSS of the typed loader against plain read_csv
+
+Usage:
+    python -m benchmarks.bench_loader --rows 2000000
+    python -m benchmarks.bench_loader --input 'Credit card transactions India.csv'
+"""
+
+import argparse
+import json
+import tempfile
+import time
+from pathlib import Path
+
+import pandas as pd
+
+from benchmarks.common import peak_rss_mb, print_table, run_child
+from cceda.loader import load_transactions, read_transactions_csv
+from cceda.schema import INDEX_COLUMN
+from cceda.synthetic import write_synthetic_csv
+
+MODES = ['read_csv', 'typed', 'typed_chunked', 'snapshot_cold', 'snapshot_warm']
+
+
+def _child(mode, path, cache_dir):
+    # a single measurement, run in its own process
+    start = time.perf_counter()
+
+    if mode == 'read_csv':
+        df = pd.read_csv(path, index_col=INDEX_COLUMN)
+    elif mode == 'typed':
+        df = read_transactions_csv(path)
+    elif mode == 'typed_chunked':
+        df = read_transactions_csv(path, chunksize=500_000)
+    else:
+        df = load_transactions(path, cache_dir=cache_dir)
+
+    # touching every column so memory-mapped pages are really read
+    total = int(df['Amount'].sum())
+    seconds = time.perf_counter() - start
+
+    print(json.dumps({'seconds': seconds, 'peak_rss_mb': peak_rss_mb(), 'rows': len(df),
+                      'frame_mb': df.memory_usage(deep=True).sum() / 2**20, 'total': total}))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--input', help='an existing transactions csv')
+    parser.add_argument('--rows', type=int, default=1_000_000, help='rows of the synthetic csv')
+    parser.add_argument('--child', nargs=3, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        _child(*args.child)
+        return
+
+    with tempfile.TemporaryDirectory() as workdir:
+        path = args.input
+        if path is None:
+            path = Path(workdir) / 'synthetic.csv'
+            write_synthetic_csv(path, args.rows)
+        cache_dir = Path(workdir) / 'cache'
+
+        rows = []
+        for mode in MODES:
+            result = run_child('benchmarks.bench_loader', '--child', mode, path, cache_dir)
+            rows.append({'mode': mode, 'rows': result['rows'], 'seconds': f"{result['seconds']:.3f}",
+                         'peak_rss_mb': f"{result['peak_rss_mb']:.0f}",
+                         'frame_mb': f"{result['frame_mb']:.1f}"})
+
+        print_table(rows, ['mode', 'rows', 'seconds', 'peak_rss_mb', 'frame_mb'])
+
+
+if __name__ == '__main__':
+    main()
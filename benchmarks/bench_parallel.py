@@ -0,0 +1,59 @@
+"""
+Scaling of the parallel Q1-Q5 aggregation from 1 to N worker processes
+
+Usage:
+    python -m benchmarks.bench_parallel --rows 20000000 --max-workers 32
+"""
+
+import argparse
+import os
+import time
+
+import numpy as np
+
+from benchmarks.common import print_table
+from cceda.loader import load_transactions
+from cceda.parallel import parallel_question_tables
+from cceda.questions import QUESTION_GROUPS, assert_tables_equal, prepare_frame, question_tables
+
+
+def synthetic_frame(rows, seed=0):
+    # prepared rows drawn with replacement from the sample
+    sample = prepare_frame(load_transactions(use_cache=False))
+    picks = np.random.default_rng(seed).integers(0, len(sample), rows)
+
+    return sample.iloc[picks].reset_index(drop=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--rows', type=int, default=10_000_000)
+    parser.add_argument('--max-workers', type=int, default=os.cpu_count())
+    args = parser.parse_args()
+
+    df = synthetic_frame(args.rows)
+
+    start = time.perf_counter()
+    reference = question_tables(df)
+    pandas_seconds = time.perf_counter() - start
+
+    workers = sorted({1, *(2**i for i in range(1, 8) if 2**i < args.max_workers), args.max_workers})
+    rows, single = [], None
+    for count in workers:
+        start = time.perf_counter()
+        tables = parallel_question_tables(df, workers=count)
+        seconds = time.perf_counter() - start
+        single = single or seconds
+
+        for name in QUESTION_GROUPS:
+            assert_tables_equal(reference[name], tables[name])
+
+        rows.append({'workers': count, 'seconds': f'{seconds:.2f}', 'speedup': f'{single / seconds:.2f}x',
+                     'vs_pandas': f'{pandas_seconds / seconds:.2f}x'})
+
+    print(f'rows: {len(df)}  cpus: {os.cpu_count()}  single-process pandas: {pandas_seconds:.2f}s')
+    print_table(rows, ['workers', 'seconds', 'speedup', 'vs_pandas'])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+"""
+Latency and hit rate of the memoized query layer on a workload of repeated question variants
+
+The workload draws question variants with a skewed popularity (a few variants
+are asked often, most rarely), like analysts re-asking the same questions.
+It is answered without a cache, with caches of several memory bounds, and by
+a fresh process-like layer that only has the disk tier.
+
+Usage:
+    python -m benchmarks.bench_query_cache --rows 1000000 --queries 2000
+"""
+
+import argparse
+import itertools
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+from benchmarks.common import print_table
+from cceda.analysis import QUESTIONS
+from cceda.query_cache import QueryCache, QueryLayer
+from cceda.schema import CARD_TYPES
+from cceda.synthetic import write_synthetic_csv
+
+
+def variants():
+    # every question variant of the workload, as (question, parameters)
+    asked = [('q1', {'top_k': top_k, 'bottom_k': bottom_k}) for top_k, bottom_k in itertools.product(
+        range(5, 55, 5), (3, 5, 10))]
+    asked += [('q2', {'card_types': None})] + [('q2', {'card_types': [card]}) for card in CARD_TYPES]
+    asked += [('q3', {}), ('q4', {})]
+    asked += [('q5', {'days': list(range(first, 32))}) for first in range(20, 32)]
+
+    return asked
+
+
+def workload(count, seed=0):
+    # zipf-like popularity over the variants, in a shuffled order
+    asked = variants()
+    rng = np.random.default_rng(seed)
+    weights = 1 / np.arange(1, len(asked) + 1)
+    order = rng.permutation(len(asked))
+
+    return [asked[order[i]] for i in rng.choice(len(asked), size=count, p=weights / weights.sum())]
+
+
+def summary(label, seconds, queries, cache=None):
+    row = {'mode': label, 'total_s': f'{seconds:.3f}', 'queries_per_s': f'{len(queries) / seconds:,.0f}',
+           'hit_rate': '-', 'evictions': '-', 'p50_ms': '-', 'p99_ms': '-', 'held_mb': '-'}
+    if cache is not None:
+        stats = cache.stats()
+        latencies = np.concatenate([np.array(values) for values in cache.latencies.values() if values]) * 1000
+        row.update({'hit_rate': f"{stats['hit_rate']:.1%}", 'evictions': stats['evictions'],
+                    'p50_ms': f'{np.percentile(latencies, 50):.3f}', 'p99_ms': f'{np.percentile(latencies, 99):.3f}',
+                    'held_mb': f"{stats['bytes'] / 2**20:.2f}"})
+
+    return row
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--rows', type=int, default=1_000_000, help='rows of the synthetic csv')
+    parser.add_argument('--queries', type=int, default=2_000)
+    args = parser.parse_args()
+
+    queries = workload(args.queries)
+    rows = []
+
+    with tempfile.TemporaryDirectory() as workdir:
+        path = write_synthetic_csv(Path(workdir) / 'synthetic.csv', args.rows)
+        cache_dir, disk_dir = Path(workdir) / 'cache', Path(workdir) / 'answers'
+
+        # the layer's data is loaded once; only answering is measured
+        layer = QueryLayer(path, cache_dir=cache_dir, cache=QueryCache(max_bytes=0))
+        start = time.perf_counter()
+        for question, params in queries:
+            QUESTIONS[question](layer.cube, **params)
+        rows.append(summary('no cache', time.perf_counter() - start, queries))
+
+        for max_bytes in (256 * 2**10, 1 * 2**20, 64 * 2**20):
+            layer.cache = QueryCache(max_bytes=max_bytes, disk_dir=disk_dir if max_bytes == 64 * 2**20 else None)
+            start = time.perf_counter()
+            for question, params in queries:
+                layer.ask(question, **params)
+            rows.append(summary(f'memory {max_bytes / 2**20:g} MB', time.perf_counter() - start, queries, layer.cache))
+
+        # a new layer, e.g. another process, starts with an empty memory tier but the disk tier written above
+        layer = QueryLayer(path, cache_dir=cache_dir, disk_dir=disk_dir)
+        start = time.perf_counter()
+        for question, params in queries:
+            layer.ask(question, **params)
+        rows.append(summary('new process, disk tier', time.perf_counter() - start, queries, layer.cache))
+
+    print(f'rows: {args.rows:,}  queries: {len(queries)}  distinct variants: {len(variants())}')
+    print_table(rows, ['mode', 'total_s', 'queries_per_s', 'hit_rate', 'evictions', 'p50_ms', 'p99_ms', 'held_mb'])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,152 @@
+"""
+Load test of the local HTTP service: latency percentiles and throughput under concurrent clients
+
+The service is started in a child process on a synthetic csv. Concurrent
+keep-alive clients then send a mix of question variants and City lookups,
+twice: first against the freshly started service, where identical questions
+arrive together and are coalesced, then against the warm answer cache.
+
+Usage:
+    python -m benchmarks.bench_service --rows 1000000 --connections 32 --requests 4000
+"""
+
+import argparse
+import asyncio
+import json
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+from benchmarks.bench_query_cache import workload
+from benchmarks.common import ROOT, print_table
+from cceda.synthetic import write_synthetic_csv
+
+CITIES = ['Delhi', 'Greater Mumbai', 'Bengaluru', 'Ahmedabad', 'Kolkata', 'Jalandhar', 'Nowhere']
+
+
+def targets(count, seed=0):
+    # four question variants for every City lookup or search
+    rng = np.random.default_rng(seed)
+    asked = []
+    for question, params in workload(count, seed):
+        draw = rng.random()
+        if draw < 0.15:
+            asked.append(f'/cities/{CITIES[rng.integers(len(CITIES))].replace(" ", "%20")}')
+        elif draw < 0.2:
+            asked.append(f'/cities?prefix={"ABCDJK"[rng.integers(6)]}&min_length={rng.integers(4, 12)}')
+        else:
+            query = '&'.join(f'{name}={",".join(map(str, value)) if isinstance(value, list) else value}'
+                             for name, value in params.items() if value is not None)
+            asked.append(f'/questions/{question}' + (f'?{query}' if query else ''))
+
+    return asked
+
+
+async def get(reader, writer, target):
+    # one keep-alive request; returns the status and the body
+    writer.write(f'GET {target} HTTP/1.1\r\nHost: localhost\r\n\r\n'.encode())
+    await writer.drain()
+
+    status = int((await reader.readline()).split()[1])
+    length = 0
+    while (line := await reader.readline()) not in (b'\r\n', b''):
+        name, _, value = line.decode('latin-1').partition(':')
+        if name.lower() == 'content-length':
+            length = int(value)
+
+    return status, await reader.readexactly(length)
+
+
+async def load(port, asked, connections):
+    # the clients share one queue of targets; returns the latency of every request and the wall time
+    queue = asyncio.Queue()
+    for target in asked:
+        queue.put_nowait(target)
+    latencies, failures = [], []
+
+    async def client():
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+        while not queue.empty():
+            target = queue.get_nowait()
+            start = time.perf_counter()
+            status, _ = await get(reader, writer, target)
+            latencies.append(time.perf_counter() - start)
+            if status != 200:
+                failures.append((status, target))
+        writer.close()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(connections)))
+    if failures:
+        raise RuntimeError(f'{len(failures)} requests failed, e.g. {failures[0]}')
+
+    return np.array(latencies), time.perf_counter() - start
+
+
+async def stats(port):
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    _, body = await get(reader, writer, '/stats')
+    writer.close()
+
+    return json.loads(body)
+
+
+def start_service(path, cache_dir, workers):
+    # the service prints its address once it accepts connections
+    command = [sys.executable, '-m', 'cceda', 'serve', '--input', path, '--cache-dir', cache_dir, '--port', 0]
+    if workers:
+        command += ['--workers', workers]
+    process = subprocess.Popen(list(map(str, command)), cwd=ROOT, stdout=subprocess.PIPE, text=True)
+    line = process.stdout.readline()
+    if not line.startswith('serving on'):
+        process.kill()
+        raise RuntimeError('the service did not start')
+
+    return process, int(line.rsplit(':', 1)[1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--rows', type=int, default=1_000_000, help='rows of the synthetic csv')
+    parser.add_argument('--connections', type=int, default=32, help='concurrent keep-alive clients')
+    parser.add_argument('--requests', type=int, default=4_000)
+    parser.add_argument('--workers', type=int, help='threads of the service answering questions')
+    args = parser.parse_args()
+
+    asked = targets(args.requests)
+    rows = []
+
+    with tempfile.TemporaryDirectory() as workdir:
+        path = write_synthetic_csv(Path(workdir) / 'synthetic.csv', args.rows)
+        cache_dir = Path(workdir) / 'cache'
+
+        start = time.perf_counter()
+        process, port = start_service(path, cache_dir, args.workers)
+        startup = time.perf_counter() - start
+        try:
+            for phase in ('cold', 'warm'):
+                latencies, seconds = asyncio.run(load(port, asked, args.connections))
+                served = asyncio.run(stats(port))
+                rows.append({'phase': phase, 'requests': len(latencies),
+                             'requests_per_s': f'{len(latencies) / seconds:,.0f}',
+                             'p50_ms': f'{np.percentile(latencies * 1000, 50):.2f}',
+                             'p99_ms': f'{np.percentile(latencies * 1000, 99):.2f}',
+                             'max_ms': f'{latencies.max() * 1000:.2f}',
+                             'computed': served['computed'], 'coalesced': served['coalesced'],
+                             'cache_hit_rate': f"{served['cache']['hit_rate']:.1%}"})
+        finally:
+            process.terminate()
+            process.wait()
+
+    print(f'rows: {args.rows:,}  connections: {args.connections}  service startup: {startup:.2f}s')
+    print('computed and coalesced count every request since startup')
+    print_table(rows, ['phase', 'requests', 'requests_per_s', 'p50_ms', 'p99_ms', 'max_ms', 'computed', 'coalesced',
+                       'cache_hit_rate'])
+
+
+if __name__ == '__main__':
+    main()
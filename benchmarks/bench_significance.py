@@ -0,0 +1,77 @@
+"""
+Seconds of the batched permutation and bootstrap tests of every city, in one process and in a pool
+
+The male and female gap of every city of the sample is tested with batched
+resample matrices, first in this process and then spread over a process pool;
+both must give the same results. The baseline is the usual loop, one city and
+one resample at a time with ``rng.permutation`` and ``rng.choice``, timed on a
+few resamples and scaled to the same number.
+
+Usage:
+    python -m benchmarks.bench_significance --resamples 10000
+"""
+
+import argparse
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.common import print_table
+from cceda.loader import load_transactions
+from cceda.significance import difference_tests
+
+
+def loop_seconds(df, resamples, rng):
+    # one permutation and one bootstrap per city and resample, like a scipy-style loop would do
+    start = time.perf_counter()
+    for _, city in df.groupby('City', observed=True):
+        male = (city['Gender'] == 'M').to_numpy()
+        if male.all() or not male.any():
+            continue
+        amounts = city['Amount'].to_numpy().astype(np.float64)
+        males, females = amounts[male], amounts[~male]
+        for _ in range(resamples):
+            shuffled = rng.permutation(male)
+            amounts[shuffled].mean() - amounts[~shuffled].mean()
+            rng.choice(males, len(males)).mean() - rng.choice(females, len(females)).mean()
+
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--resamples', type=int, default=10_000, help='permutations and bootstraps per city')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='processes of the pool')
+    parser.add_argument('--loop-resamples', type=int, default=20, help='resamples timed with the loop')
+    args = parser.parse_args()
+
+    df = load_transactions()
+    rows = []
+
+    seconds = loop_seconds(df, args.loop_resamples, np.random.default_rng(0)) * args.resamples / args.loop_resamples
+    rows.append({'mode': 'loop per city (scaled)', 'workers': 1, 'seconds': f'{seconds:.1f}',
+                 'resamples_per_s': f'{args.resamples / seconds:,.0f}', 'speedup': '1.0x'})
+    baseline = seconds
+
+    results = {}
+    for mode, workers in (('batched', 1), ('batched pool', max(args.workers, 2))):
+        start = time.perf_counter()
+        results[mode] = difference_tests(df, by='City', resamples=args.resamples, workers=workers)
+        seconds = time.perf_counter() - start
+        rows.append({'mode': mode, 'workers': workers, 'seconds': f'{seconds:.1f}',
+                     'resamples_per_s': f'{args.resamples / seconds:,.0f}', 'speedup': f'{baseline / seconds:.0f}x'})
+
+    # every batch has its own seed, so the pool must reproduce the results of one process
+    pd.testing.assert_frame_equal(results['batched'], results['batched pool'])
+    tests = results['batched']
+
+    print(f"rows: {len(df):,}  cities tested: {len(tests)}  resamples: {args.resamples:,}  cpus: {os.cpu_count()}  "
+          f"significant after correction: {int(tests['Significant'].sum())}  "
+          f"raw p < 0.05: {int((tests['P_Value'] < 0.05).sum())}")
+    print_table(rows, ['mode', 'workers', 'seconds', 'resamples_per_s', 'speedup'])
+
+
+if __name__ == '__main__':
+    main()
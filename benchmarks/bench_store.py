@@ -0,0 +1,89 @@
+"""
+Memory footprint of the compact TransactionStore against the analysis DataFrame
+
+Three representations are compared on the sample file and on a synthetic file:
+the frame as the original script read it (plain ``pd.read_csv``), the prepared
+``df`` of the analysis (categoricals and date part columns) and the store. The
+store's question tables are checked against pandas and both are timed.
+
+Usage:
+    python -m benchmarks.bench_store --rows 10000000
+"""
+
+import argparse
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.common import print_table
+from cceda.loader import load_transactions
+from cceda.questions import QUESTION_GROUPS, assert_tables_equal, prepare_frame, question_table
+from cceda.schema import INDEX_COLUMN, SAMPLE_CSV
+from cceda.store import TransactionStore
+from cceda.synthetic import write_synthetic_csv
+
+
+def plain_frame_bytes(path, chunksize=1_000_000):
+    # the original read_csv frame, measured chunk by chunk so the large file never has to fit at once
+    return sum(chunk.memory_usage(deep=True).sum()
+               for chunk in pd.read_csv(path, index_col=INDEX_COLUMN, chunksize=chunksize))
+
+
+def measure(label, path):
+    plain = plain_frame_bytes(path)
+    df = prepare_frame(load_transactions(path, use_cache=False))
+    frame = df.memory_usage(deep=True).sum()
+
+    start = time.perf_counter()
+    store = TransactionStore.from_frame(df)
+    build_seconds = time.perf_counter() - start
+
+    # the store must answer like pandas, and its frame must share the store's arrays
+    pandas_seconds = store_seconds = 0.0
+    for name in QUESTION_GROUPS:
+        start = time.perf_counter()
+        expected = question_table(df, name)
+        pandas_seconds += time.perf_counter() - start
+
+        start = time.perf_counter()
+        actual = store.question_table(name)
+        store_seconds += time.perf_counter() - start
+
+        assert_tables_equal(expected, actual)
+
+    converted = store.to_frame()
+    assert np.shares_memory(converted['Amount'].to_numpy(), store.amount)
+    assert np.shares_memory(converted['City'].cat.codes.to_numpy(), store.codes['City'])
+    pd.testing.assert_series_equal(converted['Date'], df['Date'].reset_index(drop=True), check_names=False,
+                                   check_index=False)
+
+    rows = len(df)
+    mb = 2**20
+
+    return {'file': label, 'rows': rows,
+            'read_csv_mb': f'{plain / mb:.1f}', 'df_mb': f'{frame / mb:.1f}', 'store_mb': f'{store.nbytes / mb:.1f}',
+            'store_B/row': f'{store.nbytes / rows:.1f}', 'vs_read_csv': f'{plain / store.nbytes:.1f}x',
+            'vs_df': f'{frame / store.nbytes:.1f}x', 'build_s': f'{build_seconds:.2f}',
+            'pandas_q_ms': f'{pandas_seconds * 1000:.1f}', 'store_q_ms': f'{store_seconds * 1000:.1f}'}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--rows', type=int, default=10_000_000, help='rows of the synthetic csv')
+    args = parser.parse_args()
+
+    results = [measure('sample', SAMPLE_CSV)]
+
+    with tempfile.TemporaryDirectory() as workdir:
+        path = write_synthetic_csv(Path(workdir) / 'synthetic.csv', args.rows)
+        results.append(measure('synthetic', path))
+
+    print_table(results, list(results[0]))
+    print('every question table matches pandas; to_frame shares the code and Amount arrays')
+
+
+if __name__ == '__main__':
+    main()
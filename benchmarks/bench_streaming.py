@@ -0,0 +1,108 @@
+"""
+Streaming mode: equivalence with the in-memory path and flat peak memory on large files
+
+The sample is streamed in small chunks and every output is compared with the
+in-memory path. Then synthetic files generated from the sample's distributions
+(by default 5M and 50M rows) are streamed under a fixed memory budget, each in
+its own process, and the peak RSS is reported for both sizes.
+
+Usage:
+    python -m benchmarks.bench_streaming --rows 50000000 --memory-limit-mb 256
+"""
+
+import argparse
+import json
+import tempfile
+import time
+from pathlib import Path
+
+import pandas as pd
+
+from benchmarks.common import peak_rss_mb, print_table, run_child
+from cceda.loader import load_transactions
+from cceda.questions import assert_tables_equal, prepare_frame, question_tables
+from cceda.schema import CATEGORICAL_COLUMNS
+from cceda.streaming import StreamingAnalysis
+from cceda.synthetic import write_synthetic_csv
+
+
+def validate_on_sample(chunksize=2_000):
+    """
+    Checks that streaming the sample gives the outputs of the in-memory path
+    """
+
+    df = load_transactions(use_cache=False)
+    analysis = StreamingAnalysis(chunksize=chunksize).run()
+
+    for column in CATEGORICAL_COLUMNS:
+        expected = df[column].value_counts()
+        expected.index = expected.index.astype(object)
+        pd.testing.assert_series_equal(expected.sort_index(), analysis.value_counts(column).sort_index(),
+                                       check_names=False, check_index_type=False)
+
+    expected, streamed = df.describe(include='all'), analysis.describe()
+    for column in expected.columns:
+        for statistic in expected.index:
+            left, right = expected.loc[statistic, column], streamed.loc[statistic, column]
+            if pd.isna(left):
+                assert pd.isna(right), (statistic, column)
+            elif isinstance(left, pd.Timestamp):
+                # pandas averages dates in floating point, the stream uses exact integers
+                assert abs((left - right).value) < 1_000, (statistic, column)
+            elif isinstance(left, float):
+                assert abs(left - right) <= 1e-9 * abs(left), (statistic, column)
+            else:
+                assert left == right, (statistic, column)
+
+    reference = question_tables(prepare_frame(df))
+    for name, table in analysis.question_tables().items():
+        assert_tables_equal(reference[name], table)
+
+
+def _child(path, memory_limit_mb):
+    start = time.perf_counter()
+    analysis = StreamingAnalysis(memory_limit_mb=float(memory_limit_mb)).run(path)
+    seconds = time.perf_counter() - start
+
+    # every table must account for every streamed row, and the stream must stay within its budget
+    tables = analysis.question_tables()
+    assert analysis.value_counts('Gender').sum() == analysis.rows
+    assert tables['city']['Amount'].sum() == tables['exp_card']['Amount'].sum()
+    assert peak_rss_mb() <= float(memory_limit_mb), f'peak RSS {peak_rss_mb():.0f} MB over {memory_limit_mb} MB'
+
+    print(json.dumps({'rows': analysis.rows, 'seconds': seconds, 'peak_rss_mb': peak_rss_mb(),
+                      'chunksize': analysis.chunksize,
+                      'distinct_cities': round(analysis.distinct_cities_estimate)}))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--rows', type=int, default=50_000_000, help='rows of the largest synthetic file')
+    parser.add_argument('--memory-limit-mb', type=float, default=256)
+    parser.add_argument('--child', nargs=2, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        _child(*args.child)
+        return
+
+    results = []
+    with tempfile.TemporaryDirectory() as workdir:
+        for rows in (args.rows // 10, args.rows):
+            path = write_synthetic_csv(Path(workdir) / f'synthetic-{rows}.csv', rows)
+            result = run_child('benchmarks.bench_streaming', '--child', path, args.memory_limit_mb)
+            results.append({'rows': result['rows'], 'chunksize': result['chunksize'],
+                            'seconds': f"{result['seconds']:.1f}",
+                            'rows_per_s': f"{result['rows'] / result['seconds']:,.0f}",
+                            'peak_rss_mb': f"{result['peak_rss_mb']:.0f}",
+                            'distinct_cities': result['distinct_cities']})
+            Path(path).unlink()
+
+    # checked after the large files, so the children do not start next to the sample loaded here
+    validate_on_sample()
+    print('sample: value counts, describe and Q1-Q5 tables match the in-memory path')
+    print_table(results, ['rows', 'chunksize', 'seconds', 'rows_per_s', 'peak_rss_mb', 'distinct_cities'])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+"""
+Per-city monthly series for every city: one grouped resample against a loop per city
+
+Usage:
+    python -m benchmarks.bench_timeseries --rows 2000000
+"""
+
+import argparse
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.common import print_table
+from cceda.loader import load_transactions
+from cceda.questions import prepare_frame
+from cceda.synthetic import write_synthetic_csv
+from cceda.timeseries import TimeSeriesEngine
+
+
+def loop_per_city(df):
+    # the naive way: one filter and one resample per city
+    series = {}
+    for city in df['City'].cat.categories:
+        rows = df[df['City'] == city]
+        series[city] = rows.resample('MS', on='Date')['Amount'].sum()
+
+    return pd.DataFrame(series).fillna(0).astype('int64')
+
+
+def grouped_pandas(df):
+    # a single pandas groupby with a monthly Grouper, unstacked to one column per city
+    grouper = pd.Grouper(key='Date', freq='MS')
+    totals = df.groupby(['City', grouper], observed=True)['Amount'].sum()
+
+    return totals.unstack('City').asfreq('MS').fillna(0).astype('int64')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--rows', type=int, default=2_000_000, help='rows of the synthetic csv')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        path = write_synthetic_csv(Path(workdir) / 'synthetic.csv', args.rows)
+        df = prepare_frame(load_transactions(path, use_cache=False))
+
+    timings = {}
+    results = {}
+    for name, function in [('loop per city', loop_per_city), ('pandas groupby + Grouper', grouped_pandas),
+                           ('TimeSeriesEngine', lambda frame: TimeSeriesEngine(frame).resample('City', 'month'))]:
+        start = time.perf_counter()
+        results[name] = function(df)
+        timings[name] = time.perf_counter() - start
+
+    # every method must give the same series for every city
+    engine_table = results['TimeSeriesEngine']
+    for name, table in results.items():
+        table = table.reindex(index=engine_table.index, columns=engine_table.columns, fill_value=0)
+        assert np.array_equal(table.to_numpy(), engine_table.to_numpy()), name
+
+    engine = TimeSeriesEngine(df)
+    engine.resample('City', 'month')
+    start = time.perf_counter()
+    engine.resample('City', 'month')
+    cached = time.perf_counter() - start
+
+    start = time.perf_counter()
+    engine.rolling(3, 'mean', by='City')
+    engine.year_over_year(by='City')
+    statistics = time.perf_counter() - start
+
+    baseline = timings['loop per city']
+    rows = [{'method': name, 'seconds': f'{seconds:.3f}', 'speedup': f'{baseline / seconds:.1f}x'}
+            for name, seconds in timings.items()]
+    rows.append({'method': 'TimeSeriesEngine (cached)', 'seconds': f'{cached:.6f}', 'speedup': '-'})
+    rows.append({'method': 'rolling mean + year over year', 'seconds': f'{statistics:.3f}', 'speedup': '-'})
+
+    print(f'rows: {len(df)}  cities: {engine_table.shape[1]}  months: {engine_table.shape[0]}')
+    print_table(rows, ['method', 'seconds', 'speedup'])
+
+
+if __name__ == '__main__':
+    main()
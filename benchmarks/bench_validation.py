@@ -0,0 +1,113 @@
+"""
+Seconds of the validated load against the plain load, and the throughput of the checks alone
+
+A synthetic csv is loaded without and with validation, to measure the overhead
+the validation adds to the load step. A dirty copy with bad rows of every rule
+appended, some of them with decimal amounts, makes the validation fall back to
+text amounts for the last chunk; its report must count exactly the rows that
+were injected, and the quarantine file must hold them. The checks alone are
+timed on a chunk already in memory, in rows and in megabytes of its columns
+per second.
+
+Usage:
+    python -m benchmarks.bench_validation --rows 10000000
+"""
+
+import argparse
+import shutil
+import tempfile
+import time
+from pathlib import Path
+
+import pandas as pd
+
+from benchmarks.common import print_table
+from cceda.loader import read_transactions_csv
+from cceda.schema import INDEX_COLUMN, csv_dtypes
+from cceda.synthetic import write_synthetic_csv
+from cceda.validation import RULES, Validator
+
+# one bad row per rule, the columns after the index
+BAD_ROWS = {
+    'card_type_domain': '"Delhi, India",29-Oct-14,Diamond,Food,F,100',
+    'exp_type_domain': '"Delhi, India",29-Oct-14,Gold,Rent,F,100',
+    'gender_domain': '"Delhi, India",29-Oct-14,Gold,Food,X,100',
+    'city_format': '", India",29-Oct-14,Gold,Food,F,100',
+    'date_unparseable': '"Delhi, India",31-Feb-14,Gold,Food,F,100',
+    'date_out_of_range': '"Delhi, India",01-Jan-99,Gold,Food,F,100',
+    'amount_invalid': '"Delhi, India",29-Oct-14,Gold,Food,F,12.5',
+    'amount_negative': '"Delhi, India",29-Oct-14,Gold,Food,F,-5',
+    'amount_out_of_range': '"Delhi, India",29-Oct-14,Gold,Food,F,0',
+}
+
+
+def write_dirty_copy(path, dirty_path, rows, repeats):
+    # the csv with every bad row appended ``repeats`` times, numbered after its last row
+    shutil.copyfile(path, dirty_path)
+    with open(dirty_path, 'a') as file:
+        for repeat in range(repeats):
+            for position, line in enumerate(BAD_ROWS.values()):
+                file.write(f'{rows + repeat * len(BAD_ROWS) + position},{line}\n')
+
+
+def timed(function):
+    # the result and the seconds of a call
+    start = time.perf_counter()
+    result = function()
+
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--rows', type=int, default=10_000_000, help='rows of the synthetic csv')
+    parser.add_argument('--chunksize', type=int, default=1_000_000, help='rows read and checked at a time')
+    parser.add_argument('--bad-repeats', type=int, default=100, help='copies of the bad row of every rule')
+    args = parser.parse_args()
+
+    results = []
+    with tempfile.TemporaryDirectory() as workdir:
+        path = write_synthetic_csv(Path(workdir) / 'synthetic.csv', args.rows)
+        dirty_path = Path(workdir) / 'dirty.csv'
+        write_dirty_copy(path, dirty_path, args.rows, args.bad_repeats)
+        size_mb = path.stat().st_size / 2**20
+
+        plain, baseline = timed(lambda: read_transactions_csv(path, args.chunksize))
+        results.append({'load': 'plain', 'file': 'clean', 'seconds': f'{baseline:.1f}',
+                        'rows_per_s': f'{args.rows / baseline:,.0f}', 'mb_per_s': f'{size_mb / baseline:,.0f}',
+                        'overhead': '-', 'quarantined': '-'})
+        del plain
+
+        for name, source in (('clean', path), ('dirty', dirty_path)):
+            validator = Validator(quarantine_path=Path(workdir) / f'quarantine-{name}.csv')
+            df, seconds = timed(lambda: read_transactions_csv(source, args.chunksize, validator=validator))
+            report = validator.report
+            results.append({'load': 'validated', 'file': name, 'seconds': f'{seconds:.1f}',
+                            'rows_per_s': f"{report['rows'] / seconds:,.0f}",
+                            'mb_per_s': f'{source.stat().st_size / 2**20 / seconds:,.0f}',
+                            'overhead': f'{seconds / baseline - 1:+.0%}', 'quarantined': report['quarantined']})
+            del df
+
+        # the dirty file must quarantine exactly the injected rows, each for its own rule
+        assert report['rules'] == {rule: args.bad_repeats for rule in RULES}, report['rules']
+        assert report['valid'] == args.rows, report['valid']
+        quarantine = pd.read_csv(report['quarantine'], index_col=INDEX_COLUMN)
+        assert len(quarantine) == args.bad_repeats * len(BAD_ROWS)
+        assert (quarantine.index >= args.rows).all()
+
+        # the checks alone, on a chunk already parsed
+        chunk = next(iter(pd.read_csv(path, index_col=INDEX_COLUMN, dtype=csv_dtypes(), chunksize=args.chunksize)))
+        chunk_mb = chunk.memory_usage(index=False).sum() / 2**20
+        validator = Validator()
+        _, seconds = timed(lambda: [validator.check(chunk) for _ in range(5)])
+        seconds /= 5
+        results.append({'load': 'checks only', 'file': 'in memory', 'seconds': f'{seconds:.3f}',
+                        'rows_per_s': f'{len(chunk) / seconds:,.0f}', 'mb_per_s': f'{chunk_mb / seconds:,.0f}',
+                        'overhead': '-', 'quarantined': '-'})
+
+    print(f'rows: {args.rows:,}  csv: {size_mb:,.0f} MB  bad rows injected: {args.bad_repeats * len(BAD_ROWS):,}')
+    print_table(results, ['load', 'file', 'seconds', 'rows_per_s', 'mb_per_s', 'overhead', 'quarantined'])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,54 @@
+"""
+Small helpers shared by the benchmark scripts
+"""
+
+import json
+import subprocess
+import sys
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+from cceda.instrument import peak_rss_mb  # noqa: F401, the peak of this program rather than of its parent
+
+# the repository root, used as working directory for child processes
+ROOT = Path(__file__).resolve().parent.parent
+
+
+@contextmanager
+def timer(results, name):
+    """
+    Times the body of a ``with`` block and stores the seconds in ``results[name]``
+    """
+
+    start = time.perf_counter()
+    yield
+    results[name] = time.perf_counter() - start
+
+
+def run_child(module, *args):
+    """
+    Runs ``python -m module *args`` in a fresh process and decodes its json output
+
+    Each measurement gets its own process so that the peak RSS of one mode is not
+    polluted by the allocations of another.
+
+    Returns:
+    dict: the json object the child printed as its last line
+    """
+
+    output = subprocess.run([sys.executable, '-m', module, *map(str, args)], cwd=ROOT,
+                            check=True, capture_output=True, text=True).stdout
+
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def print_table(rows, columns):
+    """
+    Prints a list of dicts as a plain text table
+    """
+
+    widths = [max(len(column), *(len(f'{row[column]}') for row in rows)) for column in columns]
+    print('  '.join(column.ljust(width) for column, width in zip(columns, widths)))
+    for row in rows:
+        print('  '.join(f'{row[column]}'.ljust(width) for column, width in zip(columns, widths)))
@@ -0,0 +1,208 @@
+"""
+Benchmark suite: times every stage of the analysis on a synthetic file and checks for regressions
+
+The stages run in the order of the analysis: loading the csv, cleaning City,
+extracting the date parts, building the aggregation cube, answering Q1 to Q5
+and the City membership checks. Each stage records its wall time, its
+throughput in rows per second and the peak memory it allocated on top of what
+was already held; the memory is traced in a separate run so that tracing does
+not slow down the timed runs. The process peak RSS is recorded as well. The
+results are written as json, so runs on different commits can be compared;
+with ``--baseline`` the run fails when a stage got slower than the threshold.
+
+The synthetic file is kept in ``--data-dir`` and reused by later runs of the
+same size and seed, so every commit is measured on identical data.
+
+Usage:
+    python -m benchmarks.suite --rows 10000000 --output bench-new.json
+    python -m benchmarks.suite --rows 10000000 --output bench-new.json --baseline bench-old.json --threshold 0.2
+"""
+
+import argparse
+import json
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.common import ROOT, peak_rss_mb, print_table
+from cceda.analysis import QUESTIONS
+from cceda.cities import normalize_cities
+from cceda.city_index import CityIndex
+from cceda.cube import AggregationCube
+from cceda.dates import DateColumnsExtractor
+from cceda.loader import load_transactions
+from cceda.synthetic import write_synthetic_csv
+
+# stages faster than this are compared with an absolute margin only, as their timing is mostly noise
+NOISE_SECONDS = 0.05
+
+# the city names looked up by the membership stage, besides every known city
+UNKNOWN_CITIES = [f'Nowhere {number}' for number in range(1000)]
+
+
+def synthetic_file(data_dir, rows, seed):
+    """
+    Returns the synthetic csv of the given size and seed, writing it on first use
+    """
+
+    path = Path(data_dir) / f'synthetic-{rows}-{seed}.csv'
+    if not path.exists():
+        path.parent.mkdir(parents=True, exist_ok=True)
+        temporary = path.with_name(path.name + '.tmp')
+        write_synthetic_csv(temporary, rows, seed=seed)
+        temporary.replace(path)
+
+    return path
+
+
+def run_stages(path, trace_memory=False):
+    """
+    Runs the analysis stage by stage on one file
+
+    Parameters:
+    trace_memory (bool): measure the peak memory each stage allocates with tracemalloc instead of timing it
+
+    Returns:
+    dict: stage name to its seconds, or to its peak allocation in MB when tracing memory
+    """
+
+    stages = {}
+    state = {}
+
+    def stage(name, function):
+        if trace_memory:
+            held, _ = tracemalloc.get_traced_memory()
+            tracemalloc.reset_peak()
+            function()
+            stages[name] = (tracemalloc.get_traced_memory()[1] - held) / 2**20
+        else:
+            start = time.perf_counter()
+            function()
+            stages[name] = time.perf_counter() - start
+
+    def load():
+        state['df'] = load_transactions(path, use_cache=False)
+
+    def clean_cities():
+        state['df']['City'] = normalize_cities(state['df']['City'])
+
+    def extract_dates():
+        state['df'] = DateColumnsExtractor().extract_all(state['df'], 'Date')
+
+    def build_cube():
+        state['cube'] = AggregationCube.build(state['df'])
+
+    def membership():
+        index = CityIndex(state['df']['City'])
+        queries = [*index.names, *UNKNOWN_CITIES]
+        assert index.contains_many(queries).sum() == len(index)
+        index.search(['J', 'K'], min_length=10)
+
+    stage('load', load)
+    stage('city_cleaning', clean_cities)
+    stage('date_extraction', extract_dates)
+    stage('cube_build', build_cube)
+    for name, question in QUESTIONS.items():
+        stage(name, lambda: question(state['cube']))
+    stage('city_membership', membership)
+
+    return stages
+
+
+def git_commit():
+    # the commit being measured, or None outside a git checkout
+    completed = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True, text=True)
+
+    return completed.stdout.strip() or None
+
+
+def regressions(results, baseline, threshold):
+    """
+    Compares the stages of a run with a baseline run
+
+    Returns:
+    list: a message per stage that is slower than the baseline by more than the threshold
+    """
+
+    messages = []
+    for name, stage in results['stages'].items():
+        before = baseline['stages'].get(name)
+        if before is None:
+            continue
+
+        limit = max(before['seconds'] * (1 + threshold), before['seconds'] + NOISE_SECONDS)
+        if stage['seconds'] > limit:
+            messages.append(f"{name}: {stage['seconds']:.3f}s against {before['seconds']:.3f}s "
+                            f"(+{stage['seconds'] / before['seconds'] - 1:.0%}, allowed +{threshold:.0%})")
+
+    return messages
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--rows', type=int, default=1_000_000, help='rows of the synthetic csv, 1M to 100M')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=3, help='runs per stage; the fastest run is kept')
+    parser.add_argument('--data-dir', default=ROOT / '.cceda_cache' / 'bench', help='where synthetic files are kept')
+    parser.add_argument('--output', help='json file the results are written to')
+    parser.add_argument('--baseline', help='json results of an earlier run to compare against')
+    parser.add_argument('--threshold', type=float, default=0.2, help='allowed slowdown per stage, 0.2 is +20%%')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    path = synthetic_file(args.data_dir, args.rows, args.seed)
+    generate_seconds = time.perf_counter() - start
+
+    runs = [run_stages(path) for _ in range(args.repeat)]
+    tracemalloc.start()
+    memory = run_stages(path, trace_memory=True)
+    tracemalloc.stop()
+
+    stages = {}
+    for name in runs[0]:
+        seconds = min(run[name] for run in runs)
+        stages[name] = {'seconds': seconds, 'rows_per_s': args.rows / seconds if seconds else None,
+                        'peak_mb': memory[name]}
+
+    results = {
+        'commit': git_commit(),
+        'rows': args.rows,
+        'seed': args.seed,
+        'repeat': args.repeat,
+        'generate_seconds': generate_seconds,
+        'peak_rss_mb': peak_rss_mb(),
+        'environment': {'python': platform.python_version(), 'numpy': np.__version__, 'pandas': pd.__version__,
+                        'machine': platform.machine()},
+        'stages': stages,
+    }
+
+    print(f"commit: {results['commit']}  rows: {args.rows:,}  best of {args.repeat}")
+    print_table([{'stage': name, 'seconds': f"{stage['seconds']:.3f}",
+                  'rows_per_s': f"{stage['rows_per_s']:,.0f}" if stage['rows_per_s'] else '-',
+                  'peak_mb': f"{stage['peak_mb']:.1f}"} for name, stage in stages.items()],
+                ['stage', 'seconds', 'rows_per_s', 'peak_mb'])
+    print(f"process peak RSS: {results['peak_rss_mb']:.0f} MB")
+
+    if args.output:
+        Path(args.output).write_text(json.dumps(results, indent=1))
+
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text())
+        if baseline['rows'] != args.rows:
+            sys.exit(f"the baseline measured {baseline['rows']} rows, this run {args.rows}")
+
+        failures = regressions(results, baseline, args.threshold)
+        if failures:
+            print(f'regressions against {args.baseline}:', *failures, sep='\n  ')
+            sys.exit(1)
+        print(f"no stage slower than the baseline (commit {baseline.get('commit')}) by more than {args.threshold:.0%}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,56 @@
+"""
+India Credit Card Spendings EDA
+
+Reusable building blocks for the analysis in ``Credit Card analysis.py``. The
+names below are imported lazily, on first use, so that ``import cceda`` stays
+cheap and the plotting libraries are only loaded when a chart is rendered.
+"""
+
+import importlib
+
+# public name to the module it lives in
+_EXPORTS = {
+    'load_transactions': 'cceda.loader',
+    'DateColumnsExtractor': 'cceda.dates',
+    'select_days': 'cceda.dates',
+    'last_days_of_month': 'cceda.dates',
+    'gender_gap': 'cceda.gender_gap',
+    'gender_gap_extremes': 'cceda.gender_gap',
+    'AggregationCube': 'cceda.cube',
+    'CityIndex': 'cceda.city_index',
+    'TransactionStore': 'cceda.store',
+    'TimeSeriesEngine': 'cceda.timeseries',
+    'ApproximateAnalysis': 'cceda.approximate',
+    'Instrumentation': 'cceda.instrument',
+    'QueryLayer': 'cceda.query_cache',
+    'QueryService': 'cceda.service',
+    'PartitionedDataset': 'cceda.dataset',
+    'write_dataset': 'cceda.dataset',
+    'Deduplicator': 'cceda.dedup',
+    'SpendForecaster': 'cceda.forecast',
+    'difference_tests': 'cceda.significance',
+    'with_significance': 'cceda.significance',
+    'BACKENDS': 'cceda.backends',
+    'Validator': 'cceda.validation',
+    'normalize_cities': 'cceda.cities',
+    'prepare_frame': 'cceda.questions',
+    'question_tables': 'cceda.questions',
+    'QUESTIONS': 'cceda.analysis',
+    'run': 'cceda.analysis',
+}
+
+__all__ = sorted(_EXPORTS)
+
+
+def __getattr__(name):
+    if name not in _EXPORTS:
+        raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+
+    value = getattr(importlib.import_module(_EXPORTS[name]), name)
+    globals()[name] = value
+
+    return value
+
+
+def __dir__():
+    return sorted([*globals(), *_EXPORTS])
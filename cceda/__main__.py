@@ -0,0 +1,7 @@
+"""
+Allows running the command line interface as ``python -m cceda``
+"""
+
+from cceda.cli import main
+
+main()
@@ -0,0 +1,140 @@
+"""
+The five business questions of the analysis as importable functions
+
+Each question takes the aggregation cube of the prepared transactions and
+returns its tables by name, so only the questions that are asked for are
+computed. Charts are only rendered on request, and the plotting libraries are
+only imported then.
+"""
+
+from cceda.cube import AggregationCube
+from cceda.gender_gap import gender_gap, gender_gap_extremes
+from cceda.instrument import stage
+from cceda.loader import load_transactions
+from cceda.questions import END_OF_MONTH_DAYS, prepare_frame
+from cceda.schema import SAMPLE_CSV
+from cceda.timeseries import TimeSeriesEngine
+
+
+def load(path=SAMPLE_CSV, cache_dir=None):
+    """
+    Loads and prepares the transactions and builds their aggregation cube
+
+    Returns:
+    tuple: the prepared frame and its AggregationCube
+    """
+
+    with stage('load') as span:
+        df = load_transactions(path, cache_dir=cache_dir)
+        span.set(rows=len(df))
+    with stage('preprocess', rows=len(df)):
+        df = prepare_frame(df)
+    with stage('cube_build', rows=len(df)) as span:
+        cube = AggregationCube.build(df)
+        span.set(cells=cube.cells)
+
+    return df, cube
+
+
+def q1(cube, top_k=10, bottom_k=5):
+    """
+    Question 1: the cities with the largest and smallest male/female spending gaps
+
+    Returns:
+    dict: city_group, Total_amount_Gender and the four extreme tables
+    """
+
+    gap = gender_gap(cube.rollup(['City', 'Gender']))
+    tables = {'city_group': cube.rollup(['City']).sort_values(by='Amount', ascending=False),
+              'Total_amount_Gender': gap}
+    tables.update(gender_gap_extremes(gap, top_k=top_k, bottom_k=bottom_k))
+
+    return tables
+
+
+def q2(cube, card_types=None):
+    """
+    Question 2: the revenue of every expense type per card type
+
+    Parameters:
+    card_types (list): only these card types, e.g. ['Gold']; all of them when None
+
+    Returns:
+    dict: the Expense table
+    """
+
+    where = {'Card Type': card_types} if card_types is not None else None
+
+    return {'Expense': cube.rollup(['Exp Type', 'Card Type'], where=where)}
+
+
+def q3(cube):
+    """
+    Question 3: the monthly spending per card type, month by month over the whole date range
+
+    Returns:
+    dict: the df_month_group table, one row per month start and card type
+    """
+
+    return {'df_month_group': TimeSeriesEngine(cube.rollup(['Date', 'Card Type'])).long('Card Type', 'month')}
+
+
+def q4(cube):
+    """
+    Question 4: the spending of males and females per day of the week and per month
+
+    Returns:
+    dict: the spending_per_day and spendings_per_month tables
+    """
+
+    return {'spending_per_day': cube.rollup(['Day Name', 'Gender']),
+            'spendings_per_month': cube.rollup(['Month', 'Gender'])}
+
+
+def q5(cube, days=END_OF_MONTH_DAYS):
+    """
+    Question 5: the spending per expense type at the end of each month
+
+    Returns:
+    dict: the End_of_month_grouped table
+    """
+
+    return {'End_of_month_grouped': cube.rollup(['Day Number', 'Month', 'Exp Type'], where={'Day Number': days})}
+
+
+QUESTIONS = {'q1': q1, 'q2': q2, 'q3': q3, 'q4': q4, 'q5': q5}
+
+
+def run(questions, path=SAMPLE_CSV, cache_dir=None, charts_dir=None):
+    """
+    Answers the requested questions and optionally renders their charts
+
+    Parameters:
+    questions (list): question names, e.g. ['q1', 'q3']
+    path (str or Path): the transactions csv
+    charts_dir (str or Path): when given, the charts of the questions are rendered into this directory
+
+    Returns:
+    dict: question name to its dict of tables
+    """
+
+    unknown = sorted(set(questions) - set(QUESTIONS))
+    if unknown:
+        raise ValueError(f'unknown questions: {", ".join(unknown)}; choose from {", ".join(QUESTIONS)}')
+
+    _, cube = load(path, cache_dir)
+    results = {}
+    for name in questions:
+        with stage(name, rows=cube.cells) as span:
+            results[name] = QUESTIONS[name](cube)
+            span.set(tables=len(results[name]))
+
+    if charts_dir is not None:
+        # the report module, and with it the plotting libraries, are only needed for charts
+        from cceda.report import build_report, question_charts
+
+        charts = [chart for chart in question_charts(cube) if chart.name.split('_')[0] in questions]
+        if charts:
+            build_report(charts, charts_dir)
+
+    return results
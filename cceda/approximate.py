@@ -0,0 +1,154 @@
+"""
+Approximate answers to the exploratory questions, from sketches kept while ingesting
+
+Each chunk of transactions only updates small mergeable sketches: a Space-Saving
+summary of every categorical column (by row count) and of the cities by spend, a
+HyperLogLog of the cities and a KLL sketch of Amount. Their size does not grow
+with the data, so the value counts of cells 6 to 9, the top cities by spend,
+the distinct city count and the Amount percentiles of ``describe`` are answered
+instantly however many rows were ingested. Every answer carries its error bound.
+"""
+
+import numpy as np
+import pandas as pd
+
+from cceda.cities import CityNormalizer
+from cceda.loader import iter_transaction_chunks
+from cceda.schema import CATEGORICAL_COLUMNS, SAMPLE_CSV
+from cceda.sketches import HyperLogLog, KLLSketch, SpaceSaving
+from cceda.streaming import PERCENTILES, chunksize_for_budget
+
+
+class ApproximateAnalysis:
+    """
+    Mergeable sketches of a transactions file, updated chunk by chunk
+
+    Parameters:
+    capacity (int): values tracked per Space-Saving summary; a column with fewer
+    distinct values than this is counted exactly
+    k (int): accuracy of the Amount quantile sketch
+    p (int): precision of the distinct city sketch
+    chunksize (int): rows read per chunk by ``run``
+    """
+
+    def __init__(self, capacity=256, k=200, p=14, chunksize=None, memory_limit_mb=256):
+        self.chunksize = chunksize or chunksize_for_budget(memory_limit_mb)
+        self.rows = 0
+        self.counts = {column: SpaceSaving(capacity) for column in CATEGORICAL_COLUMNS}
+        self.city_spend = SpaceSaving(capacity)
+        self.cities = HyperLogLog(p)
+        self.amounts = KLLSketch(k)
+        self._normalizer = CityNormalizer()
+
+    def update(self, chunk):
+        """
+        Adds one typed chunk (as read by the loader) to the sketches
+
+        Returns:
+        ApproximateAnalysis: this analysis
+        """
+
+        self.rows += len(chunk)
+
+        # the cities are normalized like the analysis does, which only touches their distinct names
+        cities = self._normalizer.normalize(chunk['City'])
+        for column in CATEGORICAL_COLUMNS:
+            self.counts[column].update(cities if column == 'City' else chunk[column])
+
+        self.city_spend.update(cities, weights=chunk['Amount'].to_numpy())
+        self.cities.update(cities)
+        self.amounts.update(chunk['Amount'].to_numpy())
+
+        return self
+
+    def merge(self, other):
+        """
+        Combines the sketches of another analysis (e.g. of another file part) into this one
+
+        Returns:
+        ApproximateAnalysis: this analysis
+        """
+
+        self.rows += other.rows
+        for column in CATEGORICAL_COLUMNS:
+            self.counts[column].merge(other.counts[column])
+        self.city_spend.merge(other.city_spend)
+        self.cities.merge(other.cities)
+        self.amounts.merge(other.amounts)
+
+        return self
+
+    def run(self, path=SAMPLE_CSV):
+        """
+        Streams a whole transactions csv through the sketches
+
+        Returns:
+        ApproximateAnalysis: this analysis
+        """
+
+        for chunk in iter_transaction_chunks(path, self.chunksize):
+            self.update(chunk)
+
+        return self
+
+    def value_counts(self, column, n=10):
+        """
+        Approximates ``df[column].value_counts().head(n)``
+
+        Returns:
+        pandas.DataFrame: the n most frequent values with the estimated count, the bounds of the
+        true count and whether the value is certain to be in the true top n
+        """
+
+        return self.counts[column].top(n).rename_axis(column)
+
+    def top_cities_by_spend(self, n=10):
+        """
+        Approximates the n cities with the largest total Amount
+
+        Returns:
+        pandas.DataFrame: like ``value_counts``, with the estimated total Amount
+        """
+
+        return self.city_spend.top(n).rename_axis('City')
+
+    def distinct_cities(self):
+        """
+        Estimates the number of distinct cities
+
+        Returns:
+        dict: the estimate, its relative standard error and a two standard error interval
+        """
+
+        estimate = self.cities.estimate()
+        error = self.cities.relative_error
+
+        return {'estimate': estimate, 'relative_error': error,
+                'lower': estimate * (1 - 2 * error), 'upper': estimate * (1 + 2 * error)}
+
+    def amount_quantiles(self, qs=PERCENTILES):
+        """
+        Approximates the Amount percentiles of ``describe``
+
+        Returns:
+        pandas.DataFrame: indexed like describe (25%, 50%, 75%), with the estimate, the values at
+        the edges of the rank error and the rank error itself
+        """
+
+        table = self.amounts.quantiles(qs)
+        table.index = [f'{q:.0%}' for q in qs]
+        table['rank_error'] = self.amounts.rank_error
+
+        return table
+
+    @property
+    def nbytes(self):
+        """
+        Returns the approximate memory held by the sketches, in bytes
+        """
+
+        summaries = [*self.counts.values(), self.city_spend]
+        summary_bytes = sum(summary.counts.nbytes + summary.errors.nbytes +
+                            summary.items.memory_usage(deep=True) for summary in summaries)
+
+        return summary_bytes + self.cities.registers.nbytes + sum(level.nbytes for level in self.amounts.levels)
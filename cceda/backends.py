@@ -0,0 +1,270 @@
+"""
+Interchangeable engines computing the question tables straight from the transactions csv
+
+``QUESTION_GROUPS`` and ``QUESTION_FILTERS`` describe the Q1-Q5 tables once;
+every backend turns that description into its own plan:
+
+- ``PandasBackend`` loads and prepares the whole frame and runs one eager
+  ``groupby`` per table, the reference implementation
+- ``DuckDBBackend`` runs a single in-process SQL query over the csv: every
+  table is one grouping set of one ``GROUP BY GROUPING SETS`` aggregation, so
+  the file is read once
+- ``PolarsBackend`` runs one lazy query over ``scan_csv``, which Polars fuses
+  into a projected scan and an aggregation over every grouped column; each
+  table is then a rollup of that small result
+
+The lazy engines group by the raw City and Date text, so no row is parsed or
+cleaned; their small results are then finished in pandas: the distinct raw
+cities are normalized with ``CityNormalizer`` (weighted by their rows), the
+date parts are extracted from the distinct dates, the filters are applied to
+the groups and the groups are totalled again.
+Both engines are multithreaded and are optional dependencies (``pip install
+cceda[lazy]``); a backend is only importable when its engine is installed.
+
+Usage:
+    tables = DuckDBBackend('transactions.csv').question_tables()
+    assert_backends_agree([PandasBackend(path), DuckDBBackend(path), PolarsBackend(path)])
+"""
+
+from abc import ABC, abstractmethod
+
+import pandas as pd
+
+from cceda.cities import CityNormalizer
+from cceda.dates import DATE_PART_COLUMNS, DateColumnsExtractor
+from cceda.loader import load_transactions
+from cceda.questions import QUESTION_FILTERS, QUESTION_GROUPS, assert_tables_equal, prepare_frame, question_table
+from cceda.schema import COLUMNS, INDEX_COLUMN, SAMPLE_CSV
+
+# the text columns the lazy engines group by, in the order of a grouping
+_TEXT_COLUMNS = ['City', 'Date', 'Card Type', 'Exp Type', 'Gender']
+
+
+def _engine_groups(name):
+    # the columns a lazy engine groups a table by: its own columns and those it is filtered on, with the
+    # date parts grouped as the raw Date
+    columns = [*QUESTION_GROUPS[name], *QUESTION_FILTERS.get(name, {})]
+    columns = {'Date' if column in DATE_PART_COLUMNS else column for column in columns}
+
+    return tuple(column for column in _TEXT_COLUMNS if column in columns)
+
+
+class QueryBackend(ABC):
+    """
+    Computes the question tables of a transactions csv with one execution engine
+
+    A backend implements ``question_tables``; a class missing it cannot be instantiated.
+
+    Parameters:
+    path (str or Path): the transactions csv
+    city_memo (str or Path): optional json file memoizing the cleaned city names between runs
+
+    Attributes:
+    name (str): the name of the backend, as in ``BACKENDS``
+    requires (str): the optional package the engine needs, None for none
+    """
+
+    name = None
+    requires = None
+
+    def __init__(self, path=SAMPLE_CSV, city_memo=None):
+        self.path = path
+        self.city_memo = city_memo
+
+    @abstractmethod
+    def question_tables(self, names=None):
+        """
+        Computes question tables
+
+        Parameters:
+        names (list): names of ``QUESTION_GROUPS``, all of them by default
+
+        Returns:
+        dict: table name to table, the group columns and the total Amount
+        """
+
+    def question_table(self, name):
+        """
+        Computes one question table
+
+        Returns:
+        pandas.DataFrame: the group columns and the total Amount, one row per group
+        """
+
+        return self.question_tables([name])[name]
+
+
+class PandasBackend(QueryBackend):
+    """
+    The eager pandas engine: loads the prepared frame, then one groupby per table
+
+    Parameters:
+    use_cache (bool): load the columnar snapshot of the csv when there is one, see ``load_transactions``
+    """
+
+    name = 'pandas'
+
+    def __init__(self, path=SAMPLE_CSV, city_memo=None, use_cache=True, cache_dir=None):
+        super().__init__(path, city_memo)
+        self.use_cache = use_cache
+        self.cache_dir = cache_dir
+
+    def question_tables(self, names=None):
+        df = prepare_frame(load_transactions(self.path, cache_dir=self.cache_dir, use_cache=self.use_cache),
+                           self.city_memo)
+
+        return {name: question_table(df, name) for name in names or QUESTION_GROUPS}
+
+
+class _LazyBackend(QueryBackend):
+    # a lazy engine computes ``_aggregate`` and the tables are finished here
+
+    @abstractmethod
+    def _aggregate(self, groupings):
+        # one frame per grouping (a list of columns), with the columns, Amount and Rows
+        pass
+
+    def question_tables(self, names=None):
+        names = list(names or QUESTION_GROUPS)
+        # the rows of every raw City are always computed, they weigh the canonical city spellings
+        # and every distinct grouping is aggregated once
+        groupings = list(dict.fromkeys([('City',)] + [_engine_groups(name) for name in names]))
+        results = dict(zip(groupings, self._aggregate([list(keys) for keys in groupings])))
+        cities = results[('City',)]
+        aggregates = [results[_engine_groups(name)] for name in names]
+
+        normalizer = CityNormalizer(self.city_memo)
+        cleaned = dict(zip(cities['City'], normalizer.clean_names(cities['City'].tolist(), cities['Rows'])))
+        normalizer.save()
+        city_dtype = pd.CategoricalDtype(sorted(set(cleaned.values())))
+
+        return {name: self._finish(name, aggregate, cleaned, city_dtype) for name, aggregate in zip(names, aggregates)}
+
+    @staticmethod
+    def _finish(name, aggregate, cleaned, city_dtype):
+        # extracts the date parts of the groups, applies the filters of the table and cleans the cities
+        if 'Date' in aggregate:
+            aggregate = DateColumnsExtractor().extract_all(aggregate.copy(), 'Date')
+        for column, values in QUESTION_FILTERS.get(name, {}).items():
+            aggregate = aggregate[aggregate[column].isin(values)]
+
+        table = {}
+        for column in QUESTION_GROUPS[name]:
+            values = aggregate[column]
+            if column == 'City':
+                table[column] = pd.Categorical(values.map(cleaned), dtype=city_dtype)
+            elif column in DATE_PART_COLUMNS:
+                table[column] = values.array
+            else:
+                table[column] = pd.Categorical(values, categories=sorted(values.unique()))
+        table['Amount'] = aggregate['Amount'].to_numpy().astype('int64')
+
+        # the cleaned cities and the filters can merge groups, so they are totalled again
+        return pd.DataFrame(table).groupby(QUESTION_GROUPS[name], as_index=False, observed=True)['Amount'].sum()
+
+
+class DuckDBBackend(_LazyBackend):
+    """
+    In-process DuckDB: one scan of the csv and one ``GROUP BY GROUPING SETS`` for every table
+
+    Parameters:
+    threads (int): the threads DuckDB uses, all the CPUs by default
+    """
+
+    name = 'duckdb'
+    requires = 'duckdb'
+
+    def __init__(self, path=SAMPLE_CSV, city_memo=None, threads=None):
+        super().__init__(path, city_memo)
+        import duckdb
+
+        self.connection = duckdb.connect(config={'threads': threads} if threads else {})
+
+    def _aggregate(self, groupings):
+        # every column of the query, in a fixed order, so GROUPING() tells which set a row belongs to
+        columns = [column for column in _TEXT_COLUMNS if any(column in keys for keys in groupings)]
+        quoted = {column: '"' + column + '"' for column in columns}
+
+        schema = ', '.join(f"'{column}': '{'BIGINT' if column in (INDEX_COLUMN, 'Amount') else 'VARCHAR'}'"
+                           for column in [INDEX_COLUMN] + COLUMNS)
+        source = str(self.path).replace("'", "''")
+        sets = ', '.join('(' + ', '.join(quoted[column] for column in keys) + ')' for keys in groupings)
+        query = f"""
+            SELECT GROUPING({', '.join(quoted.values())}) AS grouping_id, {', '.join(quoted.values())},
+                   SUM("Amount")::BIGINT AS "Amount", COUNT(*) AS "Rows"
+            FROM read_csv('{source}', header = true, columns = {{{schema}}})
+            GROUP BY GROUPING SETS ({sets})
+        """
+        result = self.connection.execute(query).df()
+
+        # GROUPING() has a bit set for every column left out of the set, the first column being the highest bit
+        frames = []
+        for keys in groupings:
+            grouping_id = sum(1 << (len(columns) - 1 - position) for position, column in enumerate(columns)
+                              if column not in keys)
+            frames.append(result.loc[result['grouping_id'] == grouping_id, [*keys, 'Amount', 'Rows']]
+                          .reset_index(drop=True))
+
+        return frames
+
+
+class PolarsBackend(_LazyBackend):
+    """
+    Polars lazy frames: one fused scan and aggregation of the csv, rolled up into every table
+
+    Parameters:
+    engine (str): the Polars engine collecting the query, e.g. 'streaming' or 'in-memory'
+    """
+
+    name = 'polars'
+    requires = 'polars'
+
+    def __init__(self, path=SAMPLE_CSV, city_memo=None, engine='streaming'):
+        super().__init__(path, city_memo)
+        import polars
+
+        self.pl = polars
+        self.engine = engine
+
+    def _aggregate(self, groupings):
+        pl = self.pl
+        transactions = pl.scan_csv(self.path, schema_overrides={column: pl.String for column in _TEXT_COLUMNS})
+
+        # one lazy aggregation over every grouped column reads the csv once; each grouping is then a rollup of
+        # its small result, as Polars would otherwise scan the file again for every query
+        columns = [column for column in _TEXT_COLUMNS if any(column in keys for keys in groupings)]
+        cube = transactions.group_by(columns).agg(pl.col('Amount').sum().cast(pl.Int64), pl.len().alias('Rows')) \
+            .collect(engine=self.engine)
+        frames = [cube.group_by(keys).agg(pl.col('Amount').sum(), pl.col('Rows').sum()) for keys in groupings]
+
+        # column by column, as ``to_pandas`` needs pyarrow
+        return [pd.DataFrame({column: frame[column].to_numpy() for column in frame.columns})
+                for frame in frames]
+
+
+# backend name to class
+BACKENDS = {backend.name: backend for backend in (PandasBackend, DuckDBBackend, PolarsBackend)}
+
+
+def assert_backends_agree(backends, names=None):
+    """
+    Checks that every backend computes the same question tables as the first one
+
+    Parameters:
+    backends (list): ``QueryBackend`` instances over the same csv
+    names (list): the tables to compare, all of them by default
+
+    Returns:
+    dict: the tables of the first backend
+    """
+
+    reference, *others = backends
+    expected = reference.question_tables(names)
+    for backend in others:
+        for name, table in backend.question_tables(names).items():
+            try:
+                assert_tables_equal(expected[name], table)
+            except AssertionError as error:
+                raise AssertionError(f'{backend.name} and {reference.name} disagree on {name}: {error}') from error
+
+    return expected
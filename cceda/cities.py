@@ -0,0 +1,168 @@
+"""
+Normalization of the City column on its distinct values only
+
+The City column repeats about a thousand distinct names over all the rows, so
+the names are factorized, each distinct name is cleaned once, and the integer
+codes are remapped to the cleaned names. Cleaned names are memoized, and the
+memo can be kept in a json file so later runs skip the cleaning entirely.
+"""
+
+import json
+import os
+import re
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+# a country written after the city name: 'Delhi, India', 'Delhi (India)', 'Delhi - IN'
+_COUNTRY_SUFFIX = re.compile(r'\s*(?:\(\s*(?:india|ind|in|bharat)\s*\)|-\s+(?:india|ind|in|bharat))\.?$',
+                             re.IGNORECASE)
+_WHITESPACE = re.compile(r'\s+')
+
+MEMO_VERSION = 1
+
+
+def clean_city_name(name):
+    """
+    Cleans one raw city name: whitespace, country suffix
+
+    Everything after the first comma is dropped, which removes ', India' and any
+    other country suffix written that way, as well as '(India)' and ' - India'.
+
+    Returns:
+    str: the city name without the country, with single spaces
+    """
+
+    name = _WHITESPACE.sub(' ', str(name)).strip()
+    name = name.split(',', 1)[0].strip()
+
+    return _COUNTRY_SUFFIX.sub('', name).strip()
+
+
+def _is_single_case(name):
+    # names typed all in upper or all in lower case carry no information on the spelling
+    return name == name.upper() or name == name.lower()
+
+
+class CityNormalizer:
+    """
+    Normalizes City columns, remembering every raw name it has cleaned
+
+    Names that only differ in case are mapped to one canonical spelling: the
+    spelling already known from earlier runs, otherwise the most frequent mixed
+    case spelling, otherwise the title-cased name.
+
+    Attributes:
+    memo (dict): raw name to cleaned name
+    canonical (dict): case-folded cleaned name to its canonical spelling
+    """
+
+    def __init__(self, memo_path=None):
+        self.memo_path = Path(memo_path) if memo_path is not None else None
+        self.memo = {}
+        self.canonical = {}
+
+        if self.memo_path is not None and self.memo_path.exists():
+            state = json.loads(self.memo_path.read_text())
+            if state.get('version') == MEMO_VERSION:
+                self.memo, self.canonical = state['memo'], state['canonical']
+
+    def save(self):
+        """
+        Writes the memo to its json file, replacing it atomically
+        """
+
+        if self.memo_path is None:
+            return
+
+        self.memo_path.parent.mkdir(parents=True, exist_ok=True)
+        temporary = self.memo_path.with_name(self.memo_path.name + '.tmp')
+        temporary.write_text(json.dumps({'version': MEMO_VERSION, 'memo': self.memo,
+                                         'canonical': self.canonical}))
+        os.replace(temporary, self.memo_path)
+
+    def _learn(self, raw_names, counts):
+        # cleans the raw names the memo does not know yet and settles their canonical spelling
+        cleaned = {raw: clean_city_name(raw) for raw in raw_names}
+
+        # the most frequent mixed case spelling of every new case-folded name
+        votes = {}
+        for raw, count in zip(raw_names, counts):
+            name = cleaned[raw]
+            if not _is_single_case(name):
+                key = name.casefold()
+                votes.setdefault(key, {}).setdefault(name, 0)
+                votes[key][name] += int(count)
+
+        for raw in raw_names:
+            key = cleaned[raw].casefold()
+            if key not in self.canonical:
+                if key in votes:
+                    self.canonical[key] = max(votes[key].items(), key=lambda item: item[1])[0]
+                else:
+                    self.canonical[key] = cleaned[raw].title()
+            self.memo[raw] = self.canonical[key]
+
+    def clean_names(self, raw_names, counts):
+        """
+        Normalizes distinct raw city names, e.g. the groups of an aggregate computed elsewhere
+
+        Parameters:
+        raw_names (list): distinct raw names
+        counts (array-like): the number of rows of every raw name, the votes for the canonical spelling;
+            only needed when a name is not in the memo yet
+
+        Returns:
+        list: the cleaned name of every raw name
+        """
+
+        raw_names = [str(name) for name in raw_names]
+        unknown = [position for position, raw in enumerate(raw_names) if raw not in self.memo]
+        if unknown:
+            counts = np.asarray(counts)
+            self._learn([raw_names[position] for position in unknown], counts[unknown])
+
+        return [self.memo[raw] for raw in raw_names]
+
+    def normalize(self, cities):
+        """
+        Normalizes a City column
+
+        Returns:
+        pandas.Series: a categorical of the cleaned names, with the index of the input
+        """
+
+        # the codes of every row and the distinct raw names they point into
+        if isinstance(cities.dtype, pd.CategoricalDtype):
+            codes, raw_names = cities.cat.codes.to_numpy(), cities.cat.categories
+        else:
+            codes, raw_names = pd.factorize(cities)
+        raw_names = [str(name) for name in raw_names]
+
+        # the rows are only counted when a name is new to the memo
+        counts = None
+        if any(raw not in self.memo for raw in raw_names):
+            counts = np.bincount(codes[codes >= 0], minlength=len(raw_names))
+        cleaned = self.clean_names(raw_names, counts)
+
+        # remapping the raw codes onto the sorted cleaned names
+        new_codes, categories = pd.factorize(pd.Index(cleaned), sort=True)
+        values = pd.Categorical.from_codes(np.where(codes >= 0, new_codes[codes], -1), categories=categories)
+
+        return pd.Series(values, index=cities.index, name=cities.name)
+
+
+def normalize_cities(cities, memo_path=None):
+    """
+    Normalizes a City column, optionally reusing and updating a memo file
+
+    Returns:
+    pandas.Series: a categorical of the cleaned names
+    """
+
+    normalizer = CityNormalizer(memo_path)
+    normalized = normalizer.normalize(cities)
+    normalizer.save()
+
+    return normalized
@@ -0,0 +1,129 @@
+"""
+An index of the cleaned City column for membership, prefix and length queries
+"""
+
+import numpy as np
+import pandas as pd
+
+from cceda.encoding import encode_column
+
+# sorts after every character, so prefix + _PREFIX_END bounds all names starting with prefix
+_PREFIX_END = '\U0010ffff'
+
+
+class CityIndex:
+    """
+    Built once from the City column, answers city queries without scanning the rows
+
+    - a hash table of the city names for membership tests, single or batched
+    - the names in sorted order, so a prefix is a binary search
+    - the names bucketed by length for length filters
+    - the row positions of every city grouped together (offsets into one array),
+      so the transactions of a city can be fetched without a scan
+    """
+
+    def __init__(self, cities):
+        codes, names = encode_column(cities)
+        names = pd.Index(names.astype(str), dtype=object)
+
+        # the labels come back sorted, so code order is alphabetical order
+        self.names = names
+        self._sorted = names.to_numpy()
+        self._set = frozenset(self._sorted)
+        self.lengths = np.fromiter((len(name) for name in self._sorted), dtype=np.int32, count=len(names))
+
+        self._by_length = {}
+        for length in np.unique(self.lengths):
+            self._by_length[int(length)] = np.flatnonzero(self.lengths == length)
+
+        # row positions sorted by city code; offsets[code]:offsets[code + 1] are the rows of a city
+        self._row_order = np.argsort(codes, kind='stable')
+        self._offsets = np.concatenate([[0], np.cumsum(np.bincount(codes, minlength=len(names)))])
+
+    def __len__(self):
+        return len(self._sorted)
+
+    def __contains__(self, city):
+        return city in self._set
+
+    def contains_many(self, cities):
+        """
+        Tests many city names at once
+
+        Returns:
+        numpy.ndarray: one boolean per name, True when the city has transactions
+        """
+
+        return self.names.get_indexer(pd.Index(list(cities), dtype=object)) >= 0
+
+    def _prefix_range(self, prefix):
+        # the codes of the names starting with prefix form one contiguous range
+        start = np.searchsorted(self._sorted, prefix, side='left')
+        stop = np.searchsorted(self._sorted, prefix + _PREFIX_END, side='left')
+
+        return int(start), int(stop)
+
+    def with_prefix(self, prefix):
+        """
+        Returns the cities whose name starts with ``prefix``, in alphabetical order
+        """
+
+        start, stop = self._prefix_range(prefix)
+
+        return self._sorted[start:stop].tolist()
+
+    def with_length(self, min_length=0, max_length=None):
+        """
+        Returns the cities whose name length is within the bounds, in alphabetical order
+        """
+
+        buckets = [codes for length, codes in self._by_length.items()
+                   if length >= min_length and (max_length is None or length <= max_length)]
+        codes = np.sort(np.concatenate(buckets)) if buckets else np.array([], dtype=np.intp)
+
+        return self._sorted[codes].tolist()
+
+    def search(self, prefixes=('',), min_length=0, max_length=None):
+        """
+        Returns the cities starting with any of ``prefixes`` whose length is within the bounds
+
+        Returns:
+        list: the matching city names, in alphabetical order
+        """
+
+        matches = []
+        for prefix in sorted(set(prefixes)):
+            start, stop = self._prefix_range(prefix)
+            lengths = self.lengths[start:stop]
+            keep = lengths >= min_length
+            if max_length is not None:
+                keep &= lengths <= max_length
+            matches.append(np.arange(start, stop)[keep])
+
+        codes = np.unique(np.concatenate(matches)) if matches else np.array([], dtype=np.intp)
+
+        return self._sorted[codes].tolist()
+
+    def rows(self, city):
+        """
+        Returns the positions of a city's transactions in the frame the index was built from
+
+        Returns:
+        numpy.ndarray: row positions for ``DataFrame.iloc``, empty for an unknown city
+        """
+
+        code = self.names.get_indexer([city])[0]
+        if code < 0:
+            return np.array([], dtype=np.intp)
+
+        return self._row_order[self._offsets[code]:self._offsets[code + 1]]
+
+    def transactions(self, df, city):
+        """
+        Returns the transactions of one city from the frame the index was built from
+
+        Returns:
+        pandas.DataFrame: the city's rows, in their original order
+        """
+
+        return df.iloc[self.rows(city)]
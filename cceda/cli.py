@@ -0,0 +1,150 @@
+"""
+Command line interface of the analysis
+
+Usage:
+    ccEDA run q1 q3 --input 'Credit card transactions India.csv'
+    ccEDA run q2 --output results --charts
+    ccEDA report --output report
+    ccEDA run q1 q3 --trace trace.json --profile q3 --profile-dir profiles
+    ccEDA serve --port 8000
+"""
+
+import argparse
+import json
+import sys
+from pathlib import Path
+
+
+def _run(args):
+    # the analysis is imported here so that `ccEDA --help` stays instant
+    from cceda.analysis import run
+
+    charts_dir = args.output if args.charts else None
+    results = run(args.questions, args.input, cache_dir=args.cache_dir, charts_dir=charts_dir)
+
+    if args.output:
+        Path(args.output).mkdir(parents=True, exist_ok=True)
+
+    for question, tables in results.items():
+        for name, table in tables.items():
+            print(f'== {question}: {name} ==')
+            print(table.head(args.rows).to_string(index=False))
+            print()
+            if args.output:
+                table.to_csv(Path(args.output) / f'{question}_{name}.csv', index=False)
+
+
+def _report(args):
+    from cceda.analysis import load
+    from cceda.report import build_report, question_charts
+
+    _, cube = load(args.input, args.cache_dir)
+    summary = build_report(question_charts(cube), args.output, workers=args.workers)
+
+    for name, timing in summary['charts'].items():
+        print(f"{name:<20} {timing['seconds']:7.3f}s {'cached' if timing['cached'] else 'rendered'}")
+    print(f"{'total':<20} {summary['seconds']:7.3f}s  {summary['report']}")
+
+
+def _serve(args):
+    import asyncio
+    import logging
+
+    from cceda.service import serve
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(name)s %(message)s')
+
+    def ready(address):
+        # printed for scripts that start the service and wait for it
+        print(f'serving on http://{address[0]}:{address[1]}', flush=True)
+
+    try:
+        asyncio.run(serve(args.input, args.host, args.port, workers=args.workers, cache_dir=args.cache_dir,
+                          ready=ready))
+    except KeyboardInterrupt:
+        pass
+
+
+def build_parser():
+    """
+    Builds the argument parser of the ``ccEDA`` command
+
+    Returns:
+    argparse.ArgumentParser: the parser with one sub-command per action
+    """
+
+    from cceda.schema import SAMPLE_CSV
+
+    parser = argparse.ArgumentParser(prog='ccEDA', description='India credit card spendings analysis')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    def add_common(command):
+        command.add_argument('--input', default=SAMPLE_CSV, help='the transactions csv')
+        command.add_argument('--cache-dir', help='where the columnar snapshot of the csv is kept')
+
+        instrumentation = command.add_argument_group('instrumentation')
+        instrumentation.add_argument('--trace', help='write the stage timings as a Chrome trace json file')
+        instrumentation.add_argument('--stage-log', help='write the stage timings as json lines')
+        instrumentation.add_argument('--trace-memory', action='store_true',
+                                     help='also measure the peak memory of every stage (slower)')
+        instrumentation.add_argument('--profile', metavar='STAGE',
+                                     help='run one stage (e.g. load, preprocess, q1, charts) under cProfile')
+        instrumentation.add_argument('--profile-dir', default='.', help='where the profile files are written')
+
+    run = commands.add_parser('run', help='answer some of the business questions')
+    run.add_argument('questions', nargs='+', choices=['q1', 'q2', 'q3', 'q4', 'q5'], metavar='question',
+                     help='q1 to q5')
+    add_common(run)
+    run.add_argument('--output', help='directory the tables (and charts) are written to')
+    run.add_argument('--charts', action='store_true', help='also render the charts of the questions')
+    run.add_argument('--rows', type=int, default=10, help='rows of each table to print')
+    run.set_defaults(handler=_run)
+
+    report = commands.add_parser('report', help='render every chart into a self-contained html report')
+    add_common(report)
+    report.add_argument('--output', default='report', help='the report directory')
+    report.add_argument('--workers', type=int, help='rendering processes')
+    report.set_defaults(handler=_report)
+
+    serve = commands.add_parser('serve', help='answer the questions over a local JSON HTTP service')
+    # the stage instrumentation measures one run, so the long-running service does not take its options
+    serve.add_argument('--input', default=SAMPLE_CSV, help='the transactions csv')
+    serve.add_argument('--cache-dir', help='where the columnar snapshot of the csv is kept')
+    serve.add_argument('--host', default='127.0.0.1')
+    serve.add_argument('--port', type=int, default=8000, help='0 picks a free port')
+    serve.add_argument('--workers', type=int, help='threads answering questions')
+    serve.set_defaults(handler=_serve, trace=None, stage_log=None, trace_memory=False, profile=None)
+
+    return parser
+
+
+def main(argv=None):
+    """
+    Entry point of the ``ccEDA`` command
+    """
+
+    args = build_parser().parse_args(argv)
+    if args.command == 'run' and args.charts and not args.output:
+        build_parser().error('--charts needs --output')
+
+    if not (args.trace or args.stage_log or args.trace_memory or args.profile):
+        args.handler(args)
+        return
+
+    from cceda.instrument import Instrumentation
+
+    with Instrumentation(trace_memory=args.trace_memory, profile_stage=args.profile,
+                         profile_dir=args.profile_dir) as instrumentation:
+        args.handler(args)
+
+    if args.trace:
+        instrumentation.write_chrome_trace(args.trace)
+    if args.stage_log:
+        instrumentation.write_log(args.stage_log)
+    if not (args.trace or args.stage_log):
+        for record in instrumentation.records:
+            print(json.dumps(record), file=sys.stderr)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,189 @@
+"""
+A precomputed aggregation cube of Amount, answering every question by a roll-up
+
+The cube is built in one pass over the transactions. Each cell is one observed
+combination of City, Date, Card Type, Exp Type and Gender, with the sum, count,
+minimum and maximum of Amount. All dimensions are stored as integer codes in
+NumPy arrays next to a small table of labels per dimension. The date parts used
+by the questions (Year, Month, Day Number, Day Name, Quarter) are looked up from
+the Date code, so they need no storage of their own.
+"""
+
+import numpy as np
+import pandas as pd
+
+from cceda.dates import DAY_NAME_DTYPE, MONTH_DTYPE
+from cceda.encoding import encode_column
+from cceda.questions import QUESTION_FILTERS, QUESTION_GROUPS
+
+# the stored dimensions, in the order their codes are combined
+DIMENSIONS = ['City', 'Date', 'Card Type', 'Exp Type', 'Gender']
+
+# the date parts that can be rolled up to, derived from the Date dimension
+DATE_PARTS = ['Year', 'Month', 'Day Number', 'Day Name', 'Quarter']
+
+
+def _reduce_sorted(keys, sums, counts, minimums, maximums):
+    # merges the rows with equal keys; every measure is combined exactly in int64
+    if len(keys) == 0:
+        return keys, sums, counts, minimums, maximums
+
+    order = np.argsort(keys, kind='stable')
+    keys = keys[order]
+    starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+
+    return (keys[starts],
+            np.add.reduceat(sums[order], starts),
+            np.add.reduceat(counts[order], starts),
+            np.minimum.reduceat(minimums[order], starts),
+            np.maximum.reduceat(maximums[order], starts))
+
+
+class AggregationCube:
+    """
+    Sum, count, min and max of Amount over City x Date x Card Type x Exp Type x Gender
+
+    Attributes:
+    labels (dict): dimension name to a pandas.Index of its labels
+    coords (dict): dimension name to the int32 code of every cell
+    sum, count, min, max (numpy.ndarray): the int64 measures of every cell
+    """
+
+    def __init__(self, labels, coords, sums, counts, minimums, maximums):
+        self.labels = labels
+        self.coords = coords
+        self.sum = sums
+        self.count = counts
+        self.min = minimums
+        self.max = maximums
+
+    @classmethod
+    def build(cls, df, amount_column='Amount'):
+        """
+        Builds the cube from a transactions frame in a single pass
+
+        Returns:
+        AggregationCube: the cube of the frame
+        """
+
+        labels, codes = {}, []
+        for dimension in DIMENSIONS:
+            dimension_codes, labels[dimension] = encode_column(df[dimension])
+            codes.append(dimension_codes)
+
+        shape = tuple(len(labels[dimension]) for dimension in DIMENSIONS)
+        amounts = df[amount_column].to_numpy().astype('int64', copy=False)
+
+        # one int64 key per row identifies its cell, and equal keys are merged
+        keys = np.ravel_multi_index(codes, shape)
+        keys, sums, counts, minimums, maximums = _reduce_sorted(
+            keys, amounts, np.ones(len(amounts), dtype='int64'), amounts, amounts)
+
+        coords = dict(zip(DIMENSIONS, (axis.astype('int32') for axis in np.unravel_index(keys, shape))))
+
+        return cls(labels, coords, sums, counts, minimums, maximums)
+
+    @property
+    def cells(self):
+        """
+        Returns the number of non-empty cells of the cube
+        """
+
+        return len(self.sum)
+
+    @property
+    def nbytes(self):
+        """
+        Returns the memory held by the cube's arrays and labels, in bytes
+        """
+
+        arrays = [*self.coords.values(), self.sum, self.count, self.min, self.max]
+        labels = sum(index.memory_usage(deep=True) for index in self.labels.values())
+
+        return sum(array.nbytes for array in arrays) + labels
+
+    def _dimension(self, name):
+        # the cell codes and the labels of a stored dimension or a date part
+        if name in self.coords:
+            return self.coords[name], self.labels[name]
+
+        dates = pd.DatetimeIndex(self.labels['Date'])
+        date_codes = self.coords['Date']
+
+        if name == 'Month':
+            return (dates.month.to_numpy() - 1)[date_codes], pd.CategoricalIndex(MONTH_DTYPE.categories,
+                                                                                  dtype=MONTH_DTYPE)
+        if name == 'Day Name':
+            return dates.dayofweek.to_numpy()[date_codes], pd.CategoricalIndex(DAY_NAME_DTYPE.categories,
+                                                                               dtype=DAY_NAME_DTYPE)
+        if name == 'Day Number':
+            return (dates.day.to_numpy() - 1)[date_codes], pd.Index(np.arange(1, 32))
+        if name == 'Quarter':
+            return (dates.quarter.to_numpy() - 1)[date_codes], pd.Index(np.arange(1, 5))
+        if name == 'Year':
+            codes, years = pd.factorize(dates.year, sort=True)
+            return codes[date_codes], pd.Index(years)
+
+        raise KeyError(f'{name} is not a dimension of the cube')
+
+    def rollup(self, dimensions, where=None, measures=('sum',)):
+        """
+        Totals the cube over a subset of its dimensions
+
+        Parameters:
+        dimensions (list): at least one stored dimension or date part, e.g. ['Month', 'Card Type']
+        where (dict): dimension name to the labels to keep, e.g. {'Day Number': [29, 30, 31]}
+        measures (tuple): any of 'sum', 'count', 'min' and 'max'
+
+        Returns:
+        pandas.DataFrame: the dimension columns followed by Amount (the sum) and
+        Count, Min and Max when requested, sorted by the dimensions
+        """
+
+        mask = np.ones(self.cells, dtype=bool)
+        for name, values in (where or {}).items():
+            codes, labels = self._dimension(name)
+            mask &= np.isin(codes, np.flatnonzero(labels.isin(list(values))))
+
+        axes = [self._dimension(name) for name in dimensions]
+        shape = tuple(len(labels) for _, labels in axes)
+        keys = np.ravel_multi_index([codes[mask] for codes, _ in axes], shape)
+
+        keys, sums, counts, minimums, maximums = _reduce_sorted(
+            keys, self.sum[mask], self.count[mask], self.min[mask], self.max[mask])
+
+        # decoding the merged keys back into labels; the month and day names stay ordered categoricals
+        table = {}
+        for name, (_, labels), codes in zip(dimensions, axes, np.unravel_index(keys, shape)):
+            if isinstance(labels, pd.CategoricalIndex):
+                table[name] = pd.Categorical.from_codes(codes, dtype=labels.dtype)
+            else:
+                table[name] = labels[codes].to_numpy()
+
+        computed = {'sum': ('Amount', sums), 'count': ('Count', counts),
+                    'min': ('Min', minimums), 'max': ('Max', maximums)}
+        for measure in measures:
+            column, values = computed[measure]
+            table[column] = values
+
+        return pd.DataFrame(table)
+
+    def question_table(self, name):
+        """
+        Answers one of the question tables of ``cceda.questions`` from the cube
+
+        Returns:
+        pandas.DataFrame: the group columns and the total Amount
+        """
+
+        return self.rollup(QUESTION_GROUPS[name], where=QUESTION_FILTERS.get(name))
+
+    def question_tables(self):
+        """
+        Answers every question table from the cube
+
+        Returns:
+        dict: table name to table
+        """
+
+        return {name: self.question_table(name) for name in QUESTION_GROUPS}
@@ -0,0 +1,339 @@
+"""
+A partitioned columnar dataset of the transactions with predicate pushdown
+
+The writer splits the transactions into one directory per year and month (and
+optionally per card type), e.g. ``year=2014/month=12/card_type=Gold``, and
+writes every column of a partition as a ``.npy`` file. Inside a partition the
+rows are clustered by City and cut into row groups; a manifest records the
+min/max of every column for each partition and each row group.
+
+The reader only opens the partitions and row groups whose statistics can match
+the filter, and only the columns that are asked for. A filter column is only
+read for the row groups where the statistics cannot decide the filter alone.
+
+Usage:
+    write_dataset(load_transactions(), 'transactions.dataset', by_card_type=True)
+    dataset = PartitionedDataset('transactions.dataset')
+    dataset.scan(['Amount'], where={'Year': [2014], 'Month': ['December'], 'Card Type': ['Gold'],
+                                    'Exp Type': ['Travel']})
+    dataset.last_scan
+"""
+
+import json
+import os
+import shutil
+import tempfile
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from cceda.dates import MONTH_DTYPE
+from cceda.encoding import encode_column
+from cceda.schema import CATEGORICAL_COLUMNS, COLUMNS, INDEX_COLUMN
+
+# bumped whenever the layout of a dataset changes, so old datasets are rejected
+DATASET_VERSION = 1
+
+_MANIFEST = 'manifest.json'
+
+# the type of the codes each categorical column is written as
+_CODE_DTYPES = {'City': 'int16', 'Card Type': 'int8', 'Exp Type': 'int8', 'Gender': 'int8'}
+
+# the filter columns decided by the partition directories alone
+PARTITION_COLUMNS = ['Year', 'Month']
+
+
+def _partition_path(partition):
+    # e.g. year=2014/month=12/card_type=Gold
+    parts = [f"year={partition['Year']}", f"month={partition['Month']:02d}"]
+    if 'Card Type' in partition:
+        parts.append(f"card_type={partition['Card Type']}")
+
+    return '/'.join(parts)
+
+
+def _column_stats(values):
+    # the [min, max] of a column slice, as plain python numbers for the manifest
+    return [values.min().item(), values.max().item()]
+
+
+def write_dataset(df, directory, by_card_type=False, row_group_size=65_536):
+    """
+    Writes a typed transactions frame as a partitioned columnar dataset
+
+    The dataset is written to a temporary directory first and moved into place,
+    so a crashed run never leaves a half-written dataset behind.
+
+    Parameters:
+    df (pandas.DataFrame): the typed transactions, as returned by ``load_transactions``
+    directory (str or Path): the dataset directory, replaced when it exists
+    by_card_type (bool): also partition every month by card type
+    row_group_size (int): the rows of a row group, the unit the reader skips by its statistics
+
+    Returns:
+    pathlib.Path: the dataset directory
+    """
+
+    directory = Path(directory)
+    dates = df['Date'].to_numpy().astype('datetime64[ns]')
+    if np.isnat(dates).any():
+        raise ValueError('Date has missing values, which cannot be partitioned')
+
+    # the columns as integer arrays: codes into sorted labels, nanoseconds for dates
+    arrays, columns = {INDEX_COLUMN: df.index.to_numpy()}, {}
+    for position, column in enumerate(COLUMNS):
+        file_name = f'col{position}.npy'
+        if column in CATEGORICAL_COLUMNS:
+            codes, labels = encode_column(df[column], dtype=_CODE_DTYPES[column])
+            if len(codes) and codes.min() < 0:
+                raise ValueError(f'{column} has missing values, which the dataset cannot encode')
+            arrays[column] = codes
+            columns[column] = {'kind': 'categorical', 'file': file_name, 'categories': labels.tolist()}
+        elif column == 'Date':
+            arrays[column] = dates.view('int64')
+            columns[column] = {'kind': 'datetime', 'file': file_name}
+        else:
+            arrays[column] = df[column].to_numpy()
+            columns[column] = {'kind': 'numeric', 'file': file_name}
+    columns[INDEX_COLUMN] = {'kind': 'numeric', 'file': 'index.npy'}
+
+    # one key per partition; the rows are ordered by partition, then clustered by City
+    years = dates.astype('datetime64[Y]').astype('int64') + 1970
+    months = dates.astype('datetime64[M]').astype('int64') % 12 + 1
+    keys = years * 12 + months - 1
+    if by_card_type:
+        keys = keys * len(columns['Card Type']['categories']) + arrays['Card Type']
+    order = np.lexsort((arrays['City'], keys))
+    boundaries = np.flatnonzero(np.diff(keys[order])) + 1
+    starts, stops = np.r_[0, boundaries], np.r_[boundaries, len(order)]
+
+    directory.parent.mkdir(parents=True, exist_ok=True)
+    staging = Path(tempfile.mkdtemp(prefix='.staging-', dir=directory.parent))
+    files = []
+
+    for start, stop in zip(starts, stops):
+        if start == stop:
+            continue
+        rows = order[start:stop]
+        first = rows[0]
+        partition = {'Year': int(years[first]), 'Month': int(months[first])}
+        if by_card_type:
+            partition['Card Type'] = columns['Card Type']['categories'][arrays['Card Type'][first]]
+
+        path = _partition_path(partition)
+        (staging / path).mkdir(parents=True)
+        values = {}
+        for column, info in columns.items():
+            values[column] = arrays[column][rows]
+            np.save(staging / path / info['file'], values[column])
+
+        # the statistics of the whole partition and of each of its row groups
+        row_groups = []
+        for group_start in range(0, len(rows), row_group_size):
+            group_stop = min(group_start + row_group_size, len(rows))
+            row_groups.append({'start': group_start, 'stop': group_stop,
+                               'stats': {column: _column_stats(values[column][group_start:group_stop])
+                                         for column in COLUMNS}})
+        files.append({'path': path, 'partition': partition, 'rows': len(rows),
+                      'stats': {column: _column_stats(values[column]) for column in COLUMNS},
+                      'row_groups': row_groups})
+
+    manifest = {'version': DATASET_VERSION, 'rows': len(df), 'by_card_type': by_card_type,
+                'row_group_size': row_group_size, 'columns': columns, 'files': files}
+    (staging / _MANIFEST).write_text(json.dumps(manifest))
+
+    # replacing any older dataset in the same place
+    if directory.exists():
+        shutil.rmtree(directory)
+    os.replace(staging, directory)
+
+    return directory
+
+
+class PartitionedDataset:
+    """
+    Reads a dataset written by ``write_dataset``, skipping what a filter cannot match
+
+    Filters are dicts of column to the labels to keep, like ``TransactionStore.mask``,
+    e.g. {'Card Type': ['Gold'], 'City': ['Delhi']}. Year (e.g. 2014) and Month (e.g.
+    'December') filter on the partitions. Date and Amount take an inclusive
+    (low, high) range instead, e.g. {'Date': ('2014-12-01', '2014-12-07')}.
+
+    Parameters:
+    directory (str or Path): the dataset directory
+
+    Attributes:
+    last_scan (dict): what the last scan read: the partitions and row groups read and
+    skipped, and the bytes of column data read
+    """
+
+    def __init__(self, directory):
+        self.directory = Path(directory)
+        self.manifest = json.loads((self.directory / _MANIFEST).read_text())
+        if self.manifest.get('version') != DATASET_VERSION:
+            raise ValueError(f'{self.directory} was written by another version of the dataset layout')
+
+        self.columns = self.manifest['columns']
+        self.last_scan = None
+
+    def __len__(self):
+        return self.manifest['rows']
+
+    def _conditions(self, where):
+        # each filter as (column, low, high, wanted): wanted codes for categoricals, a range otherwise
+        conditions = []
+        for column, values in (where or {}).items():
+            if column == 'Month':
+                unknown = [month for month in values if month not in MONTH_DTYPE.categories]
+                if unknown:
+                    raise ValueError(f'unknown Month {unknown}; choose from {", ".join(MONTH_DTYPE.categories)}')
+            if column == 'Year':
+                # compared with the integer years of the partitions, where '2014' would silently match nothing
+                unknown = [year for year in values if not isinstance(year, (int, np.integer)) or isinstance(year, bool)]
+                if unknown:
+                    raise ValueError(f'Year filters take integer years, e.g. [2014], not {unknown}')
+            if column in PARTITION_COLUMNS:
+                continue
+            if column not in COLUMNS:
+                raise KeyError(f'{column} is not a column of the dataset')
+
+            info = self.columns[column]
+            if info['kind'] == 'categorical':
+                wanted = np.flatnonzero(pd.Index(info['categories']).isin(list(values)))
+                conditions.append((column, None, None, wanted))
+            else:
+                low, high = values
+                if info['kind'] == 'datetime':
+                    low, high = pd.Timestamp(low).value, pd.Timestamp(high).value
+                conditions.append((column, low, high, None))
+
+        return conditions
+
+    def _partition_matches(self, partition, where):
+        # the filters decided by the partition values alone
+        months = {MONTH_DTYPE.categories.get_loc(month) + 1 for month in where.get('Month', MONTH_DTYPE.categories)}
+        if partition['Month'] not in months:
+            return False
+        if 'Year' in where and partition['Year'] not in set(where['Year']):
+            return False
+        if 'Card Type' in partition and 'Card Type' in where and partition['Card Type'] not in set(where['Card Type']):
+            return False
+
+        return True
+
+    @staticmethod
+    def _decide(stats, conditions):
+        # 'none' when no row can match, 'all' when every row matches, otherwise the conditions to test row by row
+        undecided = []
+        for condition in conditions:
+            column, low, high, wanted = condition
+            smallest, largest = stats[column]
+            if wanted is not None:
+                inside = wanted[(wanted >= smallest) & (wanted <= largest)]
+                if not len(inside):
+                    return 'none'
+                if len(inside) < largest - smallest + 1:
+                    undecided.append(condition)
+            else:
+                if largest < low or smallest > high:
+                    return 'none'
+                if smallest < low or largest > high:
+                    undecided.append(condition)
+
+        return undecided or 'all'
+
+    def scan(self, columns=None, where=None):
+        """
+        Reads the rows matching a filter, with only the columns asked for
+
+        Parameters:
+        columns (list): the columns to read, every data column when None; add 'index'
+        to also read the original row numbers as the index
+        where (dict): the row filter, see the class documentation
+
+        Returns:
+        pandas.DataFrame: the matching rows, grouped by partition and clustered by City
+        """
+
+        where = where or {}
+        columns = list(COLUMNS) + [INDEX_COLUMN] if columns is None else list(columns)
+        conditions = self._conditions(where)
+        scanned = {'partitions': 0, 'partitions_skipped': 0, 'row_groups': 0, 'row_groups_skipped': 0,
+                   'bytes_read': 0}
+        parts = {column: [] for column in columns}
+
+        for entry in self.manifest['files']:
+            if not self._partition_matches(entry['partition'], where) or \
+                    self._decide(entry['stats'], conditions) == 'none':
+                scanned['partitions_skipped'] += 1
+                scanned['row_groups_skipped'] += len(entry['row_groups'])
+                continue
+            scanned['partitions'] += 1
+
+            # the files are memory-mapped, so only the row groups sliced below are read from disk
+            files = {}
+
+            def read(column, start, stop):
+                if column not in files:
+                    files[column] = np.load(self.directory / entry['path'] / self.columns[column]['file'],
+                                            mmap_mode='r')
+                values = np.array(files[column][start:stop])
+                scanned['bytes_read'] += values.nbytes
+                return values
+
+            for group in entry['row_groups']:
+                decision = self._decide(group['stats'], conditions)
+                if decision == 'none':
+                    scanned['row_groups_skipped'] += 1
+                    continue
+                scanned['row_groups'] += 1
+
+                start, stop = group['start'], group['stop']
+                keep = None
+                if decision != 'all':
+                    keep = np.ones(stop - start, dtype=bool)
+                    for column, low, high, wanted in decision:
+                        values = read(column, start, stop)
+                        keep &= np.isin(values, wanted) if wanted is not None else (values >= low) & (values <= high)
+
+                for column in columns:
+                    values = read(column, start, stop)
+                    parts[column].append(values if keep is None else values[keep])
+
+        self.last_scan = scanned
+
+        return self._frame(columns, parts)
+
+    def _frame(self, columns, parts):
+        # decodes the integer arrays into a frame like the one ``load_transactions`` returns
+        frame = {}
+        for column in columns:
+            info = self.columns[column]
+            values = np.concatenate(parts[column]) if parts[column] else \
+                np.array([], dtype=_CODE_DTYPES.get(column, 'int64'))
+            if info['kind'] == 'categorical':
+                frame[column] = pd.Categorical.from_codes(values, info['categories'], validate=False)
+            elif info['kind'] == 'datetime':
+                frame[column] = values.view('datetime64[ns]')
+            else:
+                frame[column] = values
+
+        index = frame.pop(INDEX_COLUMN, None)
+        index = pd.Index(index, name=INDEX_COLUMN) if index is not None else None
+
+        return pd.DataFrame(frame, index=index, copy=False)
+
+    def stats(self):
+        """
+        Summarizes the layout of the dataset
+
+        Returns:
+        dict: the rows, the partitions, the row groups and the bytes of column data on disk
+        """
+
+        size = sum(path.stat().st_size for path in self.directory.rglob('*.npy'))
+
+        return {'rows': len(self), 'partitions': len(self.manifest['files']),
+                'row_groups': sum(len(entry['row_groups']) for entry in self.manifest['files']),
+                'bytes': size}
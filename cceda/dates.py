@@ -0,0 +1,174 @@
+"""
+Extraction of Year, Month, Day Number, Day Name and other date parts
+"""
+
+import calendar
+
+import numpy as np
+import pandas as pd
+
+from cceda.loader import parse_date_column
+from cceda.schema import DATE_FORMAT
+
+# month and day names in calendar order, used as ordered categoricals
+MONTH_NAMES = list(calendar.month_name)[1:]
+DAY_NAMES = list(calendar.day_name)
+
+MONTH_DTYPE = pd.CategoricalDtype(MONTH_NAMES, ordered=True)
+DAY_NAME_DTYPE = pd.CategoricalDtype(DAY_NAMES, ordered=True)
+
+# the columns added by DateColumnsExtractor.extract_all
+DATE_PART_COLUMNS = ['Year', 'Month', 'Day Number', 'Day Name', 'Quarter', 'Week', 'Month End']
+
+
+# creating a class called DateColumnsExtractor
+class DateColumnsExtractor:
+    """
+    Extracts date parts from a date column of a Pandas DataFrame
+
+    The date column is parsed with the explicit ``date_format`` the first time it
+    is needed and the parsed datetime64 values are written back into the frame,
+    so every later extraction reuses them instead of parsing the strings again.
+    """
+
+    def __init__(self, date_format=DATE_FORMAT):
+        self.date_format = date_format
+
+    def parse(self, df, date_column):
+        """
+        Parses a date column once and caches the result in the DataFrame
+
+        Returns:
+        pandas.Series: the datetime64 date column
+        """
+
+        # a column that is already datetime64 (e.g. from the loader) is used as is
+        if not pd.api.types.is_datetime64_any_dtype(df[date_column]):
+            df[date_column] = parse_date_column(df[date_column], self.date_format)
+
+        return df[date_column]
+
+    def extract_all(self, df, date_column):
+        """
+        Extracts every date part from a date column in a single call
+
+        The parts are computed for the distinct dates only and spread back to the
+        rows through their codes. Month and Day Name are ordered categoricals.
+
+        Returns:
+        pandas.DataFrame: The original DataFrame with new Year, Month, Day Number, Day Name,
+        Quarter, Week and Month End columns
+        """
+
+        dates = self.parse(df, date_column)
+
+        # transactions repeat a few hundred dates, so the parts are computed per distinct date
+        codes, uniques = pd.factorize(dates)
+        uniques = pd.DatetimeIndex(uniques)
+
+        # the integer parts have no missing value, so unparsed dates are rejected
+        if (codes < 0).any():
+            raise ValueError(f'{date_column} contains missing dates, drop or quarantine them first')
+
+        def spread(values, dtype):
+            return np.asarray(values, dtype=dtype)[codes]
+
+        df['Year'] = spread(uniques.year, 'int16')
+        df['Month'] = pd.Categorical.from_codes(spread(uniques.month - 1, 'int8'), dtype=MONTH_DTYPE)
+        df['Day Number'] = spread(uniques.day, 'int8')
+        df['Day Name'] = pd.Categorical.from_codes(spread(uniques.dayofweek, 'int8'), dtype=DAY_NAME_DTYPE)
+        df['Quarter'] = spread(uniques.quarter, 'int8')
+        df['Week'] = spread(uniques.isocalendar().week, 'int8')
+        df['Month End'] = spread(uniques.is_month_end, 'bool')
+
+        # returning the new dataframe
+        return df
+
+    def extract_year(self, df, date_column):
+        """
+        Extracts the year from a date column in a Pandas DataFrame
+
+        Returns:
+        pandas.DataFrame: The original DataFrame with a new column for the year
+        """
+
+        df['Year'] = self.parse(df, date_column).dt.year
+
+        return df
+
+    def extract_month_name(self, df, date_column):
+        """
+        Extracts the month name from a date column in a Pandas DataFrame
+
+        Returns:
+        pandas.DataFrame: The original DataFrame with a new ordered categorical column for the month name
+        """
+
+        months = self.parse(df, date_column).dt.month.to_numpy() - 1
+        df['Month'] = pd.Categorical.from_codes(months, dtype=MONTH_DTYPE)
+
+        return df
+
+    def extract_day_number(self, df, date_column):
+        """
+        Extracts the day number from a date column in a Pandas DataFrame
+
+        Returns:
+        pandas.DataFrame: The original DataFrame with a new column for the day number
+        """
+
+        df['Day Number'] = self.parse(df, date_column).dt.day
+
+        return df
+
+    def extract_day_name(self, df, date_column):
+        """
+        Extracts the day name from a date column in a Pandas DataFrame
+
+        Returns:
+        pandas.DataFrame: The original DataFrame with a new ordered categorical column for the day name
+        """
+
+        days = self.parse(df, date_column).dt.dayofweek.to_numpy()
+        df['Day Name'] = pd.Categorical.from_codes(days, dtype=DAY_NAME_DTYPE)
+
+        return df
+
+
+def select_days(df, days, day_column='Day Number'):
+    """
+    Selects the transactions made on the given day numbers of the month
+
+    One boolean mask is built for all the days, so the frame is scanned once and
+    the result is copied once, in the original row order.
+
+    Parameters:
+    days (iterable): day numbers to keep, e.g. [29, 30, 31]
+
+    Returns:
+    pandas.DataFrame: the rows whose day number is one of ``days``
+    """
+
+    return df[df[day_column].isin(list(days))]
+
+
+def last_days_of_month(df, n, date_column='Date', date_format=DATE_FORMAT):
+    """
+    Selects the transactions made in the last ``n`` days of their month
+
+    The window is measured against the real length of each month, so with n=3 it
+    is the 26th-28th of a February and the 29th-31st of a January.
+
+    Returns:
+    pandas.DataFrame: the rows falling in the last ``n`` days of their month
+    """
+
+    dates = DateColumnsExtractor(date_format).parse(df, date_column)
+
+    # the window test is evaluated per distinct date and spread back to the rows;
+    # the trailing False is picked by missing dates, whose code is -1
+    codes, uniques = pd.factorize(dates)
+    uniques = pd.DatetimeIndex(uniques)
+    in_window = np.append(np.asarray(uniques.day > uniques.days_in_month - n), False)
+
+    return df[in_window[codes]]
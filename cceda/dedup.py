@@ -0,0 +1,332 @@
+"""
+Row-level duplicate detection of transaction batches, against each other and against the history
+
+Every row is reduced to a 64 bit hash of its City, Date, Card Type, Exp Type,
+Gender and Amount, computed column by column with vectorized hashing (the
+categorical columns only hash their categories). A row is a duplicate when its
+hash was seen earlier in the same batch, or in any batch applied before. The
+history is kept either as an exact set of hashes (8 bytes per distinct row) or
+as a Bloom filter of fixed size, and can be persisted between runs.
+
+Two different rows share a hash with probability about n**2 / 2**65 over n
+rows (about 1 in 4000 at 100 million rows), so a rare unique row could be
+reported as a duplicate. A Bloom filter history adds its own error rate to
+the rows checked against the history.
+
+Usage:
+    deduplicator = Deduplicator('.cceda_cache/dedup')
+    unique, report = deduplicator.apply(batch)
+    for chunk in deduplicator.iter_csv('delta.csv', drop=False):
+        chunk['Duplicate'].value_counts()
+    deduplicator.save()
+"""
+
+import json
+import logging
+import os
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from cceda.loader import iter_transaction_chunks
+from cceda.schema import COLUMNS
+from cceda.sketches import BloomFilter, hash_values
+
+logger = logging.getLogger(__name__)
+
+STATE_VERSION = 1
+
+# the columns identifying a transaction
+DEDUP_COLUMNS = list(COLUMNS)
+
+# the flag of every row, and its label in the Duplicate column
+UNIQUE, IN_BATCH, IN_HISTORY = 0, 1, 2
+FLAG_LABELS = ['unique', 'duplicate in batch', 'duplicate of history']
+
+# an odd constant mixing the hash of the columns so far before the next column is added
+_MULTIPLIER = np.uint64(0x9E3779B97F4A7C15)
+
+# the hash of a missing value, the same in every column
+_MISSING_HASH = pd.util.hash_array(np.array([None], dtype=object))[0]
+
+
+def row_hashes(df, columns=DEDUP_COLUMNS):
+    """
+    Hashes every row of a frame over some of its columns into one 64 bit integer
+
+    The hashes depend only on the values, not on the categories of a categorical
+    column or the index, so the same row hashes the same in any batch and process.
+
+    Returns:
+    numpy.ndarray: one uint64 hash per row
+    """
+
+    hashes = np.zeros(len(df), dtype=np.uint64)
+    for column in columns:
+        values = df[column]
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            column_hashes = hash_values(values)
+            column_hashes[values.cat.codes.to_numpy() < 0] = _MISSING_HASH
+        elif values.dtype.kind == 'M':
+            # dates are hashed as their int64 nanoseconds
+            column_hashes = pd.util.hash_array(values.to_numpy().astype('datetime64[ns]').view('int64'))
+        elif values.dtype.kind in 'iufb':
+            column_hashes = pd.util.hash_array(values.to_numpy())
+        else:
+            column_hashes = hash_values(values)
+
+        hashes = hashes * _MULTIPLIER ^ column_hashes
+
+    return hashes
+
+
+class HashSet:
+    """
+    Exact set of 64 bit hashes, kept as a few sorted runs
+
+    A new batch of hashes becomes a run of its own and runs of similar length are
+    merged, so adding n hashes costs O(n log n) overall and a lookup searches a
+    logarithmic number of runs.
+    """
+
+    def __init__(self, runs=()):
+        self.runs = [run for run in runs if len(run)]
+
+    def __len__(self):
+        return sum(len(run) for run in self.runs)
+
+    @property
+    def nbytes(self):
+        """
+        Returns the memory held by the runs, in bytes
+        """
+
+        return sum(run.nbytes for run in self.runs)
+
+    def contains(self, hashes):
+        """
+        Tests a batch of hashes, fastest when they are sorted
+
+        Returns:
+        numpy.ndarray: True for every hash in the set
+        """
+
+        present = np.zeros(len(hashes), dtype=bool)
+        for run in self.runs:
+            positions = np.searchsorted(run, hashes)
+            positions[positions == len(run)] = 0
+            present |= run[positions] == hashes
+
+        return present
+
+    def add(self, hashes):
+        """
+        Adds distinct hashes that are not in the set yet, sorted
+        """
+
+        if not len(hashes):
+            return
+
+        self.runs.append(np.asarray(hashes, dtype=np.uint64))
+        # merging the last runs while the newest is at least half as long as the one before
+        while len(self.runs) > 1 and 2 * len(self.runs[-1]) >= len(self.runs[-2]):
+            newest = self.runs.pop()
+            self.runs[-1] = np.sort(np.concatenate([self.runs[-1], newest]))
+
+    def sorted(self):
+        """
+        Returns every hash of the set as one sorted array
+        """
+
+        if len(self.runs) > 1:
+            self.runs = [np.sort(np.concatenate(self.runs))]
+
+        return self.runs[0] if self.runs else np.zeros(0, dtype=np.uint64)
+
+
+class Deduplicator:
+    """
+    Finds the transactions seen before, earlier in the same batch or in an earlier batch
+
+    The first occurrence of a row within a batch is unique, like ``df.duplicated()``
+    with ``keep='first'``; every occurrence of a row already in the history is a
+    duplicate of the history.
+
+    Parameters:
+    path (str or Path): the directory the history is saved to and loaded from; None keeps it in memory only
+    bloom_capacity (int): keep the history as a Bloom filter sized for this many distinct rows,
+    instead of an exact set of hashes
+    error_rate (float): the false positive rate of the Bloom filter
+    columns (list): the columns identifying a transaction
+
+    Attributes:
+    history (HashSet or BloomFilter): the hashes of the rows of every finished batch
+    batch (HashSet): the hashes of the rows of the current batch
+    last_report (dict): the report of the last batch checked by ``iter_csv``
+    """
+
+    def __init__(self, path=None, bloom_capacity=None, error_rate=0.001, columns=DEDUP_COLUMNS):
+        self.path = Path(path) if path is not None else None
+        self.columns = list(columns)
+        self.history = BloomFilter(bloom_capacity, error_rate) if bloom_capacity else HashSet()
+        self.batch = HashSet()
+        self.batches = 0
+        self.last_report = None
+
+        if self.path is not None and (self.path / 'state.json').exists():
+            self._load()
+
+    def _load(self):
+        state = json.loads((self.path / 'state.json').read_text())
+        if state.get('version') != STATE_VERSION:
+            raise ValueError(f'{self.path} was written by an incompatible version of the dedup state')
+        if state['columns'] != self.columns:
+            raise ValueError(f"{self.path} identifies transactions by {state['columns']}, not {self.columns}")
+
+        self.batches = state['batches']
+        if state['kind'] == 'bloom':
+            self.history = BloomFilter(state['capacity'], state['error_rate'])
+            self.history.words = np.load(self.path / 'bloom.npy')
+            self.history.count = state['rows']
+        else:
+            # memory-mapped, so a lookup only reads the pages of the history it needs
+            self.history = HashSet([np.load(self.path / 'hashes.npy', mmap_mode='r')])
+
+    def save(self):
+        """
+        Writes the history of the finished batches, replacing the saved one atomically
+        """
+
+        self.path.mkdir(parents=True, exist_ok=True)
+        state = {'version': STATE_VERSION, 'columns': self.columns, 'batches': self.batches}
+        if isinstance(self.history, BloomFilter):
+            name, values = 'bloom.npy', self.history.words
+            state.update({'kind': 'bloom', 'capacity': self.history.capacity,
+                          'error_rate': self.history.error_rate, 'rows': self.history.count})
+        else:
+            name, values = 'hashes.npy', self.history.sorted()
+            state.update({'kind': 'exact', 'rows': len(self.history)})
+
+        # numpy adds .npy to names that lack it, so the temporary name keeps the suffix
+        temporary = self.path / f'.{name[:-4]}.tmp.npy'
+        np.save(temporary, values)
+        os.replace(temporary, self.path / name)
+        temporary = self.path / '.state.json.tmp'
+        temporary.write_text(json.dumps(state))
+        os.replace(temporary, self.path / 'state.json')
+
+    def flags(self, df):
+        """
+        Flags the rows of a part of the current batch, and remembers them in the batch
+
+        Returns:
+        numpy.ndarray: UNIQUE, IN_BATCH or IN_HISTORY (int8) for every row
+        """
+
+        hashes = row_hashes(df, self.columns)
+
+        # factorize numbers the distinct hashes in order of first appearance, so a row is the first
+        # of its hash exactly when its code is larger than every code before it
+        codes, distinct = pd.factorize(hashes)
+        latest = np.maximum.accumulate(codes)
+        flags = np.where(codes > np.r_[-1, latest[:-1]], UNIQUE, IN_BATCH).astype(np.int8)
+
+        # the distinct hashes are looked up sorted, which keeps the searches in the sorted runs cache friendly
+        ordered = np.sort(distinct)
+        in_batch = self.batch.contains(ordered)
+        in_history = self.history.contains(ordered) if isinstance(self.history, HashSet) else \
+            self.history.contains_hashes(ordered)
+
+        # the hashes found, usually few, are spread back to the rows through their codes
+        for found, flag in ((in_batch, IN_BATCH), (in_history, IN_HISTORY)):
+            if found.any():
+                flags[HashSet([ordered[found]]).contains(distinct)[codes]] = flag
+
+        self.batch.add(ordered[~in_batch & ~in_history])
+
+        return flags
+
+    def end_batch(self):
+        """
+        Moves the rows of the current batch into the history
+
+        Returns:
+        int: the number of distinct rows the batch added
+        """
+
+        hashes = self.batch.sorted()
+        if isinstance(self.history, BloomFilter):
+            self.history.add_hashes(hashes)
+            if self.history.count > self.history.capacity:
+                logger.warning('the Bloom filter holds %d rows, more than the %d it was sized for, so its '
+                               'error rate is above %g', self.history.count, self.history.capacity,
+                               self.history.error_rate)
+        else:
+            self.history.add(hashes)
+
+        self.batch = HashSet()
+        self.batches += 1
+
+        return len(hashes)
+
+    @staticmethod
+    def report(flags):
+        """
+        Counts the rows of each flag
+
+        Returns:
+        dict: the rows, and how many are unique, duplicates in the batch and duplicates of the history
+        """
+
+        return Deduplicator._summary(np.bincount(flags, minlength=3))
+
+    @staticmethod
+    def _summary(counts):
+        return {'rows': int(counts.sum()), 'unique': int(counts[UNIQUE]), 'duplicates_in_batch': int(counts[IN_BATCH]),
+                'duplicates_of_history': int(counts[IN_HISTORY])}
+
+    @staticmethod
+    def _finish(df, flags, drop):
+        # drops the duplicates, or labels every row in a Duplicate column
+        if drop:
+            return df[flags == UNIQUE]
+
+        return df.assign(Duplicate=pd.Categorical.from_codes(flags, FLAG_LABELS))
+
+    def apply(self, df, drop=True):
+        """
+        Checks a whole batch and adds it to the history
+
+        Parameters:
+        df (pandas.DataFrame): the batch of transactions
+        drop (bool): drop the duplicates; otherwise keep every row and add a Duplicate column
+
+        Returns:
+        tuple: the deduplicated (or labelled) frame and the report of the batch
+        """
+
+        flags = self.flags(df)
+        self.end_batch()
+
+        return self._finish(df, flags, drop), self.report(flags)
+
+    def iter_csv(self, path, chunksize=1_000_000, drop=True):
+        """
+        Checks a batch csv chunk by chunk, so memory holds one chunk plus the hashes
+
+        The batch is added to the history once every chunk has been read, and its
+        report is then available as ``last_report``.
+
+        Returns:
+        Iterator[pandas.DataFrame]: the deduplicated (or labelled) chunks
+        """
+
+        counts = np.zeros(3, dtype=np.int64)
+        for chunk in iter_transaction_chunks(path, chunksize):
+            flags = self.flags(chunk)
+            counts += np.bincount(flags, minlength=3)
+            yield self._finish(chunk, flags, drop)
+
+        self.end_batch()
+        self.last_report = self._summary(counts)
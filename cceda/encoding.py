@@ -0,0 +1,57 @@
+"""
+Integer coding of the dimension columns, and exact totals over the codes
+"""
+
+import numpy as np
+import pandas as pd
+
+
+def encode_column(series, dtype='int32'):
+    """
+    Encodes a column as integer codes into a sorted array of its distinct labels
+
+    Categorical columns reuse their codes; only the categories that actually occur
+    are kept, so the labels never contain unused values. Ordered categoricals keep
+    their category order instead of being sorted.
+
+    Returns:
+    tuple: the codes (numpy.ndarray) and the labels (pandas.Index) they point into
+    """
+
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        codes = series.cat.codes.to_numpy()
+        categories = series.cat.categories
+
+        # keeping the used categories only, in sorted label order
+        used = np.flatnonzero(np.bincount(codes[codes >= 0], minlength=len(categories)))
+        order = used if series.cat.ordered else used[categories[used].argsort()]
+        remap = np.full(len(categories), -1, dtype=dtype)
+        remap[order] = np.arange(len(order), dtype=dtype)
+
+        codes = np.where(codes >= 0, remap[codes], -1).astype(dtype)
+        return codes, categories[order]
+
+    codes, labels = pd.factorize(series, sort=True)
+
+    return codes.astype(dtype), pd.Index(labels)
+
+
+def group_totals(keys, values, size):
+    """
+    Totals integer values per key in int64, exactly like a pandas groupby sum
+
+    ``np.bincount`` with weights would add in float64 and round totals above 2**53.
+
+    Parameters:
+    keys (numpy.ndarray): the key of every value, in range(size)
+    values (numpy.ndarray): integer values
+    size (int): the number of keys
+
+    Returns:
+    numpy.ndarray: the int64 total of every key, 0 for keys without values
+    """
+
+    totals = np.zeros(size, dtype='int64')
+    np.add.at(totals, keys, np.asarray(values).astype('int64', copy=False))
+
+    return totals
@@ -0,0 +1,234 @@
+"""
+Monthly spend forecasts for thousands of transaction groups at once
+
+The monthly Amount of every group (by default every City x Card Type x Exp
+Type) is one column of a months x groups matrix, resampled with the
+TimeSeriesEngine. Each model fits all the columns together with array
+operations instead of one model object per series:
+
+- seasonal naive repeats the value of the same month one season earlier
+- exponential smoothing picks the smoothing factor of every series from a
+  grid, running all the series and all the factors in one pass over the months
+- ridge regression on lagged values solves one small regularized least
+  squares system per series, all of them in one batched ``np.linalg.solve``
+
+Backtests refit the models at successive forecast origins (rolling origin)
+and score the forecasts against what happened next.
+
+Usage:
+    forecaster = SpendForecaster(df)
+    forecaster.forecast('exponential_smoothing', horizon=3)
+    forecaster.backtest(horizon=1, initial=12)
+"""
+
+import numpy as np
+import pandas as pd
+
+from cceda.timeseries import FREQUENCIES, TimeSeriesEngine
+
+# the groups forecast by default
+FORECAST_GROUPS = ['City', 'Card Type', 'Exp Type']
+
+# the smoothing factors exponential smoothing chooses from
+SMOOTHING_GRID = np.linspace(0.05, 1.0, 20)
+
+
+def seasonal_naive(history, horizon, season=12):
+    """
+    Forecasts every series with its value one season earlier, or its last value while
+    the history is shorter than a season
+
+    Parameters:
+    history (numpy.ndarray): periods x series
+    horizon (int): the number of periods to forecast
+
+    Returns:
+    numpy.ndarray: horizon x series
+    """
+
+    periods = len(history)
+    if periods >= season:
+        return history[periods - season + np.arange(horizon) % season]
+
+    return np.repeat(history[-1:], horizon, axis=0)
+
+
+def exponential_smoothing(history, horizon, grid=SMOOTHING_GRID):
+    """
+    Simple exponential smoothing of every series, with the smoothing factor of each series
+    chosen from ``grid`` by its one-step-ahead squared error
+
+    Returns:
+    numpy.ndarray: horizon x series, the final level of every series repeated
+    """
+
+    alphas = np.asarray(grid, dtype=np.float64)[:, None]
+    # the level of every (factor, series) pair, started at the first value
+    level = np.repeat(history[:1], len(alphas), axis=0)
+    errors = np.zeros_like(level)
+
+    for values in history[1:]:
+        error = values - level
+        errors += error * error
+        level += alphas * error
+
+    best = np.argmin(errors, axis=0)
+
+    return np.repeat(level[best, np.arange(history.shape[1])][None, :], horizon, axis=0)
+
+
+def _lag_features(scaled, end, lags, season):
+    # the features predicting the periods ``end`` of every series: 1, the ``lags`` previous values
+    # and, when given, the value one season earlier; periods x series x features
+    features = [np.ones_like(scaled[end])]
+    features += [scaled[end - lag] for lag in range(1, lags + 1)]
+    if season:
+        features.append(scaled[end - season])
+
+    return np.stack(features, axis=-1)
+
+
+def ridge_lags(history, horizon, lags=3, season=12, penalty=10.0):
+    """
+    Ridge regression of every series on its own lagged values, forecast recursively
+
+    Every series is divided by its mean absolute value, so one ``penalty`` suits
+    series of any size; the intercept is not penalized. The seasonal lag is only
+    used when the history holds more than a season of targets.
+
+    Parameters:
+    lags (int): the number of previous periods used as features
+    season (int): also use the value one season earlier; None to leave it out
+    penalty (float): the ridge penalty of the lag coefficients
+
+    Returns:
+    numpy.ndarray: horizon x series, never negative
+    """
+
+    periods, n_series = history.shape
+    if season and periods <= season + lags:
+        season = None
+    first = max(lags, season or 0)
+    if periods <= first:
+        raise ValueError(f'ridge with {lags} lags needs more than {first} periods of history')
+
+    scale = np.abs(history).mean(axis=0)
+    scale[scale == 0] = 1
+    scaled = history / scale
+
+    # the design of every series: targets first..periods-1, their features stacked as series x targets x features
+    targets = np.arange(first, periods)
+    design = _lag_features(scaled, targets, lags, season).transpose(1, 0, 2)
+    observed = scaled[targets].T
+
+    n_features = design.shape[-1]
+    regularizer = penalty * np.eye(n_features)
+    regularizer[0, 0] = 0
+    gram = np.einsum('stp,stq->spq', design, design) + regularizer
+    moments = np.einsum('stp,st->sp', design, observed)
+    coefficients = np.linalg.solve(gram, moments[..., None])[..., 0]
+
+    # each forecast becomes a lag of the next one
+    extended = np.concatenate([scaled, np.zeros((horizon, n_series))])
+    for step in range(periods, periods + horizon):
+        features = _lag_features(extended, np.array([step]), lags, season)[0]
+        extended[step] = np.einsum('sp,sp->s', features, coefficients)
+
+    return np.maximum(extended[periods:] * scale, 0)
+
+
+# model name to the function forecasting a periods x series history
+MODELS = {'seasonal_naive': seasonal_naive, 'exponential_smoothing': exponential_smoothing, 'ridge': ridge_lags}
+
+
+def backtest(history, model, horizon=1, initial=12, step=1, **params):
+    """
+    Rolling-origin evaluation: the model is refit at every origin on the history before it
+    and scored on the ``horizon`` periods after it
+
+    Parameters:
+    history (numpy.ndarray): periods x series
+    model (str): a name of ``MODELS``
+    initial (int): the periods of history before the first origin
+    step (int): the periods between origins
+
+    Returns:
+    dict: the number of origins and forecasts, and the mean absolute error, root mean
+    squared error and weighted absolute percentage error (total absolute error over total
+    actual Amount) of every forecast
+    """
+
+    history = np.asarray(history, dtype=np.float64)
+    origins = range(initial, len(history) - horizon + 1, step)
+    if not len(origins):
+        raise ValueError(f'{len(history)} periods leave no origin after {initial} with a horizon of {horizon}')
+
+    absolute = squared = actual = 0.0
+    for origin in origins:
+        forecast = MODELS[model](history[:origin], horizon, **params)
+        error = forecast - history[origin:origin + horizon]
+        absolute += np.abs(error).sum()
+        squared += (error * error).sum()
+        actual += np.abs(history[origin:origin + horizon]).sum()
+
+    count = len(origins) * horizon * history.shape[1]
+
+    return {'origins': len(origins), 'forecasts': count, 'mae': absolute / count, 'rmse': np.sqrt(squared / count),
+            'wape': absolute / actual if actual else np.nan}
+
+
+class SpendForecaster:
+    """
+    Forecasts the monthly Amount of every group of transactions
+
+    Parameters:
+    df (pandas.DataFrame): the transactions, or any table already totalled per date and
+    group, e.g. ``cube.rollup(['Date', 'City', 'Card Type', 'Exp Type'])``
+    by (str or list): the columns whose groups are forecast
+    complete_months_only (bool): leaves out the first month when the data starts after its
+    first day and the last month when the data ends before its last day, since their partial
+    totals would bias the models low
+
+    Attributes:
+    series (pandas.DataFrame): the monthly Amount, one row per month and one column per group
+    """
+
+    def __init__(self, df, by=FORECAST_GROUPS, date_column='Date', amount_column='Amount', complete_months_only=True):
+        engine = TimeSeriesEngine(df, date_column, amount_column)
+        self.series = engine.resample(by, 'month')
+
+        if complete_months_only and len(self.series):
+            # the distinct dates are sorted, so the first and last ones bound the data
+            first, last = pd.Timestamp(engine._dates[0]), pd.Timestamp(engine._dates[-1])
+            self.series = self.series.iloc[int(first.day != 1):len(self.series) - int(not last.is_month_end)]
+
+    def forecast(self, model='exponential_smoothing', horizon=3, **params):
+        """
+        Forecasts the months after the last one of every series
+
+        Returns:
+        pandas.DataFrame: one row per forecast month and the columns of ``series``
+        """
+
+        forecast = MODELS[model](self.series.to_numpy(dtype=np.float64), horizon, **params)
+        months = pd.date_range(self.series.index[-1], periods=horizon + 1, freq=FREQUENCIES['month'])[1:]
+
+        return pd.DataFrame(forecast, index=pd.DatetimeIndex(months, name='Date'), columns=self.series.columns)
+
+    def backtest(self, models=None, horizon=1, initial=12, step=1, params=None):
+        """
+        Scores models by rolling-origin evaluation on every series, see ``backtest``
+
+        Parameters:
+        models (list): names of ``MODELS``, all of them by default
+        params (dict): model name to the keyword arguments it is fitted with
+
+        Returns:
+        pandas.DataFrame: one row per model with its origins, forecasts, mae, rmse and wape
+        """
+
+        history = self.series.to_numpy(dtype=np.float64)
+        scores = {model: backtest(history, model, horizon, initial, step, **(params or {}).get(model, {}))
+                  for model in models or MODELS}
+
+        return pd.DataFrame.from_dict(scores, orient='index').rename_axis('model')
@@ -0,0 +1,90 @@
+"""
+Male and female spending per city and the gap between them (Question 1)
+"""
+
+import numpy as np
+import pandas as pd
+
+# the columns of the table returned by gender_gap
+GAP_COLUMNS = ['City', 'Male_Amount', 'Female_Amount', 'Difference', 'Ratio']
+
+
+def gender_gap(df, city_column='City', gender_column='Gender', amount_column='Amount', fill_missing=False):
+    """
+    Computes the male total, female total, difference and ratio of every city in one pass
+
+    A single groupby is unstacked on the gender, so each city becomes one row with
+    a male and a female column. The difference is male minus female, so a positive
+    value means males spend more, and the ratio is male over female.
+
+    Parameters:
+    df (pandas.DataFrame): transactions with a cleaned City column
+    fill_missing (bool): keep cities where only one gender spends, with 0 for the other gender.
+        By default those cities are dropped, like the original merge of the two tables did
+
+    Returns:
+    pandas.DataFrame: one row per city with the columns City, Male_Amount, Female_Amount,
+    Difference and Ratio, sorted by City
+    """
+
+    # total amount per city and gender, turned into a male and a female column
+    totals = df.groupby([city_column, gender_column], observed=True)[amount_column].sum() \
+        .unstack(gender_column)
+
+    male = totals['M'] if 'M' in totals else pd.Series(np.nan, index=totals.index)
+    female = totals['F'] if 'F' in totals else pd.Series(np.nan, index=totals.index)
+
+    if fill_missing:
+        male, female = male.fillna(0), female.fillna(0)
+    else:
+        both = male.notna() & female.notna()
+        male, female = male[both], female[both]
+
+    # unstacking introduces NaN, which makes the totals float, so they are cast back
+    if pd.api.types.is_integer_dtype(df[amount_column]):
+        male, female = male.astype('int64'), female.astype('int64')
+
+    gap = pd.DataFrame({'City': male.index.astype(object),
+                        'Male_Amount': male.to_numpy(),
+                        'Female_Amount': female.to_numpy()})
+    gap['Difference'] = gap['Male_Amount'] - gap['Female_Amount']
+
+    # a city without female spending has no finite ratio
+    gap['Ratio'] = gap['Male_Amount'] / gap['Female_Amount'].replace(0, np.nan)
+
+    return gap
+
+
+def dominated_areas(gap):
+    """
+    Separates a gender gap table into female and male dominated cities
+
+    Returns:
+    tuple: the rows with a negative difference (females spend more) and the rows
+    with a positive difference (males spend more)
+    """
+
+    return gap[gap['Difference'] < 0], gap[gap['Difference'] > 0]
+
+
+def gender_gap_extremes(gap, top_k=10, bottom_k=5, columns=('City', 'Difference')):
+    """
+    Selects the cities with the largest and smallest gaps on each side
+
+    ``nlargest``/``nsmallest`` only keep the requested rows, so no full sort of the
+    table is needed.
+
+    Returns:
+    dict: the tables 'female_top', 'female_bottom', 'male_top' and 'male_bottom'
+    """
+
+    female, male = dominated_areas(gap)
+    columns = list(columns)
+
+    return {
+        # the most negative differences are where females outspend males the most
+        'female_top': female.nsmallest(top_k, 'Difference')[columns],
+        'female_bottom': female.nlargest(bottom_k, 'Difference')[columns],
+        'male_top': male.nlargest(top_k, 'Difference')[columns],
+        'male_bottom': male.nsmallest(bottom_k, 'Difference')[columns],
+    }
@@ -0,0 +1,218 @@
+"""
+Incremental aggregates updated batch by batch from daily transaction files
+
+The totals behind city_group, the City x Gender table, Expense and
+df_month_group are kept in a json state file. Applying a new batch only
+groups the rows of that batch and adds them to the stored totals, so the
+history is never read again. Every applied batch is remembered by the digest
+of its rows, so the same batch cannot be counted twice, whether it comes as a
+file or a frame, with another index or in another order.
+
+The monthly totals are kept per year, so the same month of two years is never
+merged. The city totals are kept per raw City, together with the rows of every
+raw spelling: the canonical spelling is voted by all the applied rows when a
+table is read, so it does not depend on how the rows were split into batches.
+"""
+
+import hashlib
+import json
+import os
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from cceda.cities import CityNormalizer
+from cceda.dates import MONTH_DTYPE, DateColumnsExtractor
+from cceda.loader import parse_date_column, read_transactions_csv
+from cceda.questions import QUESTION_GROUPS, assert_tables_equal
+from cceda.schema import CATEGORICAL_COLUMNS, COLUMNS
+
+# the question tables kept up to date incrementally
+INCREMENTAL_TABLES = ['city', 'city_gender', 'exp_card', 'month_card']
+
+# the columns every incremental table is totalled over; the months are kept apart per year
+INCREMENTAL_GROUPS = {**{name: QUESTION_GROUPS[name] for name in INCREMENTAL_TABLES},
+                      'month_card': ['Year', 'Month', 'Card Type']}
+
+STATE_VERSION = 3
+
+
+def batch_digest(df):
+    """
+    Hashes the transactions of a batch, independently of its row index and row order
+
+    The rows are brought to one form first (text categories, parsed dates, integer
+    amounts), so a batch read from its csv and the same batch given as a raw frame
+    have the same digest.
+
+    Returns:
+    str: the hexadecimal digest
+    """
+
+    dates = df['Date']
+    if not pd.api.types.is_datetime64_any_dtype(dates):
+        dates = parse_date_column(dates)
+
+    rows = pd.DataFrame({column: df[column].astype(str).to_numpy(dtype=object) for column in CATEGORICAL_COLUMNS})
+    rows['Date'] = dates.to_numpy(dtype='datetime64[ns]').view('int64')
+    rows['Amount'] = df['Amount'].to_numpy().astype('int64')
+    row_hashes = pd.util.hash_pandas_object(rows[COLUMNS], index=False).to_numpy()
+
+    # sorted, so the order of the rows does not matter
+    return hashlib.blake2b(np.sort(row_hashes).tobytes(), digest_size=16).hexdigest()
+
+
+class IncrementalAggregates:
+    """
+    Question totals kept in a state file and updated one batch at a time
+
+    Attributes:
+    path (Path): the json state file
+    totals (dict): table name to a dict of group key (tuple) to total Amount, keyed by the raw City
+    city_rows (dict): raw City to its number of rows, the votes for the canonical spellings
+    batches (dict): digest of every applied batch to its description
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.totals = {name: {} for name in INCREMENTAL_TABLES}
+        self.city_rows = {}
+        self.batches = {}
+
+        if self.path.exists():
+            self._load()
+
+    def _load(self):
+        state = json.loads(self.path.read_text())
+        if state.get('version') != STATE_VERSION:
+            raise ValueError(f'{self.path} was written by an incompatible version of the state format')
+
+        self.batches = state['batches']
+        self.city_rows = state['city_rows']
+        for name, rows in state['totals'].items():
+            self.totals[name] = {tuple(row[:-1]): row[-1] for row in rows}
+
+    def save(self):
+        """
+        Writes the state file, replacing it atomically
+        """
+
+        state = {'version': STATE_VERSION, 'batches': self.batches, 'city_rows': self.city_rows,
+                 'totals': {name: [[*key, amount] for key, amount in totals.items()]
+                            for name, totals in self.totals.items()}}
+
+        # written and flushed to disk under a temporary name first, so a crash leaves the old or the new state
+        temporary = self.path.with_name(self.path.name + '.tmp')
+        with open(temporary, 'w') as file:
+            json.dump(state, file)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temporary, self.path)
+
+    def apply(self, batch, name=None, save=True):
+        """
+        Adds a batch of transactions to the stored totals
+
+        Parameters:
+        batch (str, Path or pandas.DataFrame): a delta csv, or a raw transactions frame
+        name (str): a description of the batch stored with it, defaults to the file name
+        save (bool): write the state file after applying the batch
+
+        Returns:
+        bool: True if the batch was applied, False if it had already been applied before
+        """
+
+        if isinstance(batch, pd.DataFrame):
+            df = batch.copy()
+        else:
+            df = read_transactions_csv(batch)
+            name = name or Path(batch).name
+
+        # the same rows applied twice are detected by their digest
+        digest = batch_digest(df)
+        if digest in self.batches:
+            return False
+
+        # City stays raw, it is cleaned when a table is read
+        df = DateColumnsExtractor().extract_all(df, 'Date')
+        for city, rows in df['City'].astype(str).value_counts().items():
+            self.city_rows[city] = self.city_rows.get(city, 0) + int(rows)
+
+        for table in INCREMENTAL_TABLES:
+            totals = self.totals[table]
+            grouped = df.groupby(INCREMENTAL_GROUPS[table], observed=True)['Amount'].sum()
+
+            # only the groups present in the batch are touched
+            for key, amount in grouped.items():
+                key = tuple(str(part) for part in (key if isinstance(key, tuple) else (key,)))
+                totals[key] = totals.get(key, 0) + int(amount)
+
+        self.batches[digest] = {'name': name, 'rows': len(df)}
+        if save:
+            self.save()
+
+        return True
+
+    @property
+    def rows(self):
+        """
+        Returns the number of transactions in all the applied batches
+        """
+
+        return sum(batch['rows'] for batch in self.batches.values())
+
+    def table(self, name):
+        """
+        Returns one of the incrementally kept tables
+
+        Returns:
+        pandas.DataFrame: the ``INCREMENTAL_GROUPS`` columns and the total Amount, sorted by the group columns;
+        Year is an int64 and Month the ordered categorical of ``DateColumnsExtractor``, so the months are
+        sorted in calendar order
+        """
+
+        columns = INCREMENTAL_GROUPS[name]
+        rows = [[*key, amount] for key, amount in self.totals[name].items()]
+        table = pd.DataFrame(rows, columns=[*columns, 'Amount'])
+
+        # the keys are stored as text in the state file
+        if 'Year' in columns:
+            table['Year'] = table['Year'].astype('int64')
+        if 'Month' in columns:
+            table['Month'] = table['Month'].astype(MONTH_DTYPE)
+
+        if 'City' in columns:
+            # the raw spellings are cleaned with the votes of every applied row, like normalize_cities on
+            # all the batches at once, and the spellings of one city are totalled together
+            raw = list(self.city_rows)
+            cleaned = dict(zip(raw, CityNormalizer().clean_names(raw, list(self.city_rows.values()))))
+            table = table.assign(City=table['City'].map(cleaned)) \
+                .groupby(columns, as_index=False, sort=False)['Amount'].sum()
+
+        return table.sort_values(columns, ignore_index=True)
+
+    def tables(self):
+        """
+        Returns every incrementally kept table
+
+        Returns:
+        dict: table name to table
+        """
+
+        return {name: self.table(name) for name in INCREMENTAL_TABLES}
+
+    def verify(self, df):
+        """
+        Checks the incremental totals against a full recompute over all the batches
+
+        Parameters:
+        df (pandas.DataFrame): the concatenation of every applied batch, already prepared
+        """
+
+        if len(df) != self.rows:
+            raise AssertionError(f'the state holds {self.rows} rows but the frame has {len(df)}')
+
+        for name in INCREMENTAL_TABLES:
+            expected = df.groupby(INCREMENTAL_GROUPS[name], as_index=False, observed=True)['Amount'].sum()
+            assert_tables_equal(expected, self.table(name))
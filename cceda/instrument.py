@@ -0,0 +1,329 @@
+"""
+Instrumentation of the pipeline stages: wall time, CPU time, memory and row counts
+
+The pipeline marks its stages (loading, preprocessing, each question, each
+chart) with ``stage``. Nothing is measured unless an ``Instrumentation`` is
+active; otherwise ``stage`` returns one shared no-op object, so the marks cost
+a function call each. An active instrumentation records every stage and can
+write the records as structured log lines or as a Chrome trace (open it in
+chrome://tracing or https://ui.perfetto.dev). One chosen stage can also be
+profiled with cProfile and a tracemalloc snapshot.
+
+Usage:
+    with Instrumentation(trace_memory=True, profile_stage='q1', profile_dir='profiles') as instrumentation:
+        run(['q1', 'q3'])
+    instrumentation.write_chrome_trace('trace.json')
+"""
+
+import cProfile
+import json
+import logging
+import os
+import threading
+import time
+import tracemalloc
+from pathlib import Path
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+logger = logging.getLogger(__name__)
+
+# the instrumentation stages report to, None while instrumentation is off
+_active = None
+
+
+class _NullStage:
+    # what ``stage`` returns while instrumentation is off: does nothing, as cheaply as possible
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def set(self, **fields):
+        pass
+
+
+_NULL_STAGE = _NullStage()
+
+
+# the process status on Linux, with the current (VmRSS) and peak (VmHWM) resident set sizes
+_PROC_STATUS = Path('/proc/self/status')
+
+
+def _proc_status_mb(field):
+    # a memory line of the process status in megabytes, None where there is no such file
+    try:
+        status = _PROC_STATUS.read_text()
+    except OSError:
+        return None
+    for line in status.splitlines():
+        if line.startswith(field + ':'):
+            return int(line.split()[1]) / 1024
+
+    return None
+
+
+def peak_rss_mb():
+    """
+    Returns the peak resident set size of the process in megabytes, 0 where it is not available
+    """
+
+    # ru_maxrss starts from the peak of the parent after a fork, VmHWM from this program
+    peak = _proc_status_mb('VmHWM')
+    if peak is not None:
+        return peak
+    if resource is None:
+        return 0.0
+
+    # ru_maxrss is reported in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def rss_mb():
+    """
+    Returns the current resident set size of the process in megabytes, its peak where it is not available
+    """
+
+    current = _proc_status_mb('VmRSS')
+
+    return current if current is not None else peak_rss_mb()
+
+
+def stage(name, **fields):
+    """
+    Marks a stage of the pipeline, to be used as ``with stage('load') as span:``
+
+    Parameters:
+    name (str): the stage name, e.g. 'load' or 'q1'
+    fields: extra values recorded with the stage, e.g. rows=len(df); more can be added
+    inside the block with ``span.set(rows=...)``
+
+    Returns:
+    a context manager measuring the stage when instrumentation is active
+    """
+
+    if _active is None:
+        return _NULL_STAGE
+
+    return _Stage(_active, name, fields)
+
+
+class _Stage:
+    # one measured stage; nested stages are measured inside their parent
+
+    def __init__(self, instrumentation, name, fields):
+        self.instrumentation = instrumentation
+        self.name = name
+        self.fields = fields
+        self.peak = 0
+
+    def set(self, **fields):
+        self.fields.update(fields)
+
+    def __enter__(self):
+        instrumentation = self.instrumentation
+        # the stack of this thread, so stages run by other threads are never taken as the parent
+        self.stack = instrumentation.stack
+        self.parent = self.stack[-1] if self.stack else None
+        self.stack.append(self)
+
+        if instrumentation.trace_memory:
+            current, peak = tracemalloc.get_traced_memory()
+            # the parent's peak so far is kept before the peak is reset for this stage
+            if self.parent is not None:
+                self.parent.peak = max(self.parent.peak, peak)
+            tracemalloc.reset_peak()
+            self.memory_start = current
+        self.rss_start = peak_rss_mb()
+
+        self.profiler = None
+        if self.name == instrumentation.profile_stage:
+            # the snapshot at the end of the stage needs allocations traced from its start
+            self.started_tracing = not tracemalloc.is_tracing()
+            if self.started_tracing:
+                tracemalloc.start()
+            self.profiler = cProfile.Profile()
+            self.profiler.enable()
+
+        self.cpu_start = time.process_time()
+        self.start = time.perf_counter()
+
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        wall = time.perf_counter() - self.start
+        cpu = time.process_time() - self.cpu_start
+        instrumentation = self.instrumentation
+
+        if self.profiler is not None:
+            self.profiler.disable()
+            instrumentation.save_profile(self.name, self.profiler)
+            if self.started_tracing:
+                tracemalloc.stop()
+
+        record = {'stage': self.name, 'start': self.start - instrumentation.origin, 'wall_s': wall, 'cpu_s': cpu,
+                  'depth': len(self.stack) - 1, 'thread': threading.get_ident(),
+                  'peak_rss_delta_mb': peak_rss_mb() - self.rss_start}
+        if instrumentation.trace_memory:
+            self.peak = max(self.peak, tracemalloc.get_traced_memory()[1])
+            record['peak_memory_delta_mb'] = (self.peak - self.memory_start) / 2**20
+            if self.parent is not None:
+                self.parent.peak = max(self.parent.peak, self.peak)
+        if exc_type is not None:
+            record['error'] = exc_type.__name__
+        record.update(self.fields)
+
+        self.stack.pop()
+        instrumentation.add(record)
+
+        return False
+
+
+class Instrumentation:
+    """
+    Records the stages run while it is active
+
+    Parameters:
+    trace_memory (bool): measure the peak memory allocated by each stage with tracemalloc,
+    which slows down python-heavy stages; otherwise only the growth of the peak RSS is recorded
+    profile_stage (str): the stage to run under cProfile, whose statistics and a tracemalloc
+    snapshot of its end are written to ``profile_dir``; the profiler slows that stage down
+    log (bool): also emit every finished stage as a json log line on the ``cceda.instrument`` logger
+
+    Stages may run on several threads at once, e.g. the requests of the service: each
+    thread nests its stages in its own stack, while the records of all of them are
+    collected together. The tracemalloc peak is that of the whole process, so it is
+    only meaningful for stages that do not overlap with another thread's.
+
+    Attributes:
+    records (list): one dict per finished stage, in the order they finished
+    """
+
+    def __init__(self, trace_memory=False, profile_stage=None, profile_dir='.', log=False):
+        self.trace_memory = trace_memory
+        self.profile_stage = profile_stage
+        self.profile_dir = Path(profile_dir)
+        self.log = log
+        self.records = []
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.origin = time.perf_counter()
+        self._started_tracemalloc = False
+        self._previous = None
+
+    def __enter__(self):
+        global _active
+
+        if self.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracemalloc = True
+
+        self._previous, _active = _active, self
+        self.origin = time.perf_counter()
+
+        return self
+
+    def __exit__(self, *exc_info):
+        global _active
+
+        _active = self._previous
+        if self._started_tracemalloc:
+            tracemalloc.stop()
+            self._started_tracemalloc = False
+
+        return False
+
+    @property
+    def stack(self):
+        """
+        Returns the stages of the calling thread that have started and not finished yet, innermost last
+        """
+
+        if not hasattr(self._local, 'stack'):
+            self._local.stack = []
+
+        return self._local.stack
+
+    def add(self, record):
+        """
+        Adds a finished stage, also for work measured elsewhere (e.g. in a worker process)
+        """
+
+        with self._lock:
+            self.records.append(record)
+        if self.log:
+            logger.info(json.dumps(record))
+
+    def save_profile(self, name, profiler):
+        """
+        Writes the cProfile statistics and the tracemalloc snapshot of a profiled stage
+
+        Returns:
+        tuple: the paths of the ``.prof`` file (for pstats or snakeviz) and of the snapshot
+        """
+
+        self.profile_dir.mkdir(parents=True, exist_ok=True)
+        stats_path = self.profile_dir / f'{name}.prof'
+        profiler.dump_stats(stats_path)
+
+        snapshot_path = self.profile_dir / f'{name}.tracemalloc'
+        tracemalloc.take_snapshot().dump(str(snapshot_path))
+
+        return stats_path, snapshot_path
+
+    def chrome_trace(self):
+        """
+        Converts the records into the Chrome trace event format
+
+        Returns:
+        dict: the trace, with one complete ('X') event per stage; work done in worker
+        processes is shown on thread 0
+        """
+
+        pid = os.getpid()
+        events = []
+        for record in self.records:
+            args = {key: value for key, value in record.items() if key not in ('stage', 'start', 'wall_s', 'thread')}
+            events.append({'name': record['stage'], 'ph': 'X', 'pid': pid,
+                           'tid': record.get('thread', 0),
+                           'ts': record['start'] * 1e6, 'dur': record['wall_s'] * 1e6, 'args': args})
+
+        return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+    def write_chrome_trace(self, path):
+        """
+        Writes the Chrome trace of the records to a json file
+
+        Returns:
+        str: the path that was written
+        """
+
+        Path(path).write_text(json.dumps(self.chrome_trace()))
+
+        return path
+
+    def write_log(self, path):
+        """
+        Writes the records as json lines, one stage per line
+
+        Returns:
+        str: the path that was written
+        """
+
+        Path(path).write_text(''.join(json.dumps(record) + '\n' for record in self.records))
+
+        return path
+
+
+def active():
+    """
+    Returns the active Instrumentation, or None while instrumentation is off
+    """
+
+    return _active
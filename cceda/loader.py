@@ -0,0 +1,302 @@
+"""
+Typed, chunked loading of the transactions csv with a cached columnar snapshot
+
+The first load of a file parses the csv with an explicit schema and writes every
+column as a ``.npy`` file into a snapshot directory keyed on the file's content
+hash. Later loads of the same, unchanged file memory-map those arrays instead of
+parsing the text again.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+from cceda.schema import COLUMNS, DATE_FORMAT, INDEX_COLUMN, SAMPLE_CSV, csv_dtypes
+
+# bumped whenever the layout of a snapshot changes, so old snapshots are ignored
+SNAPSHOT_VERSION = 1
+
+# name of the file (inside the cache directory) remembering the digest of each source
+_SOURCES_FILE = 'sources.json'
+
+
+def default_cache_dir(path):
+    """
+    Returns the directory the snapshots of a csv file are written to by default
+
+    Returns:
+    pathlib.Path: a hidden ``.cceda_cache`` directory next to the csv file
+    """
+
+    return Path(path).resolve().parent / '.cceda_cache'
+
+
+def file_digest(path, block_size=1 << 20):
+    """
+    Hashes the content of a file in fixed-size blocks
+
+    Returns:
+    str: the hexadecimal blake2b digest of the file
+    """
+
+    digest = hashlib.blake2b(digest_size=16)
+
+    with open(path, 'rb') as handle:
+        # reading the file block by block so memory stays flat for any file size
+        for block in iter(lambda: handle.read(block_size), b''):
+            digest.update(block)
+
+    return digest.hexdigest()
+
+
+def source_key(path, cache_dir):
+    """
+    Builds the key that identifies a snapshot of a csv file
+
+    The content digest is remembered together with the file's size and mtime, so
+    an unchanged file is not hashed again on every load.
+
+    Returns:
+    str: a key made of the file name and its content digest
+    """
+
+    path = Path(path).resolve()
+    stat = path.stat()
+    sources_file = Path(cache_dir) / _SOURCES_FILE
+
+    # loading the digests computed by earlier runs
+    sources = {}
+    if sources_file.exists():
+        sources = json.loads(sources_file.read_text())
+
+    known = sources.get(str(path))
+    if known and known['size'] == stat.st_size and known['mtime_ns'] == stat.st_mtime_ns:
+        digest = known['digest']
+    else:
+        # the file is new or has been modified, so its content is hashed again
+        digest = file_digest(path)
+        sources[str(path)] = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'digest': digest}
+        Path(cache_dir).mkdir(parents=True, exist_ok=True)
+        sources_file.write_text(json.dumps(sources, indent=1))
+
+    return f'{path.stem}-{digest}'.replace(' ', '_')
+
+
+def parse_date_column(dates, date_format=DATE_FORMAT):
+    """
+    Converts a column of date strings into datetime64 values
+
+    Only the distinct date strings are parsed; the parsed values are then spread
+    back to every row through the categorical codes.
+
+    Returns:
+    pandas.Series: the parsed dates with the index of the input
+    """
+
+    # factorizing gives the distinct strings and the position of every row in them
+    if isinstance(dates.dtype, pd.CategoricalDtype):
+        codes, uniques = dates.cat.codes.to_numpy(), dates.cat.categories
+    else:
+        codes, uniques = pd.factorize(dates)
+
+    parsed = pd.to_datetime(pd.Index(uniques), format=date_format).to_numpy()
+
+    # rows with a missing date have the code -1 and become NaT
+    values = np.where(codes >= 0, parsed[codes], np.datetime64('NaT'))
+
+    return pd.Series(values.astype('datetime64[ns]'), index=dates.index, name=dates.name)
+
+
+def _finish_frame(df, date_format):
+    # parsing the date strings of a freshly read frame into datetime64
+    df['Date'] = parse_date_column(df['Date'], date_format)
+
+    return df
+
+
+def iter_transaction_chunks(path=SAMPLE_CSV, chunksize=1_000_000, date_format=DATE_FORMAT):
+    """
+    Reads the transactions csv in chunks with the explicit schema
+
+    Returns:
+    Iterator[pandas.DataFrame]: typed frames of at most ``chunksize`` rows
+    """
+
+    reader = pd.read_csv(path, index_col=INDEX_COLUMN, dtype=csv_dtypes(), chunksize=chunksize)
+
+    with reader:
+        for chunk in reader:
+            yield _finish_frame(chunk, date_format)
+
+
+def _concat_chunks(chunks):
+    # the categories of every chunk differ, so they are unioned column by column
+    frame = {}
+    for column in COLUMNS:
+        parts = [chunk[column] for chunk in chunks]
+        if isinstance(parts[0].dtype, pd.CategoricalDtype):
+            frame[column] = union_categoricals(parts)
+        else:
+            frame[column] = np.concatenate([part.to_numpy() for part in parts])
+
+    index = pd.Index(np.concatenate([chunk.index.to_numpy() for chunk in chunks]), name=INDEX_COLUMN)
+
+    return pd.DataFrame(frame, index=index)
+
+
+def read_transactions_csv(path=SAMPLE_CSV, chunksize=None, date_format=DATE_FORMAT, validator=None):
+    """
+    Reads the transactions csv with the explicit schema, without any caching
+
+    Parameters:
+    validator (cceda.validation.Validator): check every chunk and keep only the valid rows,
+        quarantining the others; its date format replaces ``date_format``
+
+    Returns:
+    pandas.DataFrame: categorical City, Card Type, Exp Type and Gender columns,
+    a datetime64 Date column and an int64 Amount column
+    """
+
+    if validator is not None:
+        chunks = list(validator.iter_csv(path, chunksize or 1_000_000))
+        return chunks[0] if len(chunks) == 1 else _concat_chunks(chunks)
+
+    if chunksize is None:
+        df = pd.read_csv(path, index_col=INDEX_COLUMN, dtype=csv_dtypes())
+        return _finish_frame(df, date_format)
+
+    chunks = list(iter_transaction_chunks(path, chunksize, date_format))
+
+    return _concat_chunks(chunks)
+
+
+def write_snapshot(df, directory, extra=None):
+    """
+    Writes a typed transactions frame as one ``.npy`` file per column
+
+    The snapshot is written to a temporary directory first and moved into place,
+    so a crashed run never leaves a half-written snapshot behind.
+
+    Parameters:
+    extra (dict): json values stored with the snapshot metadata, e.g. the validation report
+
+    Returns:
+    pathlib.Path: the snapshot directory
+    """
+
+    directory = Path(directory)
+    directory.parent.mkdir(parents=True, exist_ok=True)
+    staging = Path(tempfile.mkdtemp(prefix='.staging-', dir=directory.parent))
+
+    meta = {'version': SNAPSHOT_VERSION, 'rows': len(df), 'columns': {}, **(extra or {})}
+
+    np.save(staging / 'index.npy', df.index.to_numpy())
+
+    for position, column in enumerate(COLUMNS):
+        series = df[column]
+        file_name = f'col{position}.npy'
+
+        if isinstance(series.dtype, pd.CategoricalDtype):
+            # categoricals are stored as their integer codes plus the category labels
+            np.save(staging / file_name, series.cat.codes.to_numpy())
+            meta['columns'][column] = {'kind': 'categorical', 'file': file_name,
+                                       'categories': series.cat.categories.tolist()}
+        elif column == 'Date':
+            # dates are stored as int64 nanoseconds since the epoch
+            np.save(staging / file_name, series.to_numpy().astype('datetime64[ns]').view('int64'))
+            meta['columns'][column] = {'kind': 'datetime', 'file': file_name}
+        else:
+            np.save(staging / file_name, series.to_numpy())
+            meta['columns'][column] = {'kind': 'numeric', 'file': file_name}
+
+    (staging / 'meta.json').write_text(json.dumps(meta))
+
+    # replacing any older snapshot with the same key
+    if directory.exists():
+        shutil.rmtree(directory)
+    os.replace(staging, directory)
+
+    return directory
+
+
+def read_snapshot(directory, mmap=True):
+    """
+    Reads a snapshot written by ``write_snapshot``
+
+    With ``mmap`` the numeric and date columns are memory-mapped, so only the
+    pages that are actually used are read from disk.
+
+    Returns:
+    pandas.DataFrame: the same typed frame that was written
+    """
+
+    directory = Path(directory)
+    meta = json.loads((directory / 'meta.json').read_text())
+    mmap_mode = 'r' if mmap else None
+
+    columns = {}
+    for column, info in meta['columns'].items():
+        values = np.load(directory / info['file'], mmap_mode=mmap_mode)
+
+        if info['kind'] == 'categorical':
+            columns[column] = pd.Categorical.from_codes(values, info['categories'], validate=False)
+        elif info['kind'] == 'datetime':
+            columns[column] = values.view('datetime64[ns]')
+        else:
+            columns[column] = values
+
+    index = pd.Index(np.load(directory / 'index.npy', mmap_mode=mmap_mode), name=INDEX_COLUMN)
+
+    # copy=False keeps the memory-mapped arrays as the backing store of the columns
+    return pd.DataFrame(columns, index=index, copy=False)
+
+
+def load_transactions(path=SAMPLE_CSV, cache_dir=None, chunksize=None, use_cache=True, mmap=True,
+                      date_format=DATE_FORMAT, validator=None):
+    """
+    Loads the transactions file, reusing a columnar snapshot when one exists
+
+    Parameters:
+    path (str or Path): the transactions csv
+    cache_dir (str or Path): where snapshots are kept, defaults to ``.cceda_cache`` next to the csv
+    chunksize (int): read the csv in chunks of this many rows on a cold load
+    use_cache (bool): set to False to always parse the csv and never write a snapshot
+    mmap (bool): memory-map the snapshot columns instead of reading them into memory
+    date_format (str): the format of the Date column; any other than ``DATE_FORMAT`` gets its own snapshot
+    validator (cceda.validation.Validator): keep only the rows passing its rules, see ``read_transactions_csv``.
+        The valid rows get their own snapshot, and a warm load restores the report of the cold one
+
+    Returns:
+    pandas.DataFrame: the typed transactions frame
+    """
+
+    if not use_cache:
+        return read_transactions_csv(path, chunksize, date_format, validator)
+
+    cache_dir = Path(cache_dir) if cache_dir is not None else default_cache_dir(path)
+    snapshot = cache_dir / source_key(path, cache_dir)
+    if date_format != DATE_FORMAT:
+        # the dates parsed with another format are another frame, so they get their own snapshot
+        digest = hashlib.blake2b(str(date_format).encode(), digest_size=6).hexdigest()
+        snapshot = snapshot.with_name(f'{snapshot.name}-dates-{digest}')
+    if validator is not None:
+        snapshot = snapshot.with_name(f'{snapshot.name}-valid-{validator.fingerprint}')
+
+    # a warm load only needs the snapshot written by an earlier run
+    meta_file = snapshot / 'meta.json'
+    if meta_file.exists() and json.loads(meta_file.read_text()).get('version') == SNAPSHOT_VERSION:
+        if validator is not None:
+            validator.report = json.loads(meta_file.read_text())['validation']
+        return read_snapshot(snapshot, mmap)
+
+    df = read_transactions_csv(path, chunksize, date_format, validator)
+    write_snapshot(df, snapshot, extra={'validation': validator.report} if validator is not None else None)
+
+    return read_snapshot(snapshot, mmap) if mmap else df
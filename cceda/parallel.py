@@ -0,0 +1,194 @@
+"""
+Parallel Q1-Q5 aggregation across CPU cores with a process pool
+
+The dimension columns are encoded as small integer codes and copied once into
+shared memory. Each worker attaches to the shared buffers, totals its own range
+of rows for every question table with ``group_totals`` and returns the dense
+partial totals, which the parent adds up. No DataFrame is ever pickled.
+"""
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+
+from cceda.dates import DAY_NAME_DTYPE, MONTH_DTYPE
+from cceda.encoding import encode_column, group_totals
+from cceda.questions import QUESTION_FILTERS, QUESTION_GROUPS
+
+# the stored columns; the date parts are looked up from the date code
+ENCODED_COLUMNS = ['City', 'Date', 'Card Type', 'Exp Type', 'Gender']
+
+
+def encode_frame(df):
+    """
+    Encodes the dimension columns of a frame as integer codes
+
+    Returns:
+    tuple: a dict of numpy arrays (the codes and Amount) and a dict of labels per dimension,
+    including the Month, Day Name and Day Number date parts
+    """
+
+    arrays, labels = {}, {}
+    for column in ENCODED_COLUMNS:
+        arrays[column], labels[column] = encode_column(df[column])
+    arrays['Amount'] = df['Amount'].to_numpy().astype('int64', copy=False)
+
+    # lookup tables from the date code to the code of each date part
+    dates = pd.DatetimeIndex(labels['Date'])
+    labels['lookups'] = {
+        'Month': (dates.month.to_numpy() - 1).astype('int32'),
+        'Day Name': dates.dayofweek.to_numpy().astype('int32'),
+        'Day Number': (dates.day.to_numpy() - 1).astype('int32'),
+    }
+    labels['Month'] = pd.CategoricalIndex(MONTH_DTYPE.categories, dtype=MONTH_DTYPE)
+    labels['Day Name'] = pd.CategoricalIndex(DAY_NAME_DTYPE.categories, dtype=DAY_NAME_DTYPE)
+    labels['Day Number'] = pd.Index(np.arange(1, 32))
+
+    return arrays, labels
+
+
+class SharedColumns:
+    """
+    NumPy arrays copied into named shared memory blocks
+
+    ``descriptors`` is a small picklable description that worker processes use to
+    attach to the same buffers without copying them.
+    """
+
+    def __init__(self, arrays):
+        self.blocks = []
+        self.descriptors = {}
+
+        for name, array in arrays.items():
+            block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+            np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)[:] = array
+            self.blocks.append(block)
+            self.descriptors[name] = (block.name, array.dtype.str, array.shape)
+
+    def close(self):
+        """
+        Releases and removes every shared memory block
+        """
+
+        for block in self.blocks:
+            block.close()
+            block.unlink()
+        self.blocks = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def _attach(descriptors):
+    # attaching to the shared blocks of the parent process
+    blocks, arrays = [], {}
+    for name, (block_name, dtype, shape) in descriptors.items():
+        block = shared_memory.SharedMemory(name=block_name)
+        blocks.append(block)
+        arrays[name] = np.ndarray(shape, dtype=np.dtype(dtype), buffer=block.buf)
+
+    return blocks, arrays
+
+
+def _table_codes(arrays, lookups, columns, rows):
+    # the codes of the table's columns for a range of rows
+    codes = []
+    for column in columns:
+        if column in lookups:
+            codes.append(lookups[column][arrays['Date'][rows]])
+        else:
+            codes.append(arrays[column][rows])
+
+    return codes
+
+
+def _aggregate_range(descriptors, lookups, shapes, filters, start, stop):
+    # worker: dense totals and counts of every question table for rows start:stop
+    blocks, arrays = _attach(descriptors)
+
+    try:
+        rows = slice(start, stop)
+        amounts = arrays['Amount'][rows]
+        partials = {}
+
+        for name, columns in QUESTION_GROUPS.items():
+            shape = shapes[name]
+            keys = np.ravel_multi_index(_table_codes(arrays, lookups, columns, rows), shape)
+            weights = amounts
+
+            for column, kept_codes in filters.get(name, {}).items():
+                (column_codes,) = _table_codes(arrays, lookups, [column], rows)
+                keep = np.isin(column_codes, kept_codes)
+                keys, weights = keys[keep], weights[keep]
+
+            size = int(np.prod(shape))
+            totals = group_totals(keys, weights, size)
+            counts = np.bincount(keys, minlength=size)
+            partials[name] = (totals, counts)
+
+        return partials
+    finally:
+        del arrays
+        for block in blocks:
+            block.close()
+
+
+def parallel_question_tables(df, workers=None, partitions=None):
+    """
+    Computes the Q1-Q5 tables with a pool of worker processes
+
+    Parameters:
+    df (pandas.DataFrame): a prepared transactions frame (cleaned City, parsed Date)
+    workers (int): number of worker processes, defaults to the number of CPUs
+    partitions (int): number of row ranges, defaults to four per worker
+
+    Returns:
+    dict: table name to table, like ``cceda.questions.question_tables``
+    """
+
+    workers = workers or os.cpu_count()
+    partitions = partitions or workers * 4
+
+    arrays, labels = encode_frame(df)
+    lookups = labels['lookups']
+    shapes = {name: tuple(len(labels[column]) for column in columns) for name, columns in QUESTION_GROUPS.items()}
+
+    # the row filters are translated from labels to codes once, in the parent
+    filters = {name: {column: np.flatnonzero(labels[column].isin(list(values)))
+                      for column, values in conditions.items()}
+               for name, conditions in QUESTION_FILTERS.items()}
+
+    bounds = np.linspace(0, len(df), partitions + 1).astype(int)
+    totals = {name: np.zeros(int(np.prod(shape)), dtype='int64') for name, shape in shapes.items()}
+    counts = {name: np.zeros(int(np.prod(shape)), dtype='int64') for name, shape in shapes.items()}
+
+    with SharedColumns(arrays) as shared, ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(_aggregate_range, shared.descriptors, lookups, shapes, filters, start, stop)
+                   for start, stop in zip(bounds[:-1], bounds[1:]) if stop > start]
+
+        # the partial totals of the row ranges simply add up
+        for future in futures:
+            for name, (partial_totals, partial_counts) in future.result().items():
+                totals[name] += partial_totals
+                counts[name] += partial_counts
+
+    tables = {}
+    for name, columns in QUESTION_GROUPS.items():
+        observed = np.flatnonzero(counts[name])
+        table = {}
+        for column, codes in zip(columns, np.unravel_index(observed, shapes[name])):
+            column_labels = labels[column]
+            if isinstance(column_labels, pd.CategoricalIndex):
+                table[column] = pd.Categorical.from_codes(codes, dtype=column_labels.dtype)
+            else:
+                table[column] = column_labels[codes].to_numpy()
+        table['Amount'] = totals[name][observed]
+        tables[name] = pd.DataFrame(table)
+
+    return tables
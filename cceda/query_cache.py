@@ -0,0 +1,315 @@
+"""
+A memoized query layer over the business questions
+
+Question variants (Q1 for another top-k, Q5 for other days, Q2 for one card
+type) are answered once and then served from a cache. An answer is keyed on
+the question, its parameters and the fingerprint of the data it was computed
+from, which is the content digest of the csv. The in-memory tier evicts the
+least recently used answers once its size bound is reached; an optional disk
+tier keeps answers across processes. When the csv changes its fingerprint
+changes too, so stale answers are never served.
+
+Usage:
+    layer = QueryLayer('Credit card transactions India.csv', disk_dir='.cceda_cache/answers')
+    layer.ask('q1', top_k=20)
+    layer.ask('q5', days=[28, 29, 30, 31])
+    layer.cache.stats()
+"""
+
+import hashlib
+import json
+import os
+import pickle
+import threading
+import time
+from collections import OrderedDict, deque
+from pathlib import Path
+
+import numpy as np
+
+from cceda.analysis import QUESTIONS, load
+from cceda.loader import default_cache_dir, source_key
+from cceda.schema import SAMPLE_CSV
+
+# bumped whenever the answers change shape, so older disk entries are ignored
+CACHE_VERSION = 1
+
+
+def answer_nbytes(answer):
+    """
+    Returns the memory held by an answer (a dict of tables), in bytes
+    """
+
+    return int(sum(table.memory_usage(deep=True).sum() for table in answer.values()))
+
+
+def query_key(fingerprint, question, params):
+    """
+    Builds the cache key of a question asked with some parameters on some data
+
+    Returns:
+    tuple: the fingerprint, the question and its parameters as canonical json
+    """
+
+    # tuples and lists of the same values give the same key
+    return fingerprint, question, json.dumps(params, sort_keys=True, default=list)
+
+
+class QueryCache:
+    """
+    LRU cache of answers bounded by their size in memory, with an optional disk tier
+
+    Parameters:
+    max_bytes (int): the memory the in-memory answers may take together
+    disk_dir (str or Path): where answers are also written, kept across processes
+    latency_window (int): how many recent lookups the latency statistics cover
+
+    Attributes:
+    hits, disk_hits, misses, evictions (int): lookup and eviction counters
+    """
+
+    def __init__(self, max_bytes=64 * 2**20, disk_dir=None, latency_window=10_000):
+        self.max_bytes = max_bytes
+        self.disk_dir = Path(disk_dir) if disk_dir is not None else None
+        self.entries = OrderedDict()
+        self.nbytes = 0
+        self.hits = self.disk_hits = self.misses = self.evictions = 0
+        self.latencies = {tier: deque(maxlen=latency_window) for tier in ('memory', 'disk', 'miss')}
+
+    def _disk_path(self, key):
+        digest = hashlib.blake2b(repr((CACHE_VERSION, key)).encode(), digest_size=16).hexdigest()
+        return self.disk_dir / f'{digest}.pkl'
+
+    def get(self, key):
+        """
+        Looks an answer up in memory, then on disk
+
+        Returns:
+        tuple: the answer (None when missing) and the tier it came from ('memory', 'disk' or None)
+        """
+
+        if key in self.entries:
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return self.entries[key][0], 'memory'
+
+        if self.disk_dir is not None:
+            path = self._disk_path(key)
+            if path.exists():
+                answer = pickle.loads(path.read_bytes())
+                self.disk_hits += 1
+                self._remember(key, answer)
+                return answer, 'disk'
+
+        self.misses += 1
+        return None, None
+
+    def put(self, key, answer):
+        """
+        Stores a freshly computed answer in memory and, when enabled, on disk
+        """
+
+        if self.disk_dir is not None:
+            self.disk_dir.mkdir(parents=True, exist_ok=True)
+            path = self._disk_path(key)
+            # written under a temporary name first, so a reader never sees half a file
+            temporary = path.with_name(f'.{path.name}.{os.getpid()}')
+            temporary.write_bytes(pickle.dumps(answer, protocol=pickle.HIGHEST_PROTOCOL))
+            os.replace(temporary, path)
+
+        self._remember(key, answer)
+
+    def _remember(self, key, answer):
+        # an answer larger than the whole bound is only kept on disk
+        size = answer_nbytes(answer)
+        if size > self.max_bytes:
+            return
+
+        if key in self.entries:
+            self.nbytes -= self.entries.pop(key)[1]
+        self.entries[key] = (answer, size)
+        self.nbytes += size
+
+        # evicting the least recently used answers until the bound holds
+        while self.nbytes > self.max_bytes:
+            _, (_, evicted) = self.entries.popitem(last=False)
+            self.nbytes -= evicted
+            self.evictions += 1
+
+    def invalidate(self, fingerprint):
+        """
+        Drops the in-memory answers computed from any data other than ``fingerprint``
+
+        Disk entries stay, as they are keyed on their fingerprint and are right again
+        if the data returns to that version.
+
+        Returns:
+        int: the number of answers dropped
+        """
+
+        stale = [key for key in self.entries if key[0] != fingerprint]
+        for key in stale:
+            self.nbytes -= self.entries.pop(key)[1]
+
+        return len(stale)
+
+    def record(self, tier, seconds):
+        """
+        Records the latency of one lookup served from a tier ('memory', 'disk' or 'miss')
+        """
+
+        self.latencies[tier].append(seconds)
+
+    def stats(self):
+        """
+        Summarizes the cache for sizing it
+
+        Returns:
+        dict: the counters, the hit rate, the entries and bytes held, and the mean, p50 and
+        p99 latency in milliseconds of the lookups served by each tier
+        """
+
+        lookups = self.hits + self.disk_hits + self.misses
+        latency = {}
+        for tier, seconds in self.latencies.items():
+            if seconds:
+                values = np.array(seconds) * 1000
+                latency[tier] = {'count': len(values), 'mean_ms': float(values.mean()),
+                                 'p50_ms': float(np.percentile(values, 50)),
+                                 'p99_ms': float(np.percentile(values, 99))}
+
+        return {'hits': self.hits, 'disk_hits': self.disk_hits, 'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': (self.hits + self.disk_hits) / lookups if lookups else None,
+                'entries': len(self.entries), 'bytes': self.nbytes, 'max_bytes': self.max_bytes,
+                'latency': latency}
+
+
+class QueryLayer:
+    """
+    Answers the business questions of a csv through a QueryCache
+
+    Parameters:
+    path (str or Path): the transactions csv
+    cache_dir (str or Path): where the columnar snapshot of the csv is kept
+    cache (QueryCache): the answer cache, a new one bounded by ``max_bytes`` when None
+    auto_refresh (bool): check while answering questions whether the csv changed, and reload it if so
+    check_interval (float): the seconds between two of those checks, so most questions do not even stat the csv
+    """
+
+    def __init__(self, path=SAMPLE_CSV, cache_dir=None, cache=None, max_bytes=64 * 2**20, disk_dir=None,
+                 auto_refresh=True, check_interval=0.5):
+        self.path = path
+        self.cache_dir = cache_dir if cache_dir is not None else default_cache_dir(path)
+        self.cache = cache if cache is not None else QueryCache(max_bytes, disk_dir)
+        self.auto_refresh = auto_refresh
+        self.check_interval = check_interval
+        # the data and its fingerprint, swapped together so a question never mixes two versions of the csv
+        self.snapshot = (None, None, None)
+        # the size and modification time of the csv at the last check, and when that check was
+        self._signature = None
+        self._checked = time.monotonic()
+        # the cache and the snapshot swap are shared by the threads answering questions; the answers and the
+        # reloads are computed unlocked, one reload at a time
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self.refresh()
+
+    @property
+    def df(self):
+        """
+        Returns the transactions of the current snapshot
+        """
+
+        return self.snapshot[0]
+
+    @property
+    def cube(self):
+        """
+        Returns the aggregation cube of the current snapshot
+        """
+
+        return self.snapshot[1]
+
+    @property
+    def fingerprint(self):
+        """
+        Returns the fingerprint of the csv the current snapshot was loaded from
+        """
+
+        return self.snapshot[2]
+
+    def refresh(self, wait=True):
+        """
+        Reloads the data when the csv changed since it was loaded
+
+        The check is a stat of the file; the content digest is only looked up when its
+        size or modification time changed. The new data is loaded while questions keep
+        being answered from the old snapshot, which is swapped for it at the end.
+
+        Parameters:
+        wait (bool): wait for a reload already running in another thread, instead of returning at once
+
+        Returns:
+        bool: True when new data was loaded
+        """
+
+        if not self._refresh_lock.acquire(blocking=wait):
+            return False
+
+        try:
+            stat = os.stat(self.path)
+            signature = (stat.st_size, stat.st_mtime_ns)
+            if signature == self._signature:
+                return False
+
+            fingerprint = source_key(self.path, self.cache_dir)
+            loaded = fingerprint != self.fingerprint
+            if loaded:
+                df, cube = load(self.path, self.cache_dir)
+                with self._lock:
+                    self.snapshot = (df, cube, fingerprint)
+                    self.cache.invalidate(fingerprint)
+            self._signature = signature
+        finally:
+            self._refresh_lock.release()
+
+        return loaded
+
+    def ask(self, question, **params):
+        """
+        Answers a question, e.g. ``ask('q1', top_k=20)`` or ``ask('q2', card_types=['Gold'])``
+
+        The answer may be shared with later callers, so its tables must not be modified.
+
+        Returns:
+        dict: table name to table, as returned by the question in ``cceda.analysis``
+        """
+
+        if question not in QUESTIONS:
+            raise ValueError(f'unknown question {question!r}; choose from {", ".join(QUESTIONS)}')
+
+        # the wait for a refresh is part of the latency callers see
+        start = time.perf_counter()
+        if self.auto_refresh and time.monotonic() - self._checked >= self.check_interval:
+            self._checked = time.monotonic()
+            self.refresh(wait=False)
+
+        # the cube and the fingerprint of the key come from one snapshot, even if a refresh swaps it meanwhile
+        _, cube, fingerprint = self.snapshot
+        key = query_key(fingerprint, question, params)
+        with self._lock:
+            answer, tier = self.cache.get(key)
+
+        if answer is None:
+            answer = QUESTIONS[question](cube, **params)
+            tier = 'miss'
+            with self._lock:
+                # an answer of a snapshot swapped meanwhile could never be asked for again
+                if fingerprint == self.fingerprint:
+                    self.cache.put(key, answer)
+
+        with self._lock:
+            self.cache.record(tier, time.perf_counter() - start)
+
+        return answer
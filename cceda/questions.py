@@ -0,0 +1,99 @@
+"""
+The aggregated tables behind the five business questions
+
+Every question of the analysis is answered from a total of Amount over a few
+dimension columns. ``QUESTION_GROUPS`` names those tables once so that the
+different execution engines (plain pandas, the aggregation cube, streaming,
+parallel) all produce and can be checked against the same set of tables.
+"""
+
+import pandas as pd
+
+from cceda.cities import normalize_cities
+from cceda.dates import DateColumnsExtractor
+
+# the day numbers Question 5 treats as the end of the month
+END_OF_MONTH_DAYS = (29, 30, 31)
+
+# table name to the columns Amount is totalled over
+QUESTION_GROUPS = {
+    # Question 1: spending per city and per city and gender
+    'city': ['City'],
+    'city_gender': ['City', 'Gender'],
+    # Question 2: spending per expense type and card type
+    'exp_card': ['Exp Type', 'Card Type'],
+    # Question 3: monthly spending per card type
+    'month_card': ['Month', 'Card Type'],
+    # Question 4: spending per day name and per month, by gender
+    'day_name_gender': ['Day Name', 'Gender'],
+    'month_gender': ['Month', 'Gender'],
+    # Question 5: spending at the end of the month per expense type
+    'end_of_month': ['Day Number', 'Month', 'Exp Type'],
+}
+
+# row filters applied before totalling, per table
+QUESTION_FILTERS = {
+    'end_of_month': {'Day Number': END_OF_MONTH_DAYS},
+}
+
+
+def prepare_frame(df, city_memo=None):
+    """
+    Applies the preprocessing of the analysis: normalized City and the date parts
+
+    Parameters:
+    city_memo (str or Path): optional json file memoizing the cleaned city names between runs
+
+    Returns:
+    pandas.DataFrame: The original DataFrame with a normalized categorical City column and the date part columns
+    """
+
+    df['City'] = normalize_cities(df['City'], city_memo)
+
+    return DateColumnsExtractor().extract_all(df, 'Date')
+
+
+def question_table(df, name):
+    """
+    Computes one question table with a pandas groupby
+
+    Returns:
+    pandas.DataFrame: the group columns and the total Amount, one row per group
+    """
+
+    for column, values in QUESTION_FILTERS.get(name, {}).items():
+        df = df[df[column].isin(values)]
+
+    return df.groupby(QUESTION_GROUPS[name], as_index=False, observed=True)['Amount'].sum()
+
+
+def question_tables(df):
+    """
+    Computes every question table with pandas, the reference for the other engines
+
+    Returns:
+    dict: table name to table
+    """
+
+    return {name: question_table(df, name) for name in QUESTION_GROUPS}
+
+
+def assert_tables_equal(left, right):
+    """
+    Checks that two question tables hold the same groups and totals
+
+    Row order and the dtypes of the group columns (categorical or not) are ignored.
+    """
+
+    columns = list(left.columns)
+    assert sorted(columns) == sorted(right.columns), (columns, list(right.columns))
+    group_columns = [column for column in columns if column != 'Amount']
+
+    def normalized(table):
+        table = table[columns].copy()
+        for column in group_columns:
+            table[column] = table[column].astype(str)
+        table['Amount'] = table['Amount'].astype('int64')
+        return table.sort_values(group_columns).reset_index(drop=True)
+
+    pd.testing.assert_frame_equal(normalized(left), normalized(right))
@@ -0,0 +1,226 @@
+"""
+Headless report of the analysis charts, rendered in parallel and cached
+
+Every chart of the analysis is described by the aggregate it plots. Charts are
+rendered in worker processes without any display: the plotly bar charts become
+html fragments and the matplotlib trend becomes a png. A rendered chart is
+cached under the hash of its aggregate and options, so an unchanged chart is
+never rendered twice. All charts are then assembled into one self-contained
+html file, with plotly.js and the images embedded.
+
+Usage:
+    ccEDA report --input 'Credit card transactions India.csv' --output report
+"""
+
+import base64
+import hashlib
+import html
+import json
+import os
+import shutil
+import sys
+import time
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import pandas as pd
+
+from cceda.instrument import active, stage
+from cceda.questions import END_OF_MONTH_DAYS
+from cceda.timeseries import TimeSeriesEngine
+
+# bumped whenever rendering changes, so cached charts are rendered again
+RENDER_VERSION = 2
+
+# a chart: its file name, 'bar' (plotly) or 'line' (matplotlib), the aggregate it plots and its options
+Chart = namedtuple('Chart', ['name', 'kind', 'data', 'options'])
+
+_EXTENSIONS = {'bar': '.html', 'line': '.png'}
+
+
+def question_charts(cube):
+    """
+    Describes every chart of the analysis from the aggregation cube
+
+    Returns:
+    list: the charts of Questions 2 to 5
+    """
+
+    charts = [
+        Chart('q2_expense_card', 'bar', cube.rollup(['Exp Type', 'Card Type']),
+              {'x': 'Exp Type', 'y': 'Amount', 'color': 'Card Type',
+               'title': 'Amount spent per expense type and card type'}),
+        Chart('q3_monthly_trend', 'line', TimeSeriesEngine(cube.rollup(['Date', 'Card Type'])).long('Card Type'),
+              {'x': 'Month', 'y': 'Amount', 'series': 'Card Type',
+               'title': 'Total Amount Spent with Specific Card Type'}),
+        Chart('q4_day_gender', 'bar', cube.rollup(['Day Name', 'Gender']),
+              {'x': 'Day Name', 'y': 'Amount', 'color': 'Gender', 'title': 'Amount spent per day and gender'}),
+        Chart('q4_month_gender', 'bar', cube.rollup(['Month', 'Gender']),
+              {'x': 'Month', 'y': 'Amount', 'color': 'Gender', 'title': 'Amount spent per month and gender'}),
+    ]
+
+    end_of_month = cube.rollup(['Day Number', 'Month', 'Exp Type'], where={'Day Number': END_OF_MONTH_DAYS})
+    for day in END_OF_MONTH_DAYS:
+        data = end_of_month[end_of_month['Day Number'] == day].drop(columns='Day Number').reset_index(drop=True)
+        charts.append(Chart(f'q5_day_{day}', 'bar', data,
+                            {'x': 'Month', 'y': 'Amount', 'color': 'Exp Type',
+                             'title': f'Expenses of Various Expense Types for day {day} of each month'}))
+
+    return charts
+
+
+def chart_key(chart):
+    """
+    Hashes what a chart depends on: its kind, options and aggregate
+
+    Returns:
+    str: the hexadecimal digest used as the cache key
+    """
+
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(json.dumps([RENDER_VERSION, chart.kind, chart.options], sort_keys=True).encode())
+    digest.update(json.dumps([list(map(str, chart.data.columns)), list(map(str, chart.data.dtypes))]).encode())
+    digest.update(pd.util.hash_pandas_object(chart.data, index=False).to_numpy().tobytes())
+
+    return digest.hexdigest()
+
+
+def _render_bar(chart, path):
+    # plotly is imported in the worker only, and only when a bar chart is rendered
+    import plotly.express as px
+
+    # categorical columns are plotted as text, keeping their category order on the axes
+    data = chart.data.copy()
+    orders = {}
+    for column in data.columns:
+        if isinstance(data[column].dtype, pd.CategoricalDtype):
+            orders[column] = [str(category) for category in data[column].cat.categories]
+            data[column] = data[column].astype(str)
+
+    options = chart.options
+    figure = px.bar(data, x=options['x'], y=options['y'], color=options['color'],
+                    title=options['title'], text_auto=True, category_orders=orders)
+    path.write_text(figure.to_html(full_html=False, include_plotlyjs=False))
+
+
+def _render_line(chart, path):
+    # the Agg backend renders without any display
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+
+    options = chart.options
+    figure = plt.figure(figsize=(15, 7))
+    for series, rows in chart.data.groupby(options['series'], observed=True):
+        x = rows[options['x']]
+        # dates are plotted on a time axis, anything else as text
+        plt.plot(x if pd.api.types.is_datetime64_any_dtype(x) else x.astype(str), rows[options['y']], label=series)
+    plt.xlabel(options['x'])
+    plt.ylabel('Amount Spent')
+    plt.title(options['title'])
+    plt.legend()
+    figure.savefig(path, format='png', bbox_inches='tight')
+    plt.close(figure)
+
+
+def render_chart(chart, cache_dir):
+    """
+    Renders one chart into the cache, unless it is already there
+
+    Returns:
+    tuple: the chart name, the cached file, the seconds spent and whether it came from the cache
+    """
+
+    start = time.perf_counter()
+    path = Path(cache_dir) / f'{chart_key(chart)}{_EXTENSIONS[chart.kind]}'
+
+    if path.exists():
+        return chart.name, path, time.perf_counter() - start, True
+
+    # rendering to a temporary name first, so a crashed worker leaves no broken cache entry
+    temporary = path.with_name(f'.{path.name}.{os.getpid()}')
+    if chart.kind == 'bar':
+        _render_bar(chart, temporary)
+    else:
+        _render_line(chart, temporary)
+    os.replace(temporary, path)
+
+    return chart.name, path, time.perf_counter() - start, False
+
+
+def _assemble(charts, rendered, title):
+    # one html page with plotly.js inlined once and the png charts as data uris
+    from plotly.offline import get_plotlyjs
+
+    sections = []
+    for chart in charts:
+        path = rendered[chart.name]
+        heading = f'<h2>{html.escape(chart.options["title"])}</h2>'
+        if chart.kind == 'bar':
+            sections.append(f'<section>{heading}{path.read_text()}</section>')
+        else:
+            image = base64.b64encode(path.read_bytes()).decode()
+            sections.append(f'<section>{heading}<img alt="{html.escape(chart.name)}" '
+                            f'src="data:image/png;base64,{image}"></section>')
+
+    return (f'<!DOCTYPE html><html><head><meta charset="utf-8"><title>{html.escape(title)}</title>'
+            f'<script type="text/javascript">{get_plotlyjs()}</script></head>'
+            f'<body><h1>{html.escape(title)}</h1>{"".join(sections)}</body></html>')
+
+
+def build_report(charts, output_dir, cache_dir=None, workers=None, title='India Credit Card Spendings'):
+    """
+    Renders the charts in parallel and writes them as files and as one html report
+
+    Parameters:
+    charts (list): the charts to render, e.g. from ``question_charts``
+    output_dir (str or Path): receives report.html, one file per chart and timings.json
+    cache_dir (str or Path): where rendered charts are cached, defaults to output_dir/.chart_cache
+    workers (int): number of rendering processes, defaults to the number of CPUs
+
+    Returns:
+    dict: the report path, the total seconds and the seconds and cache status of every chart
+    """
+
+    start = time.perf_counter()
+    output_dir = Path(output_dir)
+    cache_dir = Path(cache_dir) if cache_dir is not None else output_dir / '.chart_cache'
+    cache_dir.mkdir(parents=True, exist_ok=True)
+
+    timings, rendered = {}, {}
+    instrumentation = active()
+    with stage('charts', charts=len(charts)), ProcessPoolExecutor(max_workers=workers) as pool:
+        for name, path, seconds, cached in pool.map(render_chart, charts, [cache_dir] * len(charts)):
+            rendered[name] = path
+            timings[name] = {'seconds': seconds, 'cached': cached}
+
+            # the charts are rendered in worker processes, so only their wall time is known here
+            if instrumentation is not None:
+                instrumentation.add({'stage': f'chart {name}', 'start': time.perf_counter() - seconds
+                                     - instrumentation.origin, 'wall_s': seconds, 'cached': cached,
+                                     'worker': True})
+
+    with stage('assemble_report'):
+        # the rendered charts are also kept as standalone files
+        for chart in charts:
+            shutil.copyfile(rendered[chart.name], output_dir / f'{chart.name}{_EXTENSIONS[chart.kind]}')
+
+        report = output_dir / 'report.html'
+        report.write_text(_assemble(charts, rendered, title), encoding='utf-8')
+
+    summary = {'report': str(report), 'seconds': time.perf_counter() - start, 'charts': timings}
+    (output_dir / 'timings.json').write_text(json.dumps(summary, indent=1))
+
+    return summary
+
+
+def main():
+    # the same as `ccEDA report`
+    from cceda.cli import main as cli_main
+
+    cli_main(['report', *sys.argv[1:]])
+
+
+if __name__ == '__main__':
+    main()
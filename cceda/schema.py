@@ -0,0 +1,45 @@
+"""
+Column layout and data types of the credit card transactions file
+"""
+
+from pathlib import Path
+
+# the sample file shipped with the repository
+SAMPLE_CSV = Path(__file__).resolve().parent.parent / 'Credit card transactions India.csv'
+
+# name of the index column and the data columns, in file order
+INDEX_COLUMN = 'index'
+COLUMNS = ['City', 'Date', 'Card Type', 'Exp Type', 'Gender', 'Amount']
+
+# the dates in the file look like '29-Oct-14'
+DATE_FORMAT = '%d-%b-%y'
+
+# the low-cardinality text columns that are stored as categoricals
+CATEGORICAL_COLUMNS = ['City', 'Card Type', 'Exp Type', 'Gender']
+
+# the known values of the small domains
+CARD_TYPES = ('Gold', 'Platinum', 'Signature', 'Silver')
+EXP_TYPES = ('Bills', 'Entertainment', 'Food', 'Fuel', 'Grocery', 'Travel')
+GENDERS = ('F', 'M')
+
+# Amount is kept as a 64 bit integer so totals over large feeds cannot overflow
+AMOUNT_DTYPE = 'int64'
+
+
+def csv_dtypes():
+    """
+    Builds the explicit dtype mapping used when reading the transactions csv
+
+    The Date column is read as a categorical so that every distinct date string
+    is parsed only once afterwards.
+
+    Returns:
+    dict: column name to dtype, usable as the ``dtype`` argument of ``pd.read_csv``
+    """
+
+    # every categorical column plus the Date strings are read as categories
+    dtypes = {column: 'category' for column in CATEGORICAL_COLUMNS + ['Date']}
+    dtypes[INDEX_COLUMN] = 'int64'
+    dtypes['Amount'] = AMOUNT_DTYPE
+
+    return dtypes
@@ -0,0 +1,295 @@
+"""
+A local asyncio HTTP service answering the business questions as JSON
+
+The transactions are loaded once at startup. The event loop only parses
+requests and writes responses; answering a question, which may aggregate the
+whole dataset, runs in a thread pool. Identical requests arriving while the
+same answer is being computed wait for that one computation instead of
+starting their own, and answers are memoized by the query layer.
+
+Endpoints (GET only):
+    /health
+    /questions/q1?top_k=10&bottom_k=5
+    /questions/q2?card_types=Gold,Silver
+    /questions/q3, /questions/q4
+    /questions/q5?days=29,30,31
+    /cities?prefix=J,K&min_length=10&max_length=20
+    /cities/<name>
+    /stats
+
+Usage:
+    ccEDA serve --port 8000
+"""
+
+import asyncio
+import json
+import logging
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs, unquote, urlsplit
+
+import numpy as np
+import pandas as pd
+
+from cceda.city_index import CityIndex
+from cceda.query_cache import QueryLayer
+from cceda.schema import SAMPLE_CSV
+
+logger = logging.getLogger(__name__)
+
+# how each query parameter of the questions is parsed from its text
+_PARAMETERS = {
+    'q1': {'top_k': int, 'bottom_k': int},
+    'q2': {'card_types': lambda text: text.split(',')},
+    'q3': {},
+    'q4': {},
+    'q5': {'days': lambda text: [int(day) for day in text.split(',')]},
+}
+
+_REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed', 500: 'Internal Server Error'}
+
+
+class HTTPError(Exception):
+    """
+    An error answered to the client with its status code
+    """
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def _json_default(value):
+    # the numpy and pandas scalars found in the tables
+    if isinstance(value, np.integer):
+        return int(value)
+    if isinstance(value, np.floating):
+        return None if np.isnan(value) else float(value)
+    if isinstance(value, pd.Timestamp):
+        return value.isoformat()
+
+    raise TypeError(f'{type(value).__name__} is not JSON serializable')
+
+
+def tables_json(tables):
+    """
+    Encodes a dict of tables as JSON: table name to a list of row objects
+
+    Returns:
+    bytes: the encoded tables
+    """
+
+    encoded = {}
+    for name, table in tables.items():
+        table = table.reset_index() if not isinstance(table.index, pd.RangeIndex) else table
+        columns = [str(column) for column in table.columns]
+        encoded[name] = [dict(zip(columns, row)) for row in table.itertuples(index=False, name=None)]
+
+    return json.dumps(encoded, default=_json_default, allow_nan=False).encode()
+
+
+class QueryService:
+    """
+    The request handling of the service, independent of the network
+
+    Parameters:
+    layer (QueryLayer): the loaded data and the answer cache
+    workers (int): threads answering questions
+    max_bodies (int): how many encoded answers are kept, so a repeated question is answered on the event loop
+    """
+
+    def __init__(self, layer, workers=None, max_bodies=256):
+        self.layer = layer
+        self.bodies = OrderedDict()
+        self.max_bodies = max_bodies
+        self.index = CityIndex(layer.df['City'])
+        self.amounts = layer.df['Amount'].to_numpy()
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='cceda-query')
+        self.in_flight = {}
+        self.requests = self.coalesced = self.computed = 0
+
+    async def _coalesced(self, key, compute):
+        # identical requests share the computation already running for the first of them
+        future = self.in_flight.get(key)
+        if future is not None:
+            self.coalesced += 1
+            return await asyncio.shield(future)
+
+        future = asyncio.get_running_loop().run_in_executor(self.executor, compute)
+        self.in_flight[key] = future
+        self.computed += 1
+        try:
+            # shielded, so a client hanging up does not cancel the answer others are waiting for
+            body = await asyncio.shield(future)
+        finally:
+            del self.in_flight[key]
+
+        # encoding a large answer costs more than computing a cached one, so the encoded bytes are kept too
+        self.bodies[key] = body
+        if len(self.bodies) > self.max_bodies:
+            self.bodies.popitem(last=False)
+
+        return body
+
+    async def _question(self, name, query):
+        if name not in _PARAMETERS:
+            raise HTTPError(404, f'unknown question {name!r}')
+
+        params = {}
+        for parameter, values in query.items():
+            if parameter not in _PARAMETERS[name]:
+                raise HTTPError(400, f'{name} takes no parameter {parameter!r}')
+            try:
+                params[parameter] = _PARAMETERS[name][parameter](values[-1])
+            except ValueError as error:
+                raise HTTPError(400, f'bad value for {parameter}: {error}') from None
+
+        key = ('question', name, json.dumps(params, sort_keys=True), self.layer.fingerprint)
+        if key in self.bodies:
+            self.bodies.move_to_end(key)
+            return self.bodies[key]
+
+        return await self._coalesced(key, lambda: tables_json(self.layer.ask(name, **params)))
+
+    def _city(self, name):
+        rows = self.index.rows(name)
+        body = {'city': name, 'present': bool(len(rows)), 'transactions': int(len(rows)),
+                'amount': int(self.amounts[rows].sum())}
+
+        return json.dumps(body).encode()
+
+    def _cities(self, query):
+        try:
+            prefixes = query['prefix'][-1].split(',') if 'prefix' in query else ['']
+            min_length = int(query['min_length'][-1]) if 'min_length' in query else 0
+            max_length = int(query['max_length'][-1]) if 'max_length' in query else None
+        except ValueError as error:
+            raise HTTPError(400, str(error)) from None
+
+        return json.dumps({'cities': self.index.search(prefixes, min_length, max_length)}).encode()
+
+    def _stats(self):
+        stats = {'requests': self.requests, 'computed': self.computed, 'coalesced': self.coalesced,
+                 'in_flight': len(self.in_flight), 'encoded': len(self.bodies), 'cache': self.layer.cache.stats()}
+
+        return json.dumps(stats, default=_json_default).encode()
+
+    async def handle(self, method, target):
+        """
+        Answers one request
+
+        Returns:
+        tuple: the status code and the JSON body (bytes)
+        """
+
+        self.requests += 1
+        if method != 'GET':
+            raise HTTPError(405, 'only GET is supported')
+
+        url = urlsplit(target)
+        parts = [unquote(part) for part in url.path.strip('/').split('/') if part]
+        query = parse_qs(url.query)
+
+        if parts == ['health']:
+            return 200, b'{"status": "ok"}'
+        if parts == ['stats']:
+            return 200, self._stats()
+        if len(parts) == 2 and parts[0] == 'questions':
+            return 200, await self._question(parts[1], query)
+        if parts == ['cities']:
+            return 200, self._cities(query)
+        if len(parts) == 2 and parts[0] == 'cities':
+            return 200, self._city(parts[1])
+
+        raise HTTPError(404, f'no endpoint {url.path}')
+
+    async def serve_connection(self, reader, writer):
+        """
+        Serves the requests of one HTTP/1.1 connection, keeping it alive until the client closes it
+        """
+
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+
+                length = method = None
+                try:
+                    # request bodies are not used, but are read so the next request starts at the right place
+                    length = int(headers.get('content-length', 0) or 0)
+                    if length < 0:
+                        raise ValueError(f'negative Content-Length {length}')
+                    if length:
+                        await reader.readexactly(length)
+
+                    method, target, version = request_line.decode('latin-1').split()
+                except ValueError:
+                    status, body, version = 400, b'{"error": "malformed request"}', 'HTTP/1.1'
+                    if length is None or length < 0:
+                        # the end of a body of unknown length cannot be found, so the connection is not kept
+                        headers['connection'] = 'close'
+
+                if method is not None:
+                    # only the parsing above is a malformed request; any other error of a question is logged
+                    try:
+                        status, body = await self.handle(method, target)
+                    except HTTPError as error:
+                        status, body = error.status, json.dumps({'error': str(error)}).encode()
+                    except Exception:
+                        logger.exception('request %r failed', request_line)
+                        status, body = 500, b'{"error": "internal error"}'
+
+                keep_alive = headers.get('connection', '').lower() != 'close' and version == 'HTTP/1.1'
+                writer.write(f'HTTP/1.1 {status} {_REASONS[status]}\r\nContent-Type: application/json\r\n'
+                             f'Content-Length: {len(body)}\r\n'
+                             f'Connection: {"keep-alive" if keep_alive else "close"}\r\n\r\n'.encode() + body)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    def close(self):
+        """
+        Stops the worker threads
+        """
+
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+async def serve(path=SAMPLE_CSV, host='127.0.0.1', port=8000, workers=None, cache_dir=None, ready=None):
+    """
+    Loads the transactions and serves them until cancelled
+
+    Parameters:
+    ready (callable): called with the bound (host, port) once the service accepts connections
+    """
+
+    start = time.perf_counter()
+    layer = QueryLayer(path, cache_dir=cache_dir, auto_refresh=False)
+    service = QueryService(layer, workers)
+    server = await asyncio.start_server(service.serve_connection, host, port)
+
+    address = server.sockets[0].getsockname()[:2]
+    logger.info('loaded %d transactions in %.2fs, serving on http://%s:%d',
+                len(layer.df), time.perf_counter() - start, *address)
+    if ready is not None:
+        ready(address)
+
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        service.close()
@@ -0,0 +1,343 @@
+"""
+Permutation tests and bootstrap confidence intervals of the male and female spending gaps
+
+Every group (a city, day name, month or card type) gets two resampling results,
+computed for all the groups at once:
+
+- a permutation test of whether a transaction's Amount depends on the gender
+  in the group: the genders are shuffled within the group, keeping the number
+  of male and female transactions, and the difference of the male and female
+  mean Amount is compared with the observed one (two-sided)
+- a bootstrap confidence interval of that same mean difference: the male and
+  the female transactions of the group are each drawn with replacement, so
+  both means are always defined; a level with fewer than ``min_interval_rows``
+  transactions is too small for a bootstrap to tell its spread, so such groups
+  get no interval
+
+Both results are about the difference of the means, not of the totals in the
+Difference column of the gender gap tables, which mostly follows how many
+transactions each gender has. The intervals are adjusted for the number of
+groups like the p-values are: simultaneous (Bonferroni) intervals for the
+family-wise corrections and false coverage rate intervals (Benjamini-Yekutieli)
+for 'fdr_bh', whose level also depends on the number of significant groups.
+
+The transactions are sorted once by group and, within it, males first. A
+batch of resamples is then one resamples x rows matrix: a permutation sorts
+random 64 bit keys holding the group, random bits and the row, so one
+``np.sort`` along the rows shuffles every group of every resample, and the
+first rows of each group are its males; when the rows and groups leave too
+few random bits, float keys are argsorted instead. The level sums of a batch
+are one ``np.add.reduceat``. The batches are spread over a process pool attached to the
+sorted columns in shared memory; each batch has its own seed, so the results
+do not depend on the number of workers.
+
+The p-values of the groups are adjusted for multiple comparisons (Benjamini-
+Hochberg by default), and ``with_significance`` adds the results to a
+``gender_gap`` table, so ``dominated_areas`` splits them with the cities.
+
+Usage:
+    tests = difference_tests(df, by='City', resamples=10_000)
+    Female_Dominated_Areas, Male_Dominated_Areas = dominated_areas(with_significance(gap, tests))
+"""
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from cceda.encoding import encode_column
+from cceda.parallel import SharedColumns, _attach
+
+# the columns with_significance adds to a gender gap table
+SIGNIFICANCE_COLUMNS = ['Mean_Difference', 'Mean_Difference_Low', 'Mean_Difference_High', 'P_Value', 'Adjusted_P',
+                        'Significant']
+
+# the multiple comparison corrections of adjust_p_values
+CORRECTIONS = ('fdr_bh', 'holm', 'bonferroni', 'none')
+
+# the resamples x rows elements of one batch matrix, about 32 MB of keys
+BATCH_ELEMENTS = 1 << 22
+
+# the fewest random bits a packed permutation key may hold; ties of the random bits keep the row order
+MIN_RANDOM_BITS = 32
+
+
+def adjust_p_values(p_values, method='fdr_bh'):
+    """
+    Adjusts the p-values of a family of tests for multiple comparisons
+
+    Parameters:
+    p_values (array-like): the p-values; NaN (untested) values stay NaN and are not counted
+    method (str): 'fdr_bh' (Benjamini-Hochberg, controls the false discovery rate), 'holm'
+        or 'bonferroni' (control the family-wise error rate), or 'none'
+
+    Returns:
+    numpy.ndarray: the adjusted p-values, capped at 1
+    """
+
+    if method not in CORRECTIONS:
+        raise ValueError(f'unknown correction {method!r}, expected one of {CORRECTIONS}')
+
+    p_values = np.asarray(p_values, dtype=np.float64)
+    adjusted = np.full_like(p_values, np.nan)
+    tested = np.flatnonzero(~np.isnan(p_values))
+    n = len(tested)
+    if not n or method == 'none':
+        adjusted[tested] = p_values[tested]
+        return adjusted
+
+    order = tested[np.argsort(p_values[tested], kind='stable')]
+    ranked = p_values[order]
+    if method == 'bonferroni':
+        values = ranked * n
+    elif method == 'holm':
+        # step-down: the k-th smallest p-value times n - k, never below an earlier one
+        values = np.maximum.accumulate(ranked * (n - np.arange(n)))
+    else:
+        # step-up: the k-th smallest p-value times n / k, never above a later one
+        values = np.minimum.accumulate((ranked * n / np.arange(1, n + 1))[::-1])[::-1]
+
+    adjusted[order] = np.minimum(values, 1.0)
+
+    return adjusted
+
+
+def interval_confidence(confidence, correction, tested, significant):
+    """
+    Returns the confidence of the intervals of a family of tests, adjusted like its p-values
+
+    Parameters:
+    confidence (float): the confidence of a single interval
+    correction (str): the correction of the p-values, see ``adjust_p_values``
+    tested (int): the number of tests
+    significant (int): the number of tests significant after the correction
+
+    Returns:
+    float: the confidence of every interval, so that the family keeps the ``confidence``
+    """
+
+    if correction not in CORRECTIONS:
+        raise ValueError(f'unknown correction {correction!r}, expected one of {CORRECTIONS}')
+
+    tail = 1 - confidence
+    if correction == 'fdr_bh':
+        # false coverage rate intervals: the tail shared by the significant tests
+        tail *= max(significant, 1) / tested
+    elif correction != 'none':
+        tail /= tested
+
+    return 1 - tail
+
+
+def _layout(df, by, between, levels, amount_column):
+    # the transactions of the groups with both levels, sorted by group and first level first, and the
+    # labels, start, size and first level count of every group
+    codes, labels = encode_column(df[by])
+    level = df[between].to_numpy()
+    first, second = level == levels[0], level == levels[1]
+    keep = (codes >= 0) & (first | second)
+
+    codes, first = codes[keep], first[keep]
+    amounts = df[amount_column].to_numpy()[keep].astype(np.float64)
+
+    # only the groups where both levels spend can be compared
+    n_groups = len(labels)
+    sizes = np.bincount(codes, minlength=n_groups)
+    firsts = np.bincount(codes, weights=first, minlength=n_groups).astype(np.int64)
+    tested = (firsts > 0) & (firsts < sizes)
+    keep = tested[codes]
+    dense = np.cumsum(tested) - 1
+    codes, first, amounts = dense[codes[keep]], first[keep], amounts[keep]
+
+    order = np.lexsort((~first, codes))
+    codes, first, amounts = codes[order], first[order], amounts[order]
+    sizes, firsts = sizes[tested], firsts[tested]
+    starts = np.concatenate([[0], np.cumsum(sizes)[:-1]]).astype(np.int64)
+
+    arrays = {'amounts': amounts, 'groups': codes.astype(np.int64), 'starts': starts, 'sizes': sizes.astype(np.int64),
+              'firsts': firsts}
+
+    return arrays, labels[tested]
+
+
+def _mean_differences(first_sums, totals, firsts, seconds):
+    # the first level mean minus the second level mean, from the first level sums
+    return first_sums / firsts - (totals - first_sums) / seconds
+
+
+def _permuted_rows(rng, groups, count, row_bits, group_bits):
+    # ``count`` permutations of the rows within their groups, as a count x rows matrix of row numbers
+    rows = len(groups)
+    random_bits = 64 - group_bits - row_bits
+    if random_bits < MIN_RANDOM_BITS:
+        # too many rows and groups to pack: the group and a random fraction in one float key
+        keys = rng.random((count, rows))
+        keys += groups
+        return keys.argsort(axis=1)
+
+    # the sort keys are the group, random bits and the row from the high bits to the low ones
+    keys = rng.integers(0, 1 << random_bits, (count, rows), dtype=np.uint64)
+    keys <<= np.uint64(row_bits)
+    keys |= (groups.astype(np.uint64) << np.uint64(64 - group_bits)) | np.arange(rows, dtype=np.uint64)
+    keys.sort(axis=1)
+
+    # the masked keys are the rows, taken as signed integers to index without a conversion
+    return np.bitwise_and(keys.view(np.int64), (1 << row_bits) - 1, out=keys.view(np.int64))
+
+
+def _resample(arrays, seed, resamples, observed):
+    # runs a task of permutations and bootstraps; returns the count of permuted mean differences at least as
+    # extreme as the observed ones, and the bootstrapped mean differences (resamples x groups)
+    amounts, groups = arrays['amounts'], arrays['groups']
+    starts, sizes, firsts = arrays['starts'], arrays['sizes'], arrays['firsts']
+    rows, n_groups = len(amounts), len(starts)
+    rng = np.random.default_rng(seed)
+    row_bits = max(int(rows - 1).bit_length(), 1)
+    group_bits = max(int(n_groups - 1).bit_length(), 1)
+
+    totals = np.add.reduceat(amounts, starts)
+    seconds = sizes - firsts
+    # a permuted difference within rounding of the observed one counts as extreme
+    threshold = np.abs(observed) * (1 - 1e-9)
+    # the rows of every level of every group, first level first
+    bounds = np.column_stack([starts, starts + firsts]).ravel()
+    first = np.arange(rows) - starts[groups] < firsts[groups]
+    level_starts = np.where(first, starts[groups], starts[groups] + firsts[groups])
+    level_sizes = np.where(first, firsts[groups], seconds[groups])
+
+    extreme = np.zeros(n_groups, dtype=np.int64)
+    bootstrapped = np.empty((resamples, n_groups))
+    batch = max(1, BATCH_ELEMENTS // rows)
+    for offset in range(0, resamples, batch):
+        count = min(batch, resamples - offset)
+
+        # permutations: the first ``firsts`` rows of every shuffled group take the first level
+        rows_taken = _permuted_rows(rng, groups, count, row_bits, group_bits)
+        first_sums = np.add.reduceat(amounts.take(rows_taken), bounds, axis=1)[:, ::2]
+        del rows_taken
+        extreme += np.count_nonzero(np.abs(_mean_differences(first_sums, totals, firsts, seconds)) >= threshold,
+                                    axis=0)
+
+        # bootstraps: every row is replaced by a random row of the same level of its group
+        draws = rng.random((count, rows))
+        draws *= level_sizes
+        drawn = draws.astype(np.int64)
+        del draws
+        drawn += level_starts
+        level_sums = np.add.reduceat(amounts.take(drawn), bounds, axis=1)
+        del drawn
+        bootstrapped[offset:offset + count] = level_sums[:, ::2] / firsts - level_sums[:, 1::2] / seconds
+
+    return extreme, bootstrapped
+
+
+def _resample_shared(descriptors, seed, resamples, observed):
+    # a pool task, attached to the sorted columns of the parent
+    blocks, arrays = _attach(descriptors)
+    try:
+        return _resample(arrays, seed, resamples, observed)
+    finally:
+        del arrays
+        for block in blocks:
+            block.close()
+
+
+def difference_tests(df, by='City', between='Gender', levels=('M', 'F'), amount_column='Amount',
+                     resamples=10_000, confidence=0.95, correction='fdr_bh', alpha=0.05, seed=0, workers=None,
+                     task_resamples=500, min_interval_rows=10):
+    """
+    Tests the spending difference of two levels (by default males and females) in every group
+
+    Parameters:
+    df (pandas.DataFrame): transactions, with the ``by`` column (e.g. City, Day Name, Month or Card Type)
+    between (str): the column whose two ``levels`` are compared; differences are the first minus the second
+    resamples (int): the number of permutations, and of bootstraps; the adjusted intervals of many groups reach
+        far into the tails, which take about ``2 * groups / (1 - confidence)`` resamples to estimate
+    confidence (float): the coverage of the bootstrap intervals of the Mean_Difference, as a family
+    correction (str): the multiple comparison correction of the p-values and the intervals, see
+        ``adjust_p_values`` and ``interval_confidence``
+    alpha (float): the adjusted p-value below which a group is marked significant
+    seed (int): the seed of the resamples; the same seed gives the same results with any ``workers``
+    workers (int): worker processes, defaults to the number of CPUs; 1 runs in this process
+    task_resamples (int): the resamples of one pool task
+    min_interval_rows (int): the fewest transactions of each level for a group to get an interval
+
+    Returns:
+    pandas.DataFrame: one row per group where both levels spend, with the group, Male_Amount,
+    Female_Amount and Difference (named after the Gender levels), the Mean_Difference per
+    transaction with its Mean_Difference_Low and Mean_Difference_High bootstrap interval, its
+    permutation P_Value and Adjusted_P, and whether it is Significant; the interval is NaN for groups
+    below ``min_interval_rows``, and ``attrs['interval_confidence']`` holds the adjusted confidence of
+    a single interval
+    """
+
+    arrays, labels = _layout(df, by, between, levels, amount_column)
+    if not len(labels):
+        raise ValueError(f'no {by} has transactions of both {levels[0]!r} and {levels[1]!r}')
+
+    starts, firsts = arrays['starts'], arrays['firsts']
+    totals = np.add.reduceat(arrays['amounts'], starts)
+    first_totals = np.add.reduceat(arrays['amounts'], np.column_stack([starts, starts + firsts]).ravel())[::2]
+    observed = _mean_differences(first_totals, totals, firsts, arrays['sizes'] - firsts)
+
+    tasks = range(0, resamples, task_resamples)
+    seeds = np.random.SeedSequence(seed).spawn(len(tasks))
+    workers = workers or os.cpu_count()
+    if workers == 1:
+        results = [_resample(arrays, task_seed, min(task_resamples, resamples - offset), observed)
+                   for offset, task_seed in zip(tasks, seeds)]
+    else:
+        with SharedColumns(arrays) as shared, ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(_resample_shared, shared.descriptors, task_seed,
+                                   min(task_resamples, resamples - offset), observed)
+                       for offset, task_seed in zip(tasks, seeds)]
+            results = [future.result() for future in futures]
+
+    extreme = sum(task_extreme for task_extreme, _ in results)
+    bootstrapped = np.concatenate([task_bootstrapped for _, task_bootstrapped in results])
+
+    # the observed resample counts too, so a p-value is never 0
+    p_values = (extreme + 1) / (resamples + 1)
+    adjusted = adjust_p_values(p_values, correction)
+    significant = adjusted < alpha
+    level = interval_confidence(confidence, correction, len(labels), int(significant.sum()))
+    low, high = np.quantile(bootstrapped, [(1 - level) / 2, (1 + level) / 2], axis=0)
+    too_small = np.minimum(firsts, arrays['sizes'] - firsts) < min_interval_rows
+    low[too_small], high[too_small] = np.nan, np.nan
+
+    names = [f'{"Male" if level == "M" else "Female" if level == "F" else level}_Amount' for level in levels]
+    tests = pd.DataFrame({by: labels.to_numpy(), names[0]: first_totals, names[1]: totals - first_totals})
+    if pd.api.types.is_integer_dtype(df[amount_column]):
+        tests[names] = tests[names].astype('int64')
+    tests['Difference'] = tests[names[0]] - tests[names[1]]
+    tests['Mean_Difference'] = observed
+    tests['Mean_Difference_Low'], tests['Mean_Difference_High'] = low, high
+    tests['P_Value'] = p_values
+    tests['Adjusted_P'] = adjusted
+    tests['Significant'] = significant
+    tests.attrs['interval_confidence'] = level
+
+    return tests
+
+
+def with_significance(gap, tests, on='City'):
+    """
+    Adds the test results of every city to a gender gap table
+
+    ``dominated_areas`` and ``gender_gap_extremes`` keep the added columns, so the
+    female and male dominated tables show which of their gaps are significant.
+
+    Parameters:
+    gap (pandas.DataFrame): a ``gender_gap`` table
+    tests (pandas.DataFrame): the ``difference_tests`` of the same transactions by ``on``
+
+    Returns:
+    pandas.DataFrame: the gap table with the ``SIGNIFICANCE_COLUMNS``; cities without a test
+    (one gender only) have NaN results and are not significant
+    """
+
+    merged = gap.merge(tests[[on, *SIGNIFICANCE_COLUMNS]], on=on, how='left')
+    merged['Significant'] = merged['Significant'].fillna(False).astype(bool)
+
+    return merged
@@ -0,0 +1,234 @@
+"""
+A compact, integer-coded in-memory store of the transactions
+
+Every column is one NumPy array of the smallest type that holds it: uint16 City
+codes, uint8 Card Type, Exp Type and Gender codes, int32 days since 1970-01-01
+for Date and int64 Amount, about 17 bytes per row. Small label indexes decode
+the codes. The date parts the questions group by are looked up from the day
+number through tables covering the date range, so they need no storage.
+"""
+
+import numpy as np
+import pandas as pd
+
+from cceda.dates import DAY_NAME_DTYPE, MONTH_DTYPE
+from cceda.encoding import encode_column, group_totals
+from cceda.questions import QUESTION_FILTERS, QUESTION_GROUPS
+
+# the coded columns and the type of their codes
+CODE_DTYPES = {'City': 'uint16', 'Card Type': 'uint8', 'Exp Type': 'uint8', 'Gender': 'uint8'}
+
+# the signed types pandas categoricals use for codes; the unsigned codes are viewed as these
+_SIGNED = {'uint8': 'int8', 'uint16': 'int16'}
+
+# the date parts that can be filtered and grouped on
+DATE_PARTS = ['Year', 'Month', 'Day Number', 'Day Name', 'Quarter']
+
+
+class TransactionStore:
+    """
+    The transactions as typed arrays plus the labels that decode them
+
+    Attributes:
+    codes (dict): coded column name to its unsigned code array
+    labels (dict): coded column name to a pandas.Index of its labels
+    days (numpy.ndarray): int32 days since 1970-01-01 of every transaction
+    amount (numpy.ndarray): int64 Amount of every transaction
+    """
+
+    def __init__(self, codes, labels, days, amount):
+        self.codes = codes
+        self.labels = labels
+        self.days = days
+        self.amount = amount
+        self._date_parts = None
+
+    @classmethod
+    def from_frame(cls, df):
+        """
+        Builds a store from a transactions frame with a datetime64 Date column
+
+        Returns:
+        TransactionStore: the store of the frame's rows, in the same order
+        """
+
+        codes, labels = {}, {}
+        for column, dtype in CODE_DTYPES.items():
+            column_codes, labels[column] = encode_column(df[column], dtype='int64')
+            if len(column_codes) and column_codes.min() < 0:
+                raise ValueError(f'{column} has missing values, which the store cannot encode')
+
+            # the largest code must also stay a valid signed code for zero-copy categoricals
+            if len(labels[column]) > np.iinfo(_SIGNED[dtype]).max:
+                raise ValueError(f'{column} has {len(labels[column])} distinct values, too many for {dtype}')
+            codes[column] = column_codes.astype(dtype)
+
+        dates = df['Date'].to_numpy()
+        if np.isnat(dates).any():
+            raise ValueError('Date has missing values, which the store cannot encode')
+        days = dates.astype('datetime64[D]').astype('int64').astype('int32')
+
+        return cls(codes, labels, days, df['Amount'].to_numpy().astype('int64', copy=False))
+
+    def __len__(self):
+        return len(self.amount)
+
+    @property
+    def nbytes(self):
+        """
+        Returns the memory held by the arrays and the labels, in bytes
+        """
+
+        arrays = [*self.codes.values(), self.days, self.amount]
+        labels = sum(index.memory_usage(deep=True) for index in self.labels.values())
+
+        return sum(array.nbytes for array in arrays) + labels
+
+    def _date_lookups(self):
+        # tables from (day - first day) to the code of every date part, built once per store
+        if self._date_parts is None:
+            first = int(self.days.min()) if len(self.days) else 0
+            last = int(self.days.max()) if len(self.days) else -1
+            dates = pd.DatetimeIndex(np.arange(first, last + 1).astype('datetime64[D]'))
+            year_codes, years = pd.factorize(dates.year, sort=True)
+
+            self._date_parts = first, {
+                'Year': (year_codes, pd.Index(years)),
+                'Month': (dates.month.to_numpy() - 1, pd.CategoricalIndex(MONTH_DTYPE.categories,
+                                                                           dtype=MONTH_DTYPE)),
+                'Day Number': (dates.day.to_numpy() - 1, pd.Index(np.arange(1, 32))),
+                'Day Name': (dates.dayofweek.to_numpy(), pd.CategoricalIndex(DAY_NAME_DTYPE.categories,
+                                                                             dtype=DAY_NAME_DTYPE)),
+                'Quarter': (dates.quarter.to_numpy() - 1, pd.Index(np.arange(1, 5))),
+            }
+
+        return self._date_parts
+
+    def column(self, name):
+        """
+        Returns the codes of a coded column or a date part, with the labels they point into
+
+        Returns:
+        tuple: the codes of every row (numpy.ndarray) and the labels (pandas.Index)
+        """
+
+        if name in self.codes:
+            return self.codes[name], self.labels[name]
+
+        if name in DATE_PARTS:
+            first, lookups = self._date_lookups()
+            lookup, labels = lookups[name]
+            return lookup[self.days - first], labels
+
+        raise KeyError(f'{name} is not a column of the store')
+
+    def mask(self, where):
+        """
+        Selects rows by label, e.g. {'Gender': ['F'], 'Day Number': [29, 30, 31]}
+
+        Returns:
+        numpy.ndarray: one boolean per row, True when every condition holds
+        """
+
+        keep = np.ones(len(self), dtype=bool)
+        for name, values in where.items():
+            codes, labels = self.column(name)
+            # the labels are translated to codes once, then the rows are tested on small integers
+            wanted = np.zeros(len(labels), dtype=bool)
+            wanted[labels.isin(list(values))] = True
+            keep &= wanted[codes]
+
+        return keep
+
+    def filter(self, where):
+        """
+        Keeps the rows matching every condition of ``where``, see ``mask``
+
+        Returns:
+        TransactionStore: a new store over the selected rows, sharing the labels
+        """
+
+        keep = self.mask(where)
+
+        return TransactionStore({column: codes[keep] for column, codes in self.codes.items()},
+                                self.labels, self.days[keep], self.amount[keep])
+
+    def total(self, by, where=None):
+        """
+        Totals Amount per group, like ``groupby(by, observed=True)['Amount'].sum()``
+
+        Parameters:
+        by (list): coded columns and date parts, e.g. ['Month', 'Card Type']
+        where (dict): optional row filter, see ``mask``
+
+        Returns:
+        pandas.DataFrame: the group columns followed by Amount, one row per observed group,
+        sorted by the groups
+        """
+
+        axes = [self.column(name) for name in by]
+        codes = [column_codes for column_codes, _ in axes]
+        amount = self.amount
+        if where:
+            keep = self.mask(where)
+            codes, amount = [column_codes[keep] for column_codes in codes], amount[keep]
+
+        shape = tuple(len(labels) for _, labels in axes)
+        size = int(np.prod(shape))
+        keys = np.ravel_multi_index(codes, shape)
+
+        totals = group_totals(keys, amount, size)
+        observed = np.flatnonzero(np.bincount(keys, minlength=size))
+
+        table = {}
+        for name, (_, labels), group_codes in zip(by, axes, np.unravel_index(observed, shape)):
+            if isinstance(labels, pd.CategoricalIndex):
+                table[name] = pd.Categorical.from_codes(group_codes, dtype=labels.dtype)
+            else:
+                table[name] = labels[group_codes].to_numpy()
+        table['Amount'] = totals[observed]
+
+        return pd.DataFrame(table)
+
+    def question_table(self, name):
+        """
+        Answers one of the question tables of ``cceda.questions`` from the store
+
+        Returns:
+        pandas.DataFrame: the group columns and the total Amount
+        """
+
+        return self.total(QUESTION_GROUPS[name], where=QUESTION_FILTERS.get(name))
+
+    def question_tables(self):
+        """
+        Answers every question table from the store
+
+        Returns:
+        dict: table name to table
+        """
+
+        return {name: self.question_table(name) for name in QUESTION_GROUPS}
+
+    def to_frame(self):
+        """
+        Converts the store into a transactions DataFrame
+
+        The coded columns become categoricals whose codes are views of the store's
+        arrays and Amount is shared as is, so only Date is copied (widened to
+        datetime64).
+
+        Returns:
+        pandas.DataFrame: City, Date, Card Type, Exp Type, Gender and Amount
+        """
+
+        columns = {}
+        for column, codes in self.codes.items():
+            signed = codes.view(_SIGNED[CODE_DTYPES[column]])
+            columns[column] = pd.Categorical.from_codes(signed, categories=self.labels[column], validate=False)
+        columns['Date'] = self.days.astype('datetime64[D]').astype('datetime64[ns]')
+        columns['Amount'] = self.amount
+
+        order = ['City', 'Date', 'Card Type', 'Exp Type', 'Gender', 'Amount']
+
+        return pd.DataFrame({column: columns[column] for column in order}, copy=False)
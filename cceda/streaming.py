@@ -0,0 +1,259 @@
+"""
+Out-of-core execution of the analysis over transaction files larger than memory
+
+The file is read in bounded chunks. Every chunk only updates small partial
+aggregates (value counts, counts of each distinct Amount and Date, the question
+tables and a HyperLogLog of the cities) which are merged as they arrive, so the
+peak memory depends on the chunk size and not on the size of the file. A memory
+budget is turned into a chunk size after deducting what the process already
+holds. The results equal those of the in-memory path: value counts,
+describe(include='all') of the loaded frame and the Q1-Q5 tables.
+
+The question tables are kept by raw City text and the cities are cleaned once,
+when the tables are requested, with one ``CityNormalizer`` weighted by the rows
+of the whole stream, so every chunk gets the canonical spelling the in-memory
+path chooses.
+"""
+
+import numpy as np
+import pandas as pd
+
+from cceda.cities import CityNormalizer
+from cceda.dates import DateColumnsExtractor
+from cceda.instrument import rss_mb
+from cceda.loader import iter_transaction_chunks
+from cceda.questions import QUESTION_GROUPS, question_table
+from cceda.schema import CATEGORICAL_COLUMNS, COLUMNS, SAMPLE_CSV
+from cceda.sketches import HyperLogLog
+
+# rough peak bytes needed per csv row while a chunk is parsed and prepared
+ROW_BYTES_ESTIMATE = 600
+
+# the memory kept for the partial aggregates and the buffers of the csv reader, besides the chunk
+AGGREGATES_MB = 32
+
+# the smallest chunk worth reading
+MIN_CHUNKSIZE = 5_000
+
+# the quantiles reported by describe
+PERCENTILES = (0.25, 0.5, 0.75)
+
+
+def chunksize_for_budget(memory_limit_mb, used_mb=None):
+    """
+    Converts a memory budget for the whole process into the number of rows read per chunk
+
+    Parameters:
+    memory_limit_mb (float): the peak memory the process may reach
+    used_mb (float): the memory the process already holds, its current RSS by default
+
+    Returns:
+    int: the chunk size
+    """
+
+    if used_mb is None:
+        used_mb = rss_mb()
+
+    available_mb = memory_limit_mb - used_mb - AGGREGATES_MB
+    chunksize = int(available_mb * 2**20 // ROW_BYTES_ESTIMATE)
+    if chunksize < MIN_CHUNKSIZE:
+        raise ValueError(f'a memory limit of {memory_limit_mb:g} MB leaves no room for chunks: the process '
+                         f'already holds {used_mb:.0f} MB and the aggregates need {AGGREGATES_MB} MB')
+
+    return chunksize
+
+
+def _add_counts(total, counts):
+    # merges two count series, keeping integer counts
+    if total is None:
+        return counts
+    return total.add(counts, fill_value=0).astype('int64')
+
+
+def _quantile(values, counts, q):
+    # linear interpolation between the two closest ranks, like pandas does,
+    # computed from the sorted distinct values and their counts
+    cumulative = np.cumsum(counts)
+    position = (cumulative[-1] - 1) * q
+    lower = int(np.floor(position))
+    below = values[np.searchsorted(cumulative, lower, side='right')]
+    above = values[np.searchsorted(cumulative, min(lower + 1, cumulative[-1] - 1), side='right')]
+
+    return below + (position - lower) * (above - below)
+
+
+class StreamingAnalysis:
+    """
+    Partial aggregates of a transactions file, updated chunk by chunk
+
+    Parameters:
+    chunksize (int): rows read per chunk
+    memory_limit_mb (float): alternatively, the peak memory of the process the chunk size is derived from
+    city_memo (str or Path): optional json file memoizing the cleaned city names between runs
+    """
+
+    def __init__(self, chunksize=None, memory_limit_mb=256, city_memo=None):
+        self.chunksize = chunksize or chunksize_for_budget(memory_limit_mb)
+        self.city_memo = city_memo
+        self.rows = 0
+        self.counts = {column: None for column in CATEGORICAL_COLUMNS}
+        self.amount_counts = None
+        self.date_counts = None
+        self.tables = {}
+        self.city_sketch = HyperLogLog()
+
+    def update(self, chunk):
+        """
+        Adds one typed chunk (as read by the loader) to the partial aggregates
+
+        Returns:
+        StreamingAnalysis: this analysis
+        """
+
+        self.rows += len(chunk)
+
+        for column in CATEGORICAL_COLUMNS:
+            counts = chunk[column].value_counts()
+            counts.index = counts.index.astype(object)
+            self.counts[column] = _add_counts(self.counts[column], counts[counts > 0])
+
+        # the distinct amounts and dates are bounded, so their exact counts stay small
+        self.amount_counts = _add_counts(self.amount_counts, chunk['Amount'].value_counts())
+        self.date_counts = _add_counts(self.date_counts, chunk['Date'].value_counts())
+        self.city_sketch.update(chunk['City'])
+
+        # City stays raw here; it is cleaned once for the whole stream in question_tables
+        prepared = DateColumnsExtractor().extract_all(chunk.copy(), 'Date')
+        for name, columns in QUESTION_GROUPS.items():
+            partial = question_table(prepared, name)
+            if name in self.tables:
+                partial = pd.concat([self.tables[name], partial], ignore_index=True) \
+                    .groupby(columns, as_index=False, observed=True)['Amount'].sum()
+            self.tables[name] = partial
+
+        return self
+
+    def merge(self, other):
+        """
+        Combines the partial aggregates of another analysis (e.g. of another file part) into this one
+
+        Returns:
+        StreamingAnalysis: this analysis
+        """
+
+        self.rows += other.rows
+        for column in CATEGORICAL_COLUMNS:
+            self.counts[column] = _add_counts(self.counts[column], other.counts[column])
+        self.amount_counts = _add_counts(self.amount_counts, other.amount_counts)
+        self.date_counts = _add_counts(self.date_counts, other.date_counts)
+        self.city_sketch.merge(other.city_sketch)
+
+        for name, columns in QUESTION_GROUPS.items():
+            if name in other.tables:
+                tables = [table for table in (self.tables.get(name), other.tables[name]) if table is not None]
+                self.tables[name] = pd.concat(tables, ignore_index=True) \
+                    .groupby(columns, as_index=False, observed=True)['Amount'].sum()
+
+        return self
+
+    def run(self, path=SAMPLE_CSV):
+        """
+        Streams a whole transactions csv through the analysis
+
+        Returns:
+        StreamingAnalysis: this analysis
+        """
+
+        for chunk in iter_transaction_chunks(path, self.chunksize):
+            self.update(chunk)
+
+        return self
+
+    def value_counts(self, column):
+        """
+        Returns the value counts of a categorical column, most frequent first
+        """
+
+        counts = self.counts[column].sort_values(ascending=False, kind='stable')
+        counts.index.name = column
+
+        return counts.rename('count')
+
+    def question_tables(self):
+        """
+        Returns the Q1-Q5 tables of the whole file
+
+        Returns:
+        dict: table name to table
+        """
+
+        # the raw cities are cleaned with the votes of every streamed row, like normalize_cities on the whole file
+        raw = self.counts['City']
+        normalizer = CityNormalizer(self.city_memo)
+        cleaned = dict(zip(raw.index.astype(str), normalizer.clean_names(raw.index.tolist(), raw.to_numpy())))
+        normalizer.save()
+        city_dtype = pd.CategoricalDtype(sorted(set(cleaned.values())))
+
+        tables = {}
+        for name, table in self.tables.items():
+            if 'City' in table:
+                # raw spellings of one city are totalled together
+                table = table.assign(City=pd.Categorical(table['City'].astype(str).map(cleaned), dtype=city_dtype)) \
+                    .groupby(QUESTION_GROUPS[name], as_index=False, observed=True)['Amount'].sum()
+            tables[name] = table
+
+        return tables
+
+    @property
+    def distinct_cities_estimate(self):
+        """
+        Returns the HyperLogLog estimate of the number of distinct cities
+        """
+
+        return self.city_sketch.estimate()
+
+    def describe(self):
+        """
+        Builds the same summary as ``describe(include="all")`` of the loaded frame
+
+        Returns:
+        pandas.DataFrame: count, unique, top and freq of the categorical columns, and
+        mean, min, quartiles, max (and std for Amount) of Date and Amount
+        """
+
+        summary = {}
+        for column in COLUMNS:
+            if column in CATEGORICAL_COLUMNS:
+                counts = self.value_counts(column)
+                summary[column] = pd.Series({'count': counts.sum(), 'unique': len(counts),
+                                             'top': counts.index[0], 'freq': counts.iloc[0]}, dtype=object)
+            elif column == 'Date':
+                counts = self.date_counts.sort_index()
+                nanoseconds = counts.index.to_numpy().view('int64')
+                weights = counts.to_numpy()
+
+                # the mean is computed with python integers, which cannot overflow
+                mean = sum(int(value) * int(weight) for value, weight in zip(nanoseconds, weights)) // int(weights.sum())
+                values = {'count': weights.sum(), 'mean': pd.Timestamp(mean),
+                          'min': counts.index[0]}
+                for q in PERCENTILES:
+                    values[f'{q:.0%}'] = pd.Timestamp(int(round(_quantile(nanoseconds.astype('float64'), weights, q))))
+                values['max'] = counts.index[-1]
+                summary[column] = pd.Series(values, dtype=object)
+            else:
+                counts = self.amount_counts.sort_index()
+                amounts = counts.index.to_numpy().astype('float64')
+                weights = counts.to_numpy()
+                total = weights.sum()
+                mean = np.dot(amounts, weights) / total
+
+                values = {'count': float(total), 'mean': mean, 'min': amounts[0]}
+                for q in PERCENTILES:
+                    values[f'{q:.0%}'] = _quantile(amounts, weights, q)
+                values['max'] = amounts[-1]
+                values['std'] = np.sqrt(np.dot(weights, (amounts - mean) ** 2) / (total - 1))
+                summary[column] = pd.Series(values)
+
+        index = ['count', 'unique', 'top', 'freq', 'mean', 'min', '25%', '50%', '75%', 'max', 'std']
+
+        return pd.DataFrame(summary).reindex(index)
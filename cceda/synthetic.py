@@ -0,0 +1,41 @@
+"""
+Synthetic transaction files modelled on the sample csv, for benchmarking
+"""
+
+import numpy as np
+
+from cceda.schema import SAMPLE_CSV
+
+
+def write_synthetic_csv(path, n_rows, seed=0, source=SAMPLE_CSV, chunksize=1_000_000):
+    """
+    Writes a csv of ``n_rows`` transactions resampled from the sample file
+
+    Whole rows of the sample are drawn with replacement, so the City skew, the
+    card/expense/gender mix, the date range and the Amount distribution all
+    follow the sample. The drawn rows are copied as raw text with a new index,
+    which needs no parsing or formatting, and written chunk by chunk.
+
+    Returns:
+    str: the path that was written
+    """
+
+    with open(source, newline='') as handle:
+        header = handle.readline()
+        # every line without its index, e.g. '"Delhi, India",29-Oct-14,Gold,Bills,F,82475'
+        rows = np.array([line.split(',', 1)[1] for line in handle.read().splitlines()], dtype=object)
+
+    rng = np.random.default_rng(seed)
+
+    written = 0
+    with open(path, 'w', newline='') as handle:
+        handle.write(header)
+        while written < n_rows:
+            size = min(chunksize, n_rows - written)
+
+            # drawing random rows of the sample for this chunk
+            chunk = rows[rng.integers(0, len(rows), size)]
+            handle.write(''.join(f'{index},{row}\n' for index, row in zip(range(written, written + size), chunk)))
+            written += size
+
+    return path
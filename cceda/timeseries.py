@@ -0,0 +1,198 @@
+"""
+Amount as time series: resampling by day, week or month per group of transactions
+
+A resample turns the transactions into one wide table: a row per period of a
+continuous DatetimeIndex (periods without transactions hold 0) and a column per
+group, e.g. per card type or per city. Every group is resampled at once: the
+rows are given a period code and a group code, and Amount is totalled over the
+combined code with a single ``group_totals``. Rolling, expanding and
+year-over-year statistics are then computed on all the columns together.
+"""
+
+import numpy as np
+import pandas as pd
+
+from cceda.encoding import encode_column, group_totals
+
+# granularity name to the pandas frequency of the period starts (weeks start on Monday)
+FREQUENCIES = {'day': 'D', 'week': 'W-MON', 'month': 'MS'}
+
+# periods between a period and the same period one year earlier
+_PERIODS_PER_YEAR = {'week': 52, 'month': 12}
+
+
+def period_starts(dates, freq):
+    """
+    Returns the start of the day, week (Monday) or month each date falls in
+
+    Returns:
+    pandas.DatetimeIndex: one period start per date
+    """
+
+    dates = pd.DatetimeIndex(dates).normalize()
+    if freq == 'day':
+        return dates
+    if freq == 'week':
+        return dates - pd.to_timedelta(dates.dayofweek, unit='D')
+    if freq == 'month':
+        return dates - pd.to_timedelta(dates.day - 1, unit='D')
+
+    raise ValueError(f'unknown frequency {freq!r}; choose from {", ".join(FREQUENCIES)}')
+
+
+class TimeSeriesEngine:
+    """
+    Resamples the Amount of a transactions frame and derives trend statistics
+
+    The frame can be the transactions themselves or any table already totalled
+    per date, e.g. ``cube.rollup(['Date', 'Card Type'])``, since totals of totals
+    are the same. Resampled tables are cached per (groups, frequency), so the
+    statistics below reuse them; treat the returned tables as read-only.
+    """
+
+    def __init__(self, df, date_column='Date', amount_column='Amount'):
+        self.df = df
+        self.amount_column = amount_column
+        self._cache = {}
+
+        # the distinct dates are the only values ever converted
+        self._date_codes, self._dates = pd.factorize(df[date_column], sort=True)
+        if len(self._date_codes) and self._date_codes.min() < 0:
+            raise ValueError(f'{date_column} has missing dates')
+
+    def _periods(self, freq):
+        # the period code of every row and the continuous index of the period starts
+        starts = period_starts(self._dates, freq)
+        index = pd.date_range(starts.min(), starts.max(), freq=FREQUENCIES[freq]) if len(starts) else \
+            pd.DatetimeIndex([], freq=FREQUENCIES[freq])
+
+        return index.get_indexer(starts)[self._date_codes], index
+
+    def resample(self, by=None, freq='month'):
+        """
+        Totals Amount per period and group
+
+        Parameters:
+        by (str or list): the column(s) whose groups become the columns, e.g. 'Card Type' or 'City';
+        None totals all the transactions
+        freq (str): 'day', 'week' or 'month'
+
+        Returns:
+        pandas.DataFrame: one row per period start (a DatetimeIndex without gaps) and one int64
+        column per observed group, or a single Amount column when ``by`` is None
+        """
+
+        columns = [by] if isinstance(by, str) else list(by or [])
+        key = (tuple(columns), freq)
+        if key in self._cache:
+            return self._cache[key]
+
+        period_codes, index = self._periods(freq)
+        amounts = self.df[self.amount_column].to_numpy()
+
+        group_codes, group_labels = [], []
+        for column in columns:
+            codes, labels = encode_column(self.df[column], dtype='int64')
+            group_codes.append(codes)
+            group_labels.append(labels)
+
+        if columns:
+            shape = tuple(len(labels) for labels in group_labels)
+            groups = np.ravel_multi_index(group_codes, shape)
+            size = int(np.prod(shape))
+        else:
+            groups, size = np.zeros(len(amounts), dtype='int64'), 1
+
+        # one total over the combined (period, group) code resamples every group at once
+        keys = period_codes * size + groups
+        totals = group_totals(keys, amounts, len(index) * size)
+        totals = totals.reshape(len(index), size)
+
+        if columns:
+            observed = np.flatnonzero(np.bincount(groups, minlength=size))
+            if len(columns) == 1:
+                labels = group_labels[0][observed]
+            else:
+                labels = pd.MultiIndex.from_arrays(
+                    [group_labels[level][codes] for level, codes in enumerate(np.unravel_index(observed, shape))])
+            labels = labels.set_names(columns)
+            table = pd.DataFrame(totals[:, observed], index=index, columns=labels)
+        else:
+            table = pd.DataFrame({self.amount_column: totals[:, 0]}, index=index)
+
+        table.index.name = 'Date'
+        self._cache[key] = table
+
+        return table
+
+    def long(self, by=None, freq='month'):
+        """
+        Returns a resample as a long table, in period order then group order
+
+        Returns:
+        pandas.DataFrame: the period start (named after ``freq``, e.g. Month), the group columns and Amount
+        """
+
+        table = self.resample(by, freq)
+        name = freq.capitalize()
+        if by is None:
+            return table.rename_axis(name).reset_index()
+
+        return table.rename_axis(index=name).stack(list(range(table.columns.nlevels)), future_stack=True) \
+            .rename(self.amount_column).reset_index()
+
+    def rolling(self, window, stat='mean', by=None, freq='month', min_periods=None):
+        """
+        Rolling statistic of every group's series, e.g. the 3-month moving average
+
+        Parameters:
+        window (int): number of periods in the window
+        stat (str): any pandas rolling aggregation: 'mean', 'sum', 'std', 'min', 'max', 'median'
+
+        Returns:
+        pandas.DataFrame: the statistic, shaped like ``resample(by, freq)``
+        """
+
+        return self.resample(by, freq).rolling(window, min_periods=min_periods).agg(stat)
+
+    def expanding(self, stat='sum', by=None, freq='month', min_periods=1):
+        """
+        Expanding statistic of every group's series, e.g. the running total
+
+        Returns:
+        pandas.DataFrame: the statistic, shaped like ``resample(by, freq)``
+        """
+
+        return self.resample(by, freq).expanding(min_periods=min_periods).agg(stat)
+
+    def year_over_year(self, by=None, freq='month', relative=False):
+        """
+        Change of every group's series against the same period one year earlier
+
+        Parameters:
+        relative (bool): the change as a fraction of last year's value instead of an amount
+
+        Returns:
+        pandas.DataFrame: shaped like ``resample(by, freq)``, NaN where last year is not covered
+        """
+
+        table = self.resample(by, freq)
+        if freq in _PERIODS_PER_YEAR:
+            last_year = table.shift(_PERIODS_PER_YEAR[freq])
+        else:
+            # days are matched on the calendar date, so leap years do not shift the comparison
+            last_year = table.reindex(table.index - pd.DateOffset(years=1))
+            last_year.index = table.index
+
+        delta = table - last_year
+        if relative:
+            return delta / last_year.where(last_year != 0)
+
+        return delta
+
+    def clear_cache(self):
+        """
+        Forgets every cached resample
+        """
+
+        self._cache.clear()
@@ -0,0 +1,297 @@
+"""
+Validation of the transactions csv in one vectorized pass, with a quarantine file for the failing rows
+
+Every rule is checked on the chunks the loader reads anyway:
+
+- the text columns are read as categoricals, so the Card Type, Exp Type and
+  Gender domains, the City format and the parsing and range of the Date are
+  checked once per distinct value and spread to the rows through the codes
+- a City passes when ``clean_city_name`` reduces it to a city name, so the
+  spellings ``CityNormalizer`` cleans later ('Delhi (India)', ' Delhi,  India',
+  'Delhi - IN') are kept, and only values without a usable name fail
+- Amount is compared as an int64 array; a file whose Amount column holds text
+  or decimals is read again from the failing chunk with Amount as text
+
+A row gets one bit per failed rule. Rows with any bit set are appended to the
+quarantine csv with their original text, their reason code (the bits) and the
+names of the failed rules; the other rows come out typed exactly like
+``read_transactions_csv`` returns them. The counts of every rule, and the
+value counts of the categorical columns that the checks compute on the way,
+are kept in ``report``.
+
+Usage:
+    validator = Validator(quarantine_path='quarantine.csv')
+    df = load_transactions(path, validator=validator)
+    validator.report['rules'], validator.value_counts('Card Type')
+"""
+
+import hashlib
+import json
+import logging
+import os
+import warnings
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from cceda.cities import clean_city_name
+from cceda.instrument import stage
+from cceda.schema import (AMOUNT_DTYPE, CARD_TYPES, CATEGORICAL_COLUMNS, COLUMNS, DATE_FORMAT, EXP_TYPES, GENDERS,
+                          INDEX_COLUMN, csv_dtypes)
+
+logger = logging.getLogger(__name__)
+
+# the rules in the order of their bit in the reason code
+RULES = ['card_type_domain', 'exp_type_domain', 'gender_domain', 'city_format', 'date_unparseable',
+         'date_out_of_range', 'amount_invalid', 'amount_negative', 'amount_out_of_range']
+RULE_BITS = {rule: 1 << position for position, rule in enumerate(RULES)}
+
+# the allowed values of the domain columns, and the rule each one reports to
+DOMAINS = {'Card Type': CARD_TYPES, 'Exp Type': EXP_TYPES, 'Gender': GENDERS}
+_DOMAIN_RULES = {'Card Type': 'card_type_domain', 'Exp Type': 'exp_type_domain', 'Gender': 'gender_domain'}
+
+# the city name left once clean_city_name removed the country, e.g. 'Delhi' or 'Jalandhar Cantt.'
+CITY_PATTERN = r"[A-Za-z][A-Za-z.'()&\- ]*"
+
+# the earliest and latest accepted dates; None as the latest is the day of the validation
+DATE_RANGE = ('2000-01-01', None)
+
+# the smallest and largest accepted Amount; below 0 is reported as negative instead
+AMOUNT_RANGE = (1, 10_000_000)
+
+# the columns added to the quarantined rows
+QUARANTINE_COLUMNS = ['Reason Code', 'Reasons']
+
+
+def reason_labels(codes):
+    """
+    Names the failed rules of reason codes
+
+    Returns:
+    numpy.ndarray: one string per code, the names of its rules joined by '|'
+    """
+
+    # a file has few distinct combinations of failures, so each is named once
+    distinct, positions = np.unique(codes, return_inverse=True)
+    names = np.array(['|'.join(rule for rule, bit in RULE_BITS.items() if code & bit) for code in distinct],
+                     dtype=object)
+
+    return names[positions]
+
+
+def _flag_codes(codes, bad_values):
+    # spreads the verdict on every distinct value to the rows; a missing value (code -1) always fails
+    return np.append(bad_values, True)[codes]
+
+
+def _quiet_chunks(reader):
+    # the chunks of a csv reader, without the warning pandas gives before failing on a missing integer
+    while True:
+        with warnings.catch_warnings():
+            warnings.filterwarnings('ignore', 'invalid value encountered in cast', RuntimeWarning)
+            chunk = next(reader, None)
+        if chunk is None:
+            return
+        yield chunk
+
+
+def _read_chunks(path, chunksize):
+    # the chunks of the csv with int64 amounts; from the first chunk whose Amount does not parse as an integer,
+    # the rest of the file is read again with text amounts
+    rows, amount_dtype = 0, AMOUNT_DTYPE
+    while True:
+        reader = pd.read_csv(path, index_col=INDEX_COLUMN, dtype={**csv_dtypes(), 'Amount': amount_dtype},
+                             chunksize=chunksize, skiprows=range(1, rows + 1) if rows else None)
+        with reader:
+            try:
+                # only the reading is guarded: the consumer of a yielded chunk does not raise in here
+                for chunk in _quiet_chunks(reader):
+                    rows += len(chunk)
+                    yield chunk
+                return
+            except ValueError:
+                if amount_dtype != AMOUNT_DTYPE:
+                    raise
+                amount_dtype = object
+
+
+class Validator:
+    """
+    Checks transaction chunks against the rules and quarantines the failing rows
+
+    Parameters:
+    quarantine_path (str or Path): the csv the failing rows are written to; None only counts them
+    domains (dict): column to its allowed values
+    city_pattern (str): the regular expression a whole City value must match once cleaned by ``clean_city_name``
+    date_range (tuple): the earliest and latest accepted dates, as strings; None leaves a side open,
+        except the latest, which defaults to the day of the validation
+    amount_range (tuple): the smallest and largest accepted Amount
+    date_format (str): the format of the Date text
+
+    Attributes:
+    report (dict): the rows, valid and quarantined rows and the count of every rule of the last validation
+    """
+
+    def __init__(self, quarantine_path=None, domains=DOMAINS, city_pattern=CITY_PATTERN, date_range=DATE_RANGE,
+                 amount_range=AMOUNT_RANGE, date_format=DATE_FORMAT):
+        self.quarantine_path = Path(quarantine_path) if quarantine_path is not None else None
+        self.domains = {column: tuple(values) for column, values in domains.items()}
+        self.city_pattern = city_pattern
+        self.date_range = tuple(date_range)
+        self.amount_range = tuple(amount_range)
+        self.date_format = date_format
+        self.report = None
+        self._value_counts = {}
+
+    @property
+    def fingerprint(self):
+        """
+        Returns a short hash of the rules, e.g. to key the snapshot of a validated load
+        """
+
+        rules = json.dumps([self.domains, self.city_pattern, self.date_range, self.amount_range, self.date_format],
+                           default=str)
+
+        return hashlib.blake2b(rules.encode(), digest_size=6).hexdigest()
+
+    def _date_bounds(self):
+        earliest, latest = self.date_range
+        earliest = pd.Timestamp(earliest) if earliest is not None else pd.Timestamp.min
+        latest = pd.Timestamp(latest) if latest is not None else pd.Timestamp.today().normalize()
+
+        return earliest, latest
+
+    def check(self, chunk):
+        """
+        Checks a chunk read with the csv schema (categorical text columns and Date, int64 or text Amount)
+
+        Returns:
+        tuple: the reason code of every row (0 for a valid row) and the parsed Date of every row
+        """
+
+        reasons = np.zeros(len(chunk), dtype=np.uint16)
+
+        def fail(rule, bad):
+            reasons[bad] |= RULE_BITS[rule]
+
+        # the categorical columns are checked on their categories only
+        for column, allowed in self.domains.items():
+            values = chunk[column]
+            fail(_DOMAIN_RULES[column], _flag_codes(values.cat.codes.to_numpy(), ~values.cat.categories.isin(allowed)))
+
+        cities = chunk['City']
+        names = pd.Index([clean_city_name(name) for name in cities.cat.categories])
+        well_formed = names.str.fullmatch(self.city_pattern)
+        fail('city_format', _flag_codes(cities.cat.codes.to_numpy(), ~np.asarray(well_formed, dtype=bool)))
+
+        # the distinct dates are parsed once; a missing or unparseable date fails the same rule
+        dates = chunk['Date']
+        codes = dates.cat.codes.to_numpy()
+        parsed = pd.to_datetime(pd.Index(dates.cat.categories), format=self.date_format, errors='coerce')
+        earliest, latest = self._date_bounds()
+        fail('date_unparseable', _flag_codes(codes, np.asarray(parsed.isna())))
+        fail('date_out_of_range', np.append(np.asarray((parsed < earliest) | (parsed > latest)), False)[codes])
+        parsed_dates = np.append(parsed.to_numpy().astype('datetime64[ns]'), np.datetime64('NaT', 'ns'))[codes]
+
+        amounts = chunk['Amount']
+        if amounts.dtype != AMOUNT_DTYPE:
+            # text amounts: anything that is not a whole number fails
+            numbers = pd.to_numeric(amounts, errors='coerce').to_numpy(dtype=np.float64)
+            invalid = ~np.isfinite(numbers) | (numbers != np.round(numbers))
+            fail('amount_invalid', invalid)
+            # an invalid amount is not also reported as negative or out of range
+            amounts = np.where(invalid, self.amount_range[0], numbers)
+        else:
+            amounts = amounts.to_numpy()
+        lowest, highest = self.amount_range
+        fail('amount_negative', amounts < 0)
+        fail('amount_out_of_range', (amounts >= 0) & ((amounts < lowest) | (amounts > highest)))
+
+        return reasons, parsed_dates
+
+    def _count_values(self, chunk, valid):
+        # the value counts of the categorical columns over the valid rows, added up across chunks
+        for column in CATEGORICAL_COLUMNS:
+            values = chunk[column]
+            codes = values.cat.codes.to_numpy()[valid]
+            counts = pd.Series(np.bincount(codes, minlength=len(values.cat.categories)),
+                               index=values.cat.categories.astype(str))
+            known = self._value_counts.get(column)
+            self._value_counts[column] = counts if known is None else known.add(counts, fill_value=0).astype('int64')
+
+    def iter_csv(self, path, chunksize=1_000_000):
+        """
+        Reads and validates a transactions csv chunk by chunk
+
+        The quarantine file is written next to its final name and moved into place
+        once the whole file has been read; ``report`` is complete at that point.
+
+        Returns:
+        Iterator[pandas.DataFrame]: the valid rows of every chunk, typed like ``read_transactions_csv``
+        """
+
+        counts = np.zeros(len(RULES), dtype=np.int64)
+        rows = quarantined = 0
+        self._value_counts = {}
+        bits = np.array(list(RULE_BITS.values()), dtype=np.uint16)
+
+        quarantine, temporary = None, None
+        if self.quarantine_path is not None:
+            self.quarantine_path.parent.mkdir(parents=True, exist_ok=True)
+            temporary = self.quarantine_path.with_name(self.quarantine_path.name + '.tmp')
+            quarantine = open(temporary, 'w', newline='')
+            pd.DataFrame(columns=[INDEX_COLUMN] + COLUMNS + QUARANTINE_COLUMNS).to_csv(quarantine, index=False)
+
+        with stage('validate') as span:
+            try:
+                for chunk in _read_chunks(path, chunksize):
+                    reasons, dates = self.check(chunk)
+                    rows += len(chunk)
+                    valid = reasons == 0
+
+                    if not valid.all():
+                        failed = ~valid
+                        counts += np.count_nonzero(reasons[failed, None] & bits, axis=0)
+                        quarantined += int(failed.sum())
+                        if quarantine is not None:
+                            rejected = chunk[failed].astype(object)
+                            rejected['Reason Code'] = reasons[failed]
+                            rejected['Reasons'] = reason_labels(reasons[failed])
+                            rejected.to_csv(quarantine, header=False)
+
+                    self._count_values(chunk, valid)
+                    chunk = chunk[valid].copy() if not valid.all() else chunk
+                    chunk['Date'] = dates[valid]
+                    if chunk['Amount'].dtype != AMOUNT_DTYPE:
+                        # the valid text amounts are whole numbers, e.g. '12' or '12.0'
+                        chunk['Amount'] = pd.to_numeric(chunk['Amount']).astype(AMOUNT_DTYPE)
+                    yield chunk
+            finally:
+                if quarantine is not None:
+                    quarantine.close()
+
+            if quarantine is not None:
+                os.replace(temporary, self.quarantine_path)
+
+            self.report = {'rows': rows, 'valid': rows - quarantined, 'quarantined': quarantined,
+                           'rules': dict(zip(RULES, counts.tolist())),
+                           'quarantine': str(self.quarantine_path) if self.quarantine_path is not None else None,
+                           'value_counts': {column: counts.to_dict() for column, counts in self._value_counts.items()}}
+            span.set(rows=rows, quarantined=quarantined)
+
+        failed_rules = ', '.join(f'{rule}: {count}' for rule, count in self.report['rules'].items() if count)
+        logger.info('validated %d rows, %d quarantined%s', rows, quarantined,
+                    f' ({failed_rules})' if failed_rules else '')
+
+    def value_counts(self, column):
+        """
+        Returns the value counts of a categorical column over the valid rows of the last validation
+
+        Returns:
+        pandas.Series: the count of every value, largest first, like ``Series.value_counts``
+        """
+
+        counts = pd.Series(self.report['value_counts'][column], name='count', dtype='int64')
+
+        return counts[counts > 0].sort_values(ascending=False, kind='stable').rename_axis(column)
@@ -0,0 +1,30 @@
+"""
+The original notebook cells the engines are checked against, shared by the tests and the benchmarks
+"""
+
+
+def legacy_gender_gap(df):
+    # the original Question 1 cells: split, merge and a boolean mask per city
+    gender_group = df.groupby(['City', 'Gender'], as_index=False)['Amount'].sum()
+
+    male = gender_group[gender_group['Gender'] == 'M'].drop('Gender', axis=1)
+    male = male.rename(columns={'Amount': 'Male_Amount'})
+    female = gender_group[gender_group['Gender'] == 'F'].drop('Gender', axis=1)
+    female = female.rename(columns={'Amount': 'Female_Amount'})
+    total = male.merge(female, on='City')
+
+    differences = []
+    for city in total.City.unique():
+        differences.append(int(total[total.City == city]['Male_Amount'].iloc[0])
+                           - int(total[total.City == city]['Female_Amount'].iloc[0]))
+    total['Difference'] = differences
+
+    female_areas = total[total['Difference'] < 0]
+    male_areas = total[total['Difference'] > 0]
+
+    return total, {
+        'female_top': female_areas.sort_values(by='Difference')[['City', 'Difference']].head(10),
+        'female_bottom': female_areas.sort_values(by='Difference', ascending=False)[['City', 'Difference']].head(5),
+        'male_top': male_areas.sort_values(by='Difference', ascending=False)[['City', 'Difference']].head(10),
+        'male_bottom': male_areas.sort_values(by='Difference')[['City', 'Difference']].head(5),
+    }
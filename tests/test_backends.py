@@ -0,0 +1,55 @@
+"""
+Question table backends: every installed engine computes the tables of the pandas reference
+"""
+
+import importlib.util
+
+import pytest
+
+from cceda.backends import BACKENDS, PandasBackend, QueryBackend, assert_backends_agree
+from cceda.questions import QUESTION_GROUPS
+from cceda.schema import SAMPLE_CSV
+from cceda.synthetic import write_synthetic_csv
+
+# the lazy backends whose engine is installed; without any, their tests are reported as skipped
+LAZY_BACKENDS = [name for name, backend in BACKENDS.items()
+                 if backend.requires is not None and importlib.util.find_spec(backend.requires) is not None]
+
+
+@pytest.mark.parametrize('name', LAZY_BACKENDS)
+def test_backend_agrees_with_pandas_on_the_sample(name):
+    tables = assert_backends_agree([PandasBackend(SAMPLE_CSV, use_cache=False), BACKENDS[name](SAMPLE_CSV)])
+
+    assert sorted(tables) == sorted(QUESTION_GROUPS)
+
+
+@pytest.mark.parametrize('name', LAZY_BACKENDS)
+def test_backend_agrees_with_pandas_on_synthetic_data(name, tmp_path):
+    path = write_synthetic_csv(tmp_path / 'synthetic.csv', 20_000, seed=3)
+
+    assert_backends_agree([PandasBackend(path, use_cache=False), BACKENDS[name](path)])
+
+
+@pytest.mark.parametrize('name', LAZY_BACKENDS)
+def test_backend_cleans_city_spellings_like_pandas(name, tmp_path):
+    # spellings of one city that the cleaning merges, with the canonical one in the minority at first
+    path = tmp_path / 'spellings.csv'
+    path.write_text('index,City,Date,Card Type,Exp Type,Gender,Amount\n'
+                    '0,"Navi MUMBAI, India",29-Oct-14,Gold,Bills,F,100\n'
+                    '1,"Navi Mumbai, India",30-Oct-14,Gold,Bills,M,10\n'
+                    '2,"Navi Mumbai, India",31-Oct-14,Silver,Food,M,20\n'
+                    '3,Navi Mumbai (India),01-Nov-14,Silver,Food,F,30\n'
+                    '4,"Delhi, India",31-Dec-14,Gold,Fuel,F,40\n')
+
+    tables = assert_backends_agree([PandasBackend(path, use_cache=False), BACKENDS[name](path)], ['city'])
+
+    assert dict(zip(tables['city']['City'].astype(str), tables['city']['Amount'])) == {'Delhi': 40,
+                                                                                       'Navi Mumbai': 160}
+
+
+def test_an_incomplete_backend_fails_when_created():
+    class Incomplete(QueryBackend):
+        name = 'incomplete'
+
+    with pytest.raises(TypeError):
+        Incomplete()
@@ -0,0 +1,38 @@
+"""
+Partitioned dataset: Month filters by name and Year filters by integer, and a clear error for anything else
+"""
+
+import pytest
+
+from cceda.dataset import PartitionedDataset, write_dataset
+from cceda.loader import read_transactions_csv
+from cceda.schema import SAMPLE_CSV
+
+
+@pytest.fixture(scope='module')
+def dataset(tmp_path_factory):
+    return PartitionedDataset(write_dataset(read_transactions_csv(SAMPLE_CSV), tmp_path_factory.mktemp('dataset')))
+
+
+def test_month_filter_by_name(dataset):
+    rows = dataset.scan(['Date'], where={'Month': ['December']})
+
+    assert len(rows) and (rows['Date'].dt.month == 12).all()
+
+
+@pytest.mark.parametrize('month', [12, '12', 'Dec'])
+def test_month_filter_rejects_other_values(dataset, month):
+    with pytest.raises(ValueError, match='choose from January'):
+        dataset.scan(['Date'], where={'Month': [month]})
+
+
+def test_year_filter_by_integer(dataset):
+    rows = dataset.scan(['Date'], where={'Year': [2014]})
+
+    assert len(rows) and (rows['Date'].dt.year == 2014).all()
+
+
+@pytest.mark.parametrize('year', ['2014', 2014.0, None])
+def test_year_filter_rejects_other_values(dataset, year):
+    with pytest.raises(ValueError, match='integer years'):
+        dataset.scan(['Date'], where={'Year': [year]})
@@ -0,0 +1,73 @@
+"""
+Duplicate detection: flags against pandas, saved histories, and missing values across batches
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from cceda.dedup import DEDUP_COLUMNS, IN_BATCH, IN_HISTORY, UNIQUE, Deduplicator, row_hashes
+from cceda.loader import read_transactions_csv
+from cceda.schema import SAMPLE_CSV
+
+
+@pytest.fixture(scope='module')
+def transactions():
+    return read_transactions_csv(SAMPLE_CSV)
+
+
+def with_repeats(df, repeats, seed):
+    # the rows with some of them repeated, shuffled
+    rng = np.random.default_rng(seed)
+    repeated = pd.concat([df, df.iloc[rng.integers(0, len(df), repeats)]])
+
+    return repeated.iloc[rng.permutation(len(repeated))]
+
+
+def test_flags_match_pandas(transactions):
+    first = with_repeats(transactions.iloc[:5_000], 500, seed=0)
+    # half of the second batch was in the first one
+    second = with_repeats(transactions.iloc[2_500:7_500], 500, seed=1)
+
+    deduplicator = Deduplicator()
+    unique, report = deduplicator.apply(first)
+    assert len(unique) == (~first.duplicated(keep='first')).sum() == report['unique']
+    assert report['duplicates_in_batch'] == first.duplicated(keep='first').sum()
+
+    flags = deduplicator.flags(second)
+    in_history = pd.MultiIndex.from_frame(second[DEDUP_COLUMNS]).isin(pd.MultiIndex.from_frame(first[DEDUP_COLUMNS]))
+    expected = np.where(in_history, IN_HISTORY, np.where(second.duplicated(keep='first'), IN_BATCH, UNIQUE))
+    np.testing.assert_array_equal(flags, expected)
+
+
+@pytest.mark.parametrize('bloom_capacity', [None, 100_000])
+def test_saved_history_is_reloaded(transactions, tmp_path, bloom_capacity):
+    first, second = transactions.iloc[:5_000], transactions.iloc[5_000:10_000]
+
+    deduplicator = Deduplicator(tmp_path / 'dedup', bloom_capacity=bloom_capacity)
+    deduplicator.apply(first)
+    deduplicator.save()
+
+    reloaded = Deduplicator(tmp_path / 'dedup', bloom_capacity=bloom_capacity)
+    assert reloaded.batches == 1
+    assert type(reloaded.history) is type(deduplicator.history)
+    assert (reloaded.flags(first) == IN_HISTORY).all()
+    # the sample has a few repeated rows of its own, and a Bloom filter may rarely report a new row as seen
+    assert (reloaded.flags(second) != IN_HISTORY).mean() > 0.99
+
+
+def test_missing_values_hash_equally_across_batches():
+    def batch(categories):
+        # the same two rows, one without a City, with the City categories of the batch
+        return pd.DataFrame({'City': pd.Categorical([None, 'Delhi, India'], categories=categories),
+                             'Date': pd.to_datetime(['2014-10-29', '2014-10-30']),
+                             'Card Type': pd.Categorical(['Gold', 'Gold']),
+                             'Exp Type': pd.Categorical(['Food', 'Food']),
+                             'Gender': pd.Categorical(['F', 'M']), 'Amount': [100, 200]})
+
+    first, second = batch(['Delhi, India']), batch(['Agra, India', 'Delhi, India', 'Pune, India'])
+    np.testing.assert_array_equal(row_hashes(first), row_hashes(second))
+
+    deduplicator = Deduplicator()
+    deduplicator.apply(first)
+    assert (deduplicator.flags(second) == IN_HISTORY).all()
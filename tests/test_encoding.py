@@ -0,0 +1,28 @@
+"""
+Exact int64 totals over integer codes
+"""
+
+import numpy as np
+import pandas as pd
+
+from cceda.encoding import group_totals
+
+
+def test_totals_are_exact_above_the_float64_integer_range():
+    # 2**53 + 1 has no float64 representation, so a float total would be off by one
+    keys = np.array([0, 0, 2, 2])
+    values = np.array([2**53, 1, 5, -3])
+
+    totals = group_totals(keys, values, 3)
+
+    assert totals.dtype == np.int64
+    assert totals.tolist() == [2**53 + 1, 0, 2]
+
+
+def test_totals_equal_a_pandas_groupby_sum():
+    rng = np.random.default_rng(0)
+    keys, values = rng.integers(0, 50, 10_000), rng.integers(0, 2**50, 10_000)
+
+    expected = pd.Series(values).groupby(keys).sum().reindex(range(50), fill_value=0).to_numpy()
+
+    np.testing.assert_array_equal(group_totals(keys, values, 50), expected)
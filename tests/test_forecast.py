@@ -0,0 +1,27 @@
+"""
+Spend forecasts: the partial first and last months of the data are left out
+"""
+
+import pandas as pd
+
+from cceda.forecast import SpendForecaster
+
+
+def transactions(dates):
+    return pd.DataFrame({'Date': pd.to_datetime(dates), 'Card Type': 'Gold', 'Amount': 100})
+
+
+def test_partial_boundary_months_are_left_out():
+    df = transactions(['2013-10-04', '2013-11-15', '2013-12-31', '2014-01-10', '2014-02-20'])
+
+    series = SpendForecaster(df, by='Card Type').series
+    assert list(series.index) == list(pd.to_datetime(['2013-11-01', '2013-12-01', '2014-01-01']))
+
+    series = SpendForecaster(df, by='Card Type', complete_months_only=False).series
+    assert len(series) == 5
+
+
+def test_complete_boundary_months_are_kept():
+    df = transactions(['2013-10-01', '2013-11-15', '2013-12-31'])
+
+    assert len(SpendForecaster(df, by='Card Type').series) == 3
@@ -0,0 +1,66 @@
+"""
+Question 1 gender gap: equal to the original notebook cells on the sample, and its edge cases on small frames
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from cceda.gender_gap import GAP_COLUMNS, dominated_areas, gender_gap, gender_gap_extremes
+from cceda.schema import INDEX_COLUMN, SAMPLE_CSV
+from tests.legacy import legacy_gender_gap
+
+
+@pytest.fixture(scope='module')
+def sample():
+    # the sample as the original notebook prepared it, the city name without the country
+    df = pd.read_csv(SAMPLE_CSV, index_col=INDEX_COLUMN)
+    df['City'] = df['City'].astype(str).str.split(', ', expand=True)[0]
+
+    return df
+
+
+def test_gap_equals_the_original_notebook_cells(sample):
+    legacy_total, legacy_extremes = legacy_gender_gap(sample)
+    gap = gender_gap(sample)
+
+    pd.testing.assert_frame_equal(gap[legacy_total.columns], legacy_total.reset_index(drop=True))
+    for name, table in gender_gap_extremes(gap).items():
+        assert table['City'].tolist() == legacy_extremes[name]['City'].tolist(), name
+        assert table['Difference'].tolist() == legacy_extremes[name]['Difference'].tolist(), name
+
+
+def test_extremes_are_those_of_the_notebook_conclusion(sample):
+    extremes = gender_gap_extremes(gender_gap(sample))
+
+    assert extremes['female_top']['City'].tolist()[:6] == ['Greater Mumbai', 'Delhi', 'Bengaluru', 'Ahmedabad',
+                                                           'Kanpur', 'Jaipur']
+    assert extremes['female_top']['Difference'].iloc[0] == -98_482_616
+    assert extremes['male_top']['City'].tolist()[:5] == ['Kolkata', 'Chennai', 'Fatehpur Sikri', 'Margao',
+                                                         'Nautanwa']
+    assert extremes['male_top']['Difference'].iloc[0] == 9_048_465
+
+
+def test_single_gender_cities_are_dropped_or_filled():
+    df = pd.DataFrame({'City': ['A', 'A', 'B', 'C'], 'Gender': ['M', 'F', 'M', 'F'], 'Amount': [5, 3, 7, 2]})
+
+    gap = gender_gap(df)
+    assert list(gap.columns) == GAP_COLUMNS
+    assert gap['City'].tolist() == ['A']
+    assert gap.loc[0, ['Male_Amount', 'Female_Amount', 'Difference']].tolist() == [5, 3, 2]
+
+    filled = gender_gap(df, fill_missing=True)
+    assert filled['City'].tolist() == ['A', 'B', 'C']
+    assert filled['Difference'].tolist() == [2, 7, -2]
+    assert filled['Male_Amount'].dtype == np.int64
+    # no female spending, no finite ratio
+    assert np.isnan(filled.loc[1, 'Ratio']) and filled.loc[2, 'Ratio'] == 0
+
+
+def test_dominated_areas_split_on_the_sign_of_the_difference():
+    df = pd.DataFrame({'City': ['A', 'A', 'B', 'B', 'C', 'C'], 'Gender': ['M', 'F'] * 3,
+                       'Amount': [5, 3, 1, 4, 2, 2]})
+
+    female, male = dominated_areas(gender_gap(df))
+
+    assert female['City'].tolist() == ['B'] and male['City'].tolist() == ['A']
@@ -0,0 +1,109 @@
+"""
+Incremental aggregates: daily batches against a full recompute, and batches that must only count once
+"""
+
+import pandas as pd
+import pytest
+
+from cceda.dates import MONTH_DTYPE, MONTH_NAMES
+from cceda.incremental import INCREMENTAL_TABLES, IncrementalAggregates, batch_digest
+from cceda.questions import prepare_frame
+from cceda.schema import INDEX_COLUMN, SAMPLE_CSV
+
+
+@pytest.fixture(scope='module')
+def raw():
+    return pd.read_csv(SAMPLE_CSV, index_col=INDEX_COLUMN)
+
+
+def write_daily_batches(raw, directory):
+    # one delta csv per transaction date, like the daily files the aggregates are fed with
+    dates = pd.to_datetime(raw['Date'], format='%d-%b-%y')
+    paths = []
+    for day, rows in raw.groupby(dates):
+        path = directory / f'{day:%Y-%m-%d}.csv'
+        rows.to_csv(path)
+        paths.append(path)
+
+    return paths
+
+
+def test_daily_batches_equal_a_full_recompute(raw, tmp_path):
+    state = IncrementalAggregates(tmp_path / 'state.json')
+    for path in write_daily_batches(raw, tmp_path):
+        assert state.apply(path, save=False)
+    state.save()
+
+    reloaded = IncrementalAggregates(tmp_path / 'state.json')
+    assert reloaded.rows == len(raw)
+    reloaded.verify(prepare_frame(raw.copy()))
+    assert sorted(reloaded.tables()) == sorted(INCREMENTAL_TABLES)
+
+
+def test_a_batch_counts_once_from_a_file_a_frame_or_renumbered(raw, tmp_path):
+    batch = raw.head(1_000)
+    path = tmp_path / 'batch.csv'
+    batch.to_csv(path)
+
+    state = IncrementalAggregates(tmp_path / 'state.json')
+    assert state.apply(path)
+    assert not state.apply(batch)
+    assert not state.apply(batch.reset_index(drop=True))
+    assert not state.apply(batch.iloc[::-1])
+    assert state.rows == len(batch)
+    state.verify(prepare_frame(batch.copy()))
+
+
+def test_digest_depends_on_the_rows():
+    batch = pd.DataFrame({'City': ['Delhi, India'] * 2, 'Date': ['29-Oct-14', '30-Oct-14'],
+                          'Card Type': ['Gold'] * 2, 'Exp Type': ['Food'] * 2, 'Gender': ['F', 'M'],
+                          'Amount': [100, 200]})
+    changed = batch.assign(Amount=[100, 201])
+
+    assert batch_digest(batch) == batch_digest(batch.set_index(pd.Index([7, 9])))
+    assert batch_digest(batch) != batch_digest(changed)
+
+
+def test_the_same_month_of_two_years_is_kept_apart(tmp_path):
+    batch = pd.DataFrame({'City': ['Delhi, India'] * 2, 'Date': ['10-Oct-13', '10-Oct-14'],
+                          'Card Type': ['Gold'] * 2, 'Exp Type': ['Food'] * 2, 'Gender': ['F'] * 2,
+                          'Amount': [100, 200]})
+
+    state = IncrementalAggregates(tmp_path / 'state.json')
+    state.apply(batch)
+
+    table = state.table('month_card')
+    assert table['Year'].tolist() == [2013, 2014]
+    assert table['Month'].tolist() == ['October', 'October']
+    assert table['Amount'].tolist() == [100, 200]
+
+
+def test_month_card_keeps_the_date_part_types(raw, tmp_path):
+    state = IncrementalAggregates(tmp_path / 'state.json')
+    state.apply(raw.copy())
+
+    table = state.table('month_card')
+    assert table['Year'].dtype == 'int64'
+    assert table['Month'].dtype == MONTH_DTYPE
+    # the months of a year come in calendar order
+    months = table.loc[table['Year'] == 2014, 'Month'].unique()
+    assert list(months) == MONTH_NAMES
+
+
+def test_city_spellings_are_voted_across_batches(tmp_path):
+    def batch(city, amounts, day):
+        return pd.DataFrame({'City': [city] * len(amounts), 'Date': [day] * len(amounts),
+                             'Card Type': ['Gold'] * len(amounts), 'Exp Type': ['Food'] * len(amounts),
+                             'Gender': ['F'] * len(amounts), 'Amount': amounts})
+
+    # the majority spelling is in the first batch alone, which a vote per batch would miss
+    first = batch('Navi MUMBAI, India', [100] * 3, '10-Oct-14')
+    second = batch('Navi Mumbai, India', [10] * 2, '11-Oct-14')
+
+    state = IncrementalAggregates(tmp_path / 'state.json')
+    state.apply(first)
+    state.apply(second)
+
+    reloaded = IncrementalAggregates(tmp_path / 'state.json')
+    assert reloaded.table('city').values.tolist() == [['Navi MUMBAI', 320]]
+    reloaded.verify(prepare_frame(pd.concat([first, second], ignore_index=True)))
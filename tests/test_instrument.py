@@ -0,0 +1,32 @@
+"""
+Instrumentation: stages run by several threads at once nest within their own thread
+"""
+
+import threading
+
+from cceda.instrument import Instrumentation, stage
+
+
+def test_threads_nest_their_own_stages():
+    barrier = threading.Barrier(2)
+
+    def work(name):
+        with stage(f'{name}-outer'):
+            # both outer stages are open before either inner one starts
+            barrier.wait()
+            with stage(f'{name}-inner'):
+                barrier.wait()
+
+    with Instrumentation() as instrumentation:
+        threads = [threading.Thread(target=work, args=(name,)) for name in ('a', 'b')]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    depths = {record['stage']: record['depth'] for record in instrumentation.records}
+    assert depths == {'a-outer': 0, 'a-inner': 1, 'b-outer': 0, 'b-inner': 1}
+
+    threads = {record['stage']: record['thread'] for record in instrumentation.records}
+    assert threads['a-outer'] == threads['a-inner'] != threads['b-outer'] == threads['b-inner']
+    assert instrumentation.stack == []
@@ -0,0 +1,23 @@
+"""
+Loader snapshots: a load with another date format never reuses the snapshot of the first
+"""
+
+import pandas as pd
+
+from cceda.loader import load_transactions
+from cceda.schema import INDEX_COLUMN, SAMPLE_CSV
+
+
+def test_snapshot_is_keyed_by_date_format(tmp_path):
+    # dates whose day and month can be read either way
+    raw = pd.read_csv(SAMPLE_CSV, index_col=INDEX_COLUMN, nrows=100)
+    raw['Date'] = '2014-03-07'
+    path = tmp_path / 'transactions.csv'
+    raw.to_csv(path)
+
+    month_first = load_transactions(path, cache_dir=tmp_path / 'cache', date_format='%Y-%m-%d')
+    day_first = load_transactions(path, cache_dir=tmp_path / 'cache', date_format='%Y-%d-%m')
+
+    assert (month_first['Date'] == pd.Timestamp('2014-03-07')).all()
+    assert (day_first['Date'] == pd.Timestamp('2014-07-03')).all()
+    assert len(list((tmp_path / 'cache').glob('transactions-*/meta.json'))) == 2
@@ -0,0 +1,74 @@
+"""
+Query layer: the csv is checked at most once per interval, and a reload never blocks the answers
+"""
+
+import threading
+
+import pandas as pd
+import pytest
+
+import cceda.query_cache
+from cceda.query_cache import QueryLayer
+from cceda.schema import INDEX_COLUMN, SAMPLE_CSV
+
+
+@pytest.fixture
+def csv(tmp_path):
+    path = tmp_path / 'transactions.csv'
+    pd.read_csv(SAMPLE_CSV, index_col=INDEX_COLUMN, nrows=2_000).to_csv(path)
+
+    return path
+
+
+def append_rows(path, rows=100):
+    # a changed csv: more rows at the end, so its size and digest change
+    pd.read_csv(SAMPLE_CSV, index_col=INDEX_COLUMN, skiprows=range(1, 2_001), nrows=rows).to_csv(path, mode='a',
+                                                                                                 header=False)
+
+
+def test_a_changed_csv_is_reloaded(csv, tmp_path):
+    layer = QueryLayer(csv, cache_dir=tmp_path / 'cache', check_interval=0)
+    before = layer.ask('q3')['df_month_group']['Amount'].sum()
+
+    append_rows(csv)
+
+    assert layer.ask('q3')['df_month_group']['Amount'].sum() > before
+    assert len(layer.df) == 2_100
+
+
+def test_the_csv_is_checked_at_most_once_per_interval(csv, tmp_path, monkeypatch):
+    layer = QueryLayer(csv, cache_dir=tmp_path / 'cache', check_interval=60)
+    checks = []
+    monkeypatch.setattr(layer, 'refresh', lambda wait=True: checks.append(wait))
+
+    for _ in range(100):
+        layer.ask('q3')
+
+    assert checks == []
+
+
+def test_a_reload_does_not_block_cached_answers(csv, tmp_path, monkeypatch):
+    layer = QueryLayer(csv, cache_dir=tmp_path / 'cache', auto_refresh=False)
+    cached = layer.ask('q3')
+
+    # the reload is held inside load until the cached answer was served
+    loading, served = threading.Event(), threading.Event()
+    original = cceda.query_cache.load
+
+    def slow_load(*args):
+        loading.set()
+        assert served.wait(10)
+        return original(*args)
+
+    monkeypatch.setattr(cceda.query_cache, 'load', slow_load)
+    append_rows(csv)
+    reload = threading.Thread(target=layer.refresh)
+    reload.start()
+    assert loading.wait(10)
+
+    assert layer.ask('q3') is cached
+    served.set()
+    reload.join()
+
+    assert len(layer.df) == 2_100
+    assert layer.ask('q3') is not cached
@@ -0,0 +1,57 @@
+"""
+Service: malformed requests are answered 400, errors of a question 500 and logged
+"""
+
+import asyncio
+
+import pytest
+
+from cceda.query_cache import QueryLayer
+from cceda.schema import SAMPLE_CSV
+from cceda.service import QueryService
+
+
+@pytest.fixture(scope='module')
+def service(tmp_path_factory):
+    service = QueryService(QueryLayer(SAMPLE_CSV, cache_dir=tmp_path_factory.mktemp('cache'), auto_refresh=False),
+                           workers=2)
+    yield service
+    service.close()
+
+
+def status_of(service, request):
+    # the status code the service answers a raw request with, over a real connection
+    async def exchange():
+        server = await asyncio.start_server(service.serve_connection, '127.0.0.1', 0)
+        async with server:
+            reader, writer = await asyncio.open_connection(*server.sockets[0].getsockname()[:2])
+            writer.write(request)
+            await writer.drain()
+            status_line = await reader.readline()
+            writer.close()
+            await writer.wait_closed()
+
+        return int(status_line.split()[1])
+
+    return asyncio.run(exchange())
+
+
+def test_a_question_is_answered(service):
+    assert status_of(service, b'GET /questions/q3 HTTP/1.1\r\n\r\n') == 200
+
+
+@pytest.mark.parametrize('request_bytes', [b'GET /health HTTP/1.1\r\nContent-Length: abc\r\n\r\n',
+                                           b'GET /health HTTP/1.1\r\nContent-Length: -1\r\n\r\n',
+                                           b'GARBAGE\r\n\r\n'])
+def test_malformed_requests_are_answered_400(service, request_bytes):
+    assert status_of(service, request_bytes) == 400
+
+
+def test_a_value_error_of_a_question_is_logged_as_500(service, monkeypatch, caplog):
+    async def failing(method, target):
+        raise ValueError('bug in the question')
+
+    monkeypatch.setattr(service, 'handle', failing)
+
+    assert status_of(service, b'GET /questions/q3 HTTP/1.1\r\n\r\n') == 500
+    assert 'request' in caplog.text and 'bug in the question' in caplog.text
@@ -0,0 +1,88 @@
+"""
+Streaming mode: the tables of a stream equal the in-memory ones, and a stream stays within its memory budget
+"""
+
+import json
+import pickle
+import subprocess
+import sys
+import textwrap
+from pathlib import Path
+
+import pytest
+
+from cceda.loader import load_transactions
+from cceda.questions import assert_tables_equal, prepare_frame, question_tables
+from cceda.streaming import StreamingAnalysis, chunksize_for_budget
+from cceda.synthetic import write_synthetic_csv
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# the budget of the streaming process, the interpreter and pandas included
+MEMORY_LIMIT_MB = 160
+
+# streams a csv under a memory budget, pickles its tables and prints its chunk size and peak RSS
+_STREAM_SCRIPT = textwrap.dedent("""
+    import json, pickle, sys
+    from cceda.instrument import peak_rss_mb
+    from cceda.streaming import StreamingAnalysis
+
+    path, tables_path, memory_limit_mb = sys.argv[1], sys.argv[2], float(sys.argv[3])
+    analysis = StreamingAnalysis(memory_limit_mb=memory_limit_mb).run(path)
+    with open(tables_path, 'wb') as file:
+        pickle.dump(analysis.question_tables(), file)
+    print(json.dumps({'chunksize': analysis.chunksize, 'rows': analysis.rows, 'peak_rss_mb': peak_rss_mb()}))
+""")
+
+
+def assert_all_tables_equal(expected, actual):
+    assert sorted(expected) == sorted(actual)
+    for name, table in expected.items():
+        assert_tables_equal(table, actual[name])
+
+
+def test_stream_of_the_sample_equals_the_in_memory_tables():
+    expected = question_tables(prepare_frame(load_transactions(use_cache=False)))
+
+    assert_all_tables_equal(expected, StreamingAnalysis(chunksize=2_000).run().question_tables())
+
+
+def test_every_chunk_gets_the_canonical_city_spelling(tmp_path):
+    # the first chunk only sees a minority spelling, the whole file prefers another one
+    lines = ['index,City,Date,Card Type,Exp Type,Gender,Amount',
+             '0,"Navi MUMBAI, India",29-Oct-14,Gold,Bills,F,100']
+    lines += [f'{row},"Navi Mumbai, India",29-Oct-14,Gold,Bills,M,10' for row in range(1, 5)]
+    path = tmp_path / 'spellings.csv'
+    path.write_text('\n'.join(lines) + '\n')
+
+    expected = question_tables(prepare_frame(load_transactions(path, use_cache=False)))
+    tables = StreamingAnalysis(chunksize=1).run(path).question_tables()
+
+    assert_all_tables_equal(expected, tables)
+    assert tables['city']['City'].astype(str).tolist() == ['Navi Mumbai']
+
+
+def test_chunksize_leaves_room_for_what_the_process_holds():
+    assert chunksize_for_budget(256, used_mb=100) < chunksize_for_budget(256, used_mb=50)
+    with pytest.raises(ValueError, match='no room'):
+        chunksize_for_budget(100, used_mb=90)
+
+
+@pytest.mark.skipif(not Path('/proc/self/status').exists(), reason='the peak RSS of a child needs /proc')
+def test_stream_stays_within_its_memory_budget(tmp_path):
+    path = write_synthetic_csv(tmp_path / 'synthetic.csv', 400_000)
+    tables_path = tmp_path / 'tables.pkl'
+
+    # a process of its own, so its peak memory is only the stream's
+    output = subprocess.run([sys.executable, '-c', _STREAM_SCRIPT, str(path), str(tables_path), str(MEMORY_LIMIT_MB)],
+                            cwd=ROOT, capture_output=True, text=True, check=True).stdout
+    result = json.loads(output)
+
+    assert result['rows'] == 400_000
+    assert result['chunksize'] < result['rows'], 'the budget should force several chunks'
+    assert result['peak_rss_mb'] <= MEMORY_LIMIT_MB
+
+    with open(tables_path, 'rb') as file:
+        streamed = pickle.load(file)
+    expected = question_tables(prepare_frame(load_transactions(path, use_cache=False)))
+    assert_all_tables_equal(expected, streamed)